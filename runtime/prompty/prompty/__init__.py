@@ -1,4 +1,5 @@
-import traceback
+import importlib
+import sys
 import typing
 from pathlib import Path
 from typing import Union
@@ -6,24 +7,85 @@ from typing import Union
 from .core import (
     ModelSettings,
     Prompty,
-    PropertySettings,
+    PropertySettings,  # noqa
     TemplateSettings,
+    _load_raw_prompty,
     param_hoisting,
 )
 from .invoker import InvokerFactory
-from .parsers import PromptyChatParser
-from .renderers import Jinja2Renderer, MustacheRenderer
+from .packing import pack, pack_async
+from .scheduler import scheduling
+from .tokens import count_messages, model_name
 from .tracer import trace
 from .utils import (
     load_global_config,
     load_global_config_async,
     load_prompty,
     load_prompty_async,
+    run_in_thread,
+)
+
+# built-in invokers (and jinja2 / the mustache module) are only imported once a prompty uses them
+InvokerFactory.add_renderer("jinja2", "prompty.renderers:Jinja2Renderer")
+InvokerFactory.add_renderer("mustache", "prompty.renderers:MustacheRenderer")
+InvokerFactory.add_parser("prompty.chat", "prompty.parsers:PromptyChatParser")
+InvokerFactory.add_executor("multi", "prompty.multi:MultiExecutor")
+InvokerFactory.add_processor("multi", "prompty.multi:MultiProcessor")
+
+# public names imported on first access
+_lazy_attributes = {
+    "compile_bundle": ".bundle",
+    "load_bundle": ".bundle",
+    "PromptyLoader": ".loader",
+    "LoadResult": ".registry",
+    "PromptyRegistry": ".registry",
+    "RateLimiter": ".ratelimit",
+    "CircuitOpenError": ".resilience",
+    "Resilience": ".resilience",
+    "Scheduler": ".scheduler",
+    "ChatSession": ".session",
+    "SingleFlight": ".singleflight",
+    "ContentEvent": ".streaming",
+    "FinishEvent": ".streaming",
+    "StreamAssembler": ".streaming",
+    "ToolCallEvent": ".streaming",
+    "TokenCount": ".tokens",
+    "PromptyHandle": ".watcher",
+    "PromptyWatcher": ".watcher",
+}
+
+
+def __getattr__(name: str) -> typing.Any:
+    if name in _lazy_attributes:
+        value = getattr(importlib.import_module(_lazy_attributes[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def _caller_directory(base_dir: Union[str, Path, None] = None) -> Path:
+    """Directory that relative paths are resolved against.
+
+    Walks raw frames (no source line lookups, unlike traceback.extract_stack)
+    and skips the ones belonging to this module and the trace wrappers, so the
+    cost does not depend on how deep the calling framework stack is.
+    """
+    if base_dir is not None:
+        return Path(base_dir)
+
+    frame = sys._getframe(1)
+    while frame.f_back is not None and frame.f_code.co_filename in _INTERNAL_FILES:
+        frame = frame.f_back
+    return Path(frame.f_code.co_filename).parent
+
+
+_INTERNAL_FILES = frozenset(
+    [_caller_directory.__code__.co_filename, trace.__code__.co_filename]
 )
 
-InvokerFactory.add_renderer("jinja2", Jinja2Renderer)
-InvokerFactory.add_renderer("mustache", MustacheRenderer)
-InvokerFactory.add_parser("prompty.chat", PromptyChatParser)
+
+def _resolve_path(p: Path) -> Path:
+    return p.resolve().absolute()
 
 
 @trace(description="Create a headless prompty object for programmatic use.")
@@ -33,6 +95,7 @@ def headless(
     configuration: dict[str, typing.Any] = {},
     parameters: dict[str, typing.Any] = {},
     connection: str = "default",
+    base_dir: Union[str, Path, None] = None,
 ) -> Prompty:
     """Create a headless prompty object for programmatic use.
 
@@ -48,6 +111,8 @@ def headless(
         The parameters to use, by default {}
     connection : str, optional
         The connection to use, by default "default"
+    base_dir : str | Path, optional
+        Directory to search for prompty.json from, by default the caller's directory
 
     Returns
     -------
@@ -67,20 +132,18 @@ def headless(
     """
 
     # get caller's path (to get relative path for prompty.json)
-    caller = Path(traceback.extract_stack()[-3].filename)
+    caller = _caller_directory(base_dir)
     templateSettings = TemplateSettings(type="NOOP", parser="NOOP")
     modelSettings = ModelSettings(
         api=api,
         configuration=Prompty.normalize(
-            param_hoisting(
-                configuration, load_global_config(caller.parent, connection)
-            ),
-            caller.parent,
+            param_hoisting(configuration, load_global_config(caller, connection)),
+            caller,
         ),
         parameters=parameters,
     )
 
-    return Prompty(model=modelSettings, template=templateSettings, content=content)
+    return Prompty(model=modelSettings, template=templateSettings, content=content).freeze()
 
 
 @trace(description="Create a headless prompty object for programmatic use.")
@@ -90,6 +153,7 @@ async def headless_async(
     configuration: dict[str, typing.Any] = {},
     parameters: dict[str, typing.Any] = {},
     connection: str = "default",
+    base_dir: Union[str, Path, None] = None,
 ) -> Prompty:
     """Create a headless prompty object for programmatic use.
 
@@ -105,6 +169,8 @@ async def headless_async(
         The parameters to use, by default {}
     connection : str, optional
         The connection to use, by default "default"
+    base_dir : str | Path, optional
+        Directory to search for prompty.json from, by default the caller's directory
 
     Returns
     -------
@@ -124,12 +190,12 @@ async def headless_async(
     """
 
     # get caller's path (to get relative path for prompty.json)
-    caller = Path(traceback.extract_stack()[-3].filename)
+    caller = _caller_directory(base_dir)
     templateSettings = TemplateSettings(type="NOOP", parser="NOOP")
 
-    global_config = await load_global_config_async(caller.parent, connection)
+    global_config = await load_global_config_async(caller, connection)
     c = await Prompty.normalize_async(
-        param_hoisting(configuration, global_config), caller.parent
+        param_hoisting(configuration, global_config), caller
     )
 
     modelSettings = ModelSettings(
@@ -138,76 +204,15 @@ async def headless_async(
         parameters=parameters,
     )
 
-    return Prompty(model=modelSettings, template=templateSettings, content=content)
-
-
-def _load_raw_prompty(attributes: dict, content: str, p: Path, global_config: dict):
-    if "model" not in attributes:
-        attributes["model"] = {}
-
-    if "configuration" not in attributes["model"]:
-        attributes["model"]["configuration"] = global_config
-    else:
-        attributes["model"]["configuration"] = param_hoisting(
-            attributes["model"]["configuration"],
-            global_config,
-        )
-
-    # pull model settings out of attributes
-    try:
-        model = ModelSettings(**attributes.pop("model"))
-    except Exception as e:
-        raise ValueError(f"Error in model settings: {e}")
-
-    # pull template settings
-    try:
-        if "template" in attributes:
-            t = attributes.pop("template")
-            if isinstance(t, dict):
-                template = TemplateSettings(**t)
-            # has to be a string denoting the type
-            else:
-                template = TemplateSettings(type=t, parser="prompty")
-        else:
-            template = TemplateSettings(type="jinja2", parser="prompty")
-    except Exception as e:
-        raise ValueError(f"Error in template loader: {e}")
-
-    # formalize inputs and outputs
-    if "inputs" in attributes:
-        try:
-            inputs = {
-                k: PropertySettings(**v) for (k, v) in attributes.pop("inputs").items()
-            }
-        except Exception as e:
-            raise ValueError(f"Error in inputs: {e}")
-    else:
-        inputs = {}
-    if "outputs" in attributes:
-        try:
-            outputs = {
-                k: PropertySettings(**v) for (k, v) in attributes.pop("outputs").items()
-            }
-        except Exception as e:
-            raise ValueError(f"Error in outputs: {e}")
-    else:
-        outputs = {}
-
-    prompty = Prompty(
-        model=model,
-        inputs=inputs,
-        outputs=outputs,
-        template=template,
-        content=content,
-        file=p,
-        **attributes
-    )
-
-    return prompty
+    return Prompty(model=modelSettings, template=templateSettings, content=content).freeze()
 
 
 @trace(description="Load a prompty file.")
-def load(prompty_file: str, configuration: str = "default") -> Prompty:
+def load(
+    prompty_file: Union[str, Path],
+    configuration: str = "default",
+    base_dir: Union[str, Path, None] = None,
+) -> Prompty:
     """Load a prompty file.
 
     Parameters
@@ -216,6 +221,8 @@ def load(prompty_file: str, configuration: str = "default") -> Prompty:
         The path to the prompty file
     configuration : str, optional
         The configuration to use, by default "default"
+    base_dir : str | Path, optional
+        Directory relative paths are resolved against, by default the caller's directory
 
     Returns
     -------
@@ -232,8 +239,7 @@ def load(prompty_file: str, configuration: str = "default") -> Prompty:
     p = Path(prompty_file)
     if not p.is_absolute():
         # get caller's path (take into account trace frame)
-        caller = Path(traceback.extract_stack()[-3].filename)
-        p = Path(caller.parent / p).resolve().absolute()
+        p = Path(_caller_directory(base_dir) / p).resolve().absolute()
 
     # load dictionary from prompty file
     matter = load_prompty(p)
@@ -257,11 +263,16 @@ def load(prompty_file: str, configuration: str = "default") -> Prompty:
         base = load(p.parent / attributes["base"])
         prompty = Prompty.hoist_base_prompty(prompty, base)
 
-    return prompty
+    # shared read-only, per-call changes go through with_overrides / derive
+    return prompty.freeze()
 
 
 @trace(description="Load a prompty file.")
-async def load_async(prompty_file: str, configuration: str = "default") -> Prompty:
+async def load_async(
+    prompty_file: Union[str, Path],
+    configuration: str = "default",
+    base_dir: Union[str, Path, None] = None,
+) -> Prompty:
     """Load a prompty file.
 
     Parameters
@@ -270,6 +281,8 @@ async def load_async(prompty_file: str, configuration: str = "default") -> Promp
         The path to the prompty file
     configuration : str, optional
         The configuration to use, by default "default"
+    base_dir : str | Path, optional
+        Directory relative paths are resolved against, by default the caller's directory
 
     Returns
     -------
@@ -286,21 +299,20 @@ async def load_async(prompty_file: str, configuration: str = "default") -> Promp
     p = Path(prompty_file)
     if not p.is_absolute():
         # get caller's path (take into account trace frame)
-        caller = Path(traceback.extract_stack()[-3].filename)
-        p = Path(caller.parent / p).resolve().absolute()
+        p = await run_in_thread(_resolve_path, _caller_directory(base_dir) / p)
 
-    # load dictionary from prompty file
+    # load dictionary from prompty file (yaml is parsed in the thread pool)
     matter = await load_prompty_async(p)
 
     attributes = matter["attributes"]
     content = matter["body"]
 
     # normalize attribute dictionary resolve keys and files
-    attributes = await Prompty.normalize_async(attributes, p.parent)
+    attributes = await run_in_thread(Prompty.normalize, attributes, p.parent)
 
     # load global configuration
     config = await load_global_config_async(p.parent, configuration)
-    global_config = await Prompty.normalize_async(config, p.parent)
+    global_config = await run_in_thread(Prompty.normalize, config, p.parent)
 
     prompty = _load_raw_prompty(attributes, content, p, global_config)
 
@@ -310,13 +322,15 @@ async def load_async(prompty_file: str, configuration: str = "default") -> Promp
         base = await load_async(p.parent / attributes["base"])
         prompty = Prompty.hoist_base_prompty(prompty, base)
 
-    return prompty
+    # shared read-only, per-call changes go through with_overrides / derive
+    return prompty.freeze()
 
 
 @trace(description="Prepare the inputs for the prompt.")
 def prepare(
     prompt: Prompty,
     inputs: dict[str, typing.Any] = {},
+    count_tokens: bool = False,
 ):
     """Prepare the inputs for the prompt.
 
@@ -326,11 +340,14 @@ def prepare(
         The prompty object
     inputs : Dict[str, any], optional
         The inputs to the prompt, by default {}
+    count_tokens : bool, optional
+        Also count the tokens of the prepared content, by default False
 
     Returns
     -------
-    dict
-        The prepared and hidrated template shaped to the LLM model
+    dict | tuple[dict, TokenCount]
+        The prepared and hidrated template shaped to the LLM model, and
+        its token count when requested
 
     Example
     -------
@@ -338,11 +355,15 @@ def prepare(
     >>> p = prompty.load("prompts/basic.prompty")
     >>> inputs = {"name": "John Doe"}
     >>> content = prompty.prepare(p, inputs)
+    >>> content, tokens = prompty.prepare(p, inputs, count_tokens=True)
     """
     inputs = param_hoisting(inputs, prompt.sample)
 
-    render = InvokerFactory.run_renderer(prompt, inputs, prompt.content)
-    result = InvokerFactory.run_parser(prompt, render)
+    # drops or trims packed inputs when the prompt would not fit the context
+    _, result = pack(prompt, inputs)
+
+    if count_tokens:
+        return result, count_messages(result, model_name(prompt))
 
     return result
 
@@ -351,6 +372,7 @@ def prepare(
 async def prepare_async(
     prompt: Prompty,
     inputs: dict[str, typing.Any] = {},
+    count_tokens: bool = False,
 ):
     """Prepare the inputs for the prompt.
 
@@ -360,11 +382,14 @@ async def prepare_async(
         The prompty object
     inputs : Dict[str, any], optional
         The inputs to the prompt, by default {}
+    count_tokens : bool, optional
+        Also count the tokens of the prepared content, by default False
 
     Returns
     -------
-    dict
-        The prepared and hidrated template shaped to the LLM model
+    dict | tuple[dict, TokenCount]
+        The prepared and hidrated template shaped to the LLM model, and
+        its token count when requested
 
     Example
     -------
@@ -372,11 +397,15 @@ async def prepare_async(
     >>> p = prompty.load("prompts/basic.prompty")
     >>> inputs = {"name": "John Doe"}
     >>> content = await prompty.prepare_async(p, inputs)
+    >>> content, tokens = await prompty.prepare_async(p, inputs, count_tokens=True)
     """
     inputs = param_hoisting(inputs, prompt.sample)
 
-    render = await InvokerFactory.run_renderer_async(prompt, inputs, prompt.content)
-    result = await InvokerFactory.run_parser_async(prompt, render)
+    # drops or trims packed inputs when the prompt would not fit the context
+    _, result = await pack_async(prompt, inputs)
+
+    if count_tokens:
+        return result, count_messages(result, model_name(prompt))
 
     return result
 
@@ -418,13 +447,8 @@ def run(
     >>> result = prompty.run(p, content)
     """
 
-    if configuration != {}:
-        prompt.model.configuration = param_hoisting(
-            configuration, prompt.model.configuration
-        )
-
-    if parameters != {}:
-        prompt.model.parameters = param_hoisting(parameters, prompt.model.parameters)
+    # overrides apply to this call only, the loaded prompty is shared
+    prompt = prompt.with_overrides(configuration, parameters)
 
     result = InvokerFactory.run_executor(prompt, content)
     if not raw:
@@ -470,13 +494,8 @@ async def run_async(
     >>> result = await prompty.run_async(p, content)
     """
 
-    if configuration != {}:
-        prompt.model.configuration = param_hoisting(
-            configuration, prompt.model.configuration
-        )
-
-    if parameters != {}:
-        prompt.model.parameters = param_hoisting(parameters, prompt.model.parameters)
+    # overrides apply to this call only, the loaded prompty is shared
+    prompt = prompt.with_overrides(configuration, parameters)
 
     result = await InvokerFactory.run_executor_async(prompt, content)
     if not raw:
@@ -493,6 +512,9 @@ def execute(
     inputs: dict[str, typing.Any] = {},
     raw: bool = False,
     config_name: str = "default",
+    base_dir: Union[str, Path, None] = None,
+    priority: Union[str, int, None] = None,
+    tenant: Union[str, None] = None,
 ):
     """Execute a prompty.
 
@@ -508,8 +530,17 @@ def execute(
         The inputs to the prompt, by default {}
     raw : bool, optional
         Whether to skip processing, by default False
-    connection : str, optional
-        The connection to use, by default "default"
+    config_name : str, optional
+        The configuration to use, by default "default"
+    base_dir : str | Path, optional
+        Directory relative paths are resolved against, by default the caller's directory
+    priority : str | int, optional
+        The priority class of the executor call ("interactive", "default",
+        "batch") when a Scheduler is installed, by default the surrounding
+        ``scheduling`` context or "default"
+    tenant : str, optional
+        The flow the executor call is fairly queued by, by default the
+        prompty name
 
     Returns
     -------
@@ -526,15 +557,15 @@ def execute(
         path = Path(prompt)
         if not path.is_absolute():
             # get caller's path (take into account trace frame)
-            caller = Path(traceback.extract_stack()[-3].filename)
-            path = Path(caller.parent / path).resolve().absolute()
+            path = Path(_caller_directory(base_dir) / path).resolve().absolute()
         prompt = load(path, config_name)
 
     # prepare content
     content = prepare(prompt, inputs)
 
     # run LLM model
-    result = run(prompt, content, configuration, parameters, raw)
+    with scheduling(priority, tenant):
+        result = run(prompt, content, configuration, parameters, raw)
 
     return result
 
@@ -547,6 +578,9 @@ async def execute_async(
     inputs: dict[str, typing.Any] = {},
     raw: bool = False,
     config_name: str = "default",
+    base_dir: Union[str, Path, None] = None,
+    priority: Union[str, int, None] = None,
+    tenant: Union[str, None] = None,
 ):
     """Execute a prompty.
 
@@ -562,8 +596,17 @@ async def execute_async(
         The inputs to the prompt, by default {}
     raw : bool, optional
         Whether to skip processing, by default False
-    connection : str, optional
-        The connection to use, by default "default"
+    config_name : str, optional
+        The configuration to use, by default "default"
+    base_dir : str | Path, optional
+        Directory relative paths are resolved against, by default the caller's directory
+    priority : str | int, optional
+        The priority class of the executor call ("interactive", "default",
+        "batch") when a Scheduler is installed, by default the surrounding
+        ``scheduling`` context or "default"
+    tenant : str, optional
+        The flow the executor call is fairly queued by, by default the
+        prompty name
 
     Returns
     -------
@@ -580,14 +623,16 @@ async def execute_async(
         path = Path(prompt)
         if not path.is_absolute():
             # get caller's path (take into account trace frame)
-            caller = Path(traceback.extract_stack()[-3].filename)
-            path = Path(caller.parent / path).resolve().absolute()
+            path = await run_in_thread(
+                _resolve_path, _caller_directory(base_dir) / path
+            )
         prompt = await load_async(path, config_name)
 
     # prepare content
     content = await prepare_async(prompt, inputs)
 
     # run LLM model
-    result = await run_async(prompt, content, configuration, parameters, raw)
+    with scheduling(priority, tenant):
+        result = await run_async(prompt, content, configuration, parameters, raw)
 
     return result
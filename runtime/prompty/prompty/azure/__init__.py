@@ -1,10 +1,27 @@
 # __init__.py
-from prompty.invoker import InvokerException
+import typing
 
-try:
-    from .executor import AzureOpenAIExecutor # noqa
-    from .processor import AzureOpenAIProcessor # noqa
-except ImportError:
+from prompty.invoker import InvokerException, InvokerFactory
+from prompty.utils import installed
+
+if not installed("openai", "azure.identity"):
     raise InvokerException(
         "Error registering AzureOpenAIExecutor and AzureOpenAIProcessor", "azure"
     )
+
+# the SDKs are imported when a prompty first uses these invokers
+for name in ["azure", "azure_openai"]:
+    InvokerFactory.add_executor(name, "prompty.azure.executor:AzureOpenAIExecutor")
+for name in ["azure", "azure_openai", "azure_beta", "azure_openai_beta"]:
+    InvokerFactory.add_processor(name, "prompty.azure.processor:AzureOpenAIProcessor")
+
+_invokers = {
+    "AzureOpenAIExecutor": "prompty.azure.executor",
+    "AzureOpenAIProcessor": "prompty.azure.processor",
+}
+
+
+def __getattr__(name: str) -> typing.Any:
+    if name in _invokers:
+        return getattr(InvokerFactory.import_module(_invokers[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,4 +1,3 @@
-import importlib.metadata
 import typing
 from collections.abc import AsyncIterator, Iterator
 
@@ -8,10 +7,10 @@ from openai.types.chat.chat_completion import ChatCompletion
 
 from prompty.tracer import Tracer
 
-from ..core import AsyncPromptyStream, Prompty, PromptyStream
+from ..core import RUNTIME_CONFIGURATION_KEYS, AsyncPromptyStream, Prompty, PromptyStream
 from ..invoker import Invoker, InvokerFactory
-
-VERSION = importlib.metadata.version("prompty")
+from ..ratelimit import RateLimiter
+from ..utils import prompty_version
 
 
 @InvokerFactory.register_executor("azure")
@@ -24,7 +23,7 @@ class AzureOpenAIExecutor(Invoker):
         self.kwargs = {
             key: value
             for key, value in self.prompty.model.configuration.items()
-            if key != "type"
+            if key not in RUNTIME_CONFIGURATION_KEYS
         }
 
         # no key, use default credentials
@@ -74,8 +73,8 @@ class AzureOpenAIExecutor(Invoker):
             trace("inputs", self.kwargs)
             client = AzureOpenAI(
                 default_headers={
-                    "User-Agent": f"prompty/{VERSION}",
-                    "x-ms-useragent": f"prompty/{VERSION}",
+                    "User-Agent": f"prompty/{prompty_version()}",
+                    "x-ms-useragent": f"prompty/{prompty_version()}",
                 },
                 **self.kwargs,
             )
@@ -104,6 +103,10 @@ class AzureOpenAIExecutor(Invoker):
                     for k, v in raw.headers.raw:
                         trace(k.decode("utf-8"), v.decode("utf-8"))
 
+                    limiter = RateLimiter.get(self.prompty)
+                    if limiter is not None:
+                        limiter.update(raw.headers)
+
                     trace("request_id", raw.request_id)
                     trace("retries_taken", raw.retries_taken)
 
@@ -172,8 +175,8 @@ class AzureOpenAIExecutor(Invoker):
             trace("inputs", self.kwargs)
             client = AsyncAzureOpenAI(
                 default_headers={
-                    "User-Agent": f"prompty/{VERSION}",
-                    "x-ms-useragent": f"prompty/{VERSION}",
+                    "User-Agent": f"prompty/{prompty_version()}",
+                    "x-ms-useragent": f"prompty/{prompty_version()}",
                 },
                 **self.kwargs,
             )
@@ -204,6 +207,10 @@ class AzureOpenAIExecutor(Invoker):
                     for k, v in raw.headers.raw:
                         trace(k.decode("utf-8"), v.decode("utf-8"))
 
+                    limiter = RateLimiter.get(self.prompty)
+                    if limiter is not None:
+                        limiter.update(raw.headers)
+
                     trace("request_id", raw.request_id)
                     trace("retries_taken", raw.retries_taken)
 
@@ -8,6 +8,7 @@ from openai.types.images_response import ImagesResponse
 
 from ..core import AsyncPromptyStream, Prompty, PromptyStream, ToolCall
 from ..invoker import Invoker, InvokerFactory
+from ..streaming import stream_events, stream_events_async, stream_mode
 
 
 @InvokerFactory.register_processor("azure")
@@ -77,6 +78,8 @@ class AzureOpenAIProcessor(Invoker):
                 return [item.url if item.url else item.b64_json for item in data.data]
 
         elif isinstance(data, Iterator):
+            if stream_mode(self.prompty) == "events":
+                return PromptyStream("AzureOpenAIProcessor", stream_events(data), source=data)
 
             def generator():
                 for chunk in data:
@@ -87,7 +90,7 @@ class AzureOpenAIProcessor(Invoker):
                         content = chunk.choices[0].delta.content
                         yield content
 
-            return PromptyStream("AzureOpenAIProcessor", generator())
+            return PromptyStream("AzureOpenAIProcessor", generator(), source=data)
         else:
             return data
 
@@ -140,6 +143,10 @@ class AzureOpenAIProcessor(Invoker):
                 return [item.url if item.url else item.b64_json for item in data.data]
 
         elif isinstance(data, AsyncIterator):
+            if stream_mode(self.prompty) == "events":
+                return AsyncPromptyStream(
+                    "AsyncAzureOpenAIProcessor", stream_events_async(data), source=data
+                )
 
             async def generator():
                 async for chunk in data:
@@ -150,6 +157,6 @@ class AzureOpenAIProcessor(Invoker):
                         content = chunk.choices[0].delta.content
                         yield content
 
-            return AsyncPromptyStream("AsyncAzureOpenAIProcessor", generator())
+            return AsyncPromptyStream("AsyncAzureOpenAIProcessor", generator(), source=data)
         else:
             return data
@@ -1,11 +1,27 @@
 # __init__.py
-from prompty.invoker import InvokerException
+import typing
 
-try:
-    # Reuse the common Azure OpenAI Processor
-    from ..azure.processor import AzureOpenAIProcessor # noqa
-    from .executor import AzureOpenAIBetaExecutor # noqa
-except ImportError:
+from prompty.invoker import InvokerException, InvokerFactory
+from prompty.utils import installed
+
+if not installed("openai", "azure.identity"):
     raise InvokerException(
         "Error registering AzureOpenAIBetaExecutor and AzureOpenAIProcessor", "azure_beta"
     )
+
+# the SDKs are imported when a prompty first uses these invokers
+for name in ["azure_beta", "azure_openai_beta"]:
+    InvokerFactory.add_executor(name, "prompty.azure_beta.executor:AzureOpenAIBetaExecutor")
+for name in ["azure", "azure_openai", "azure_beta", "azure_openai_beta"]:
+    InvokerFactory.add_processor(name, "prompty.azure.processor:AzureOpenAIProcessor")
+
+_invokers = {
+    "AzureOpenAIBetaExecutor": "prompty.azure_beta.executor",
+    "AzureOpenAIProcessor": "prompty.azure.processor",
+}
+
+
+def __getattr__(name: str) -> typing.Any:
+    if name in _invokers:
+        return getattr(InvokerFactory.import_module(_invokers[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,4 +1,3 @@
-import importlib.metadata
 import re
 import typing
 from collections.abc import AsyncIterator, Iterator
@@ -9,8 +8,9 @@ from openai import AsyncAzureOpenAI, AzureOpenAI
 
 from prompty.tracer import Tracer
 
-from ..core import AsyncPromptyStream, Prompty, PromptyStream
+from ..core import RUNTIME_CONFIGURATION_KEYS, AsyncPromptyStream, Prompty, PromptyStream
 from ..invoker import Invoker, InvokerFactory
+from ..utils import prompty_version
 
 
 def extract_date(data: str) -> typing.Union[datetime, None]:
@@ -65,9 +65,6 @@ def is_structured_output_available(api_version: str) -> bool:
     return False
 
 
-VERSION = importlib.metadata.version("prompty")
-
-
 @InvokerFactory.register_executor("azure_beta")
 @InvokerFactory.register_executor("azure_openai_beta")
 class AzureOpenAIBetaExecutor(Invoker):
@@ -78,7 +75,7 @@ class AzureOpenAIBetaExecutor(Invoker):
         self.kwargs = {
             key: value
             for key, value in self.prompty.model.configuration.items()
-            if key != "type"
+            if key not in RUNTIME_CONFIGURATION_KEYS
         }
 
         # no key, use default credentials
@@ -129,8 +126,8 @@ class AzureOpenAIBetaExecutor(Invoker):
             trace("inputs", self.kwargs)
             client = AzureOpenAI(
                 default_headers={
-                    "User-Agent": f"prompty/{VERSION}",
-                    "x-ms-useragent": f"prompty/{VERSION}",
+                    "User-Agent": f"prompty/{prompty_version()}",
+                    "x-ms-useragent": f"prompty/{prompty_version()}",
                 },
                 **self.kwargs,
             )
@@ -224,8 +221,8 @@ class AzureOpenAIBetaExecutor(Invoker):
             trace("inputs", self.kwargs)
             client = AsyncAzureOpenAI(
                 default_headers={
-                    "User-Agent": f"prompty/{VERSION}",
-                    "x-ms-useragent": f"prompty/{VERSION}",
+                    "User-Agent": f"prompty/{prompty_version()}",
+                    "x-ms-useragent": f"prompty/{prompty_version()}",
                 },
                 **self.kwargs,
             )
@@ -0,0 +1,256 @@
+import importlib.metadata
+import importlib.util
+import json
+import mmap
+import pickle
+import typing
+from dataclasses import fields, is_dataclass, replace
+from pathlib import Path
+from typing import Union
+
+import jinja2
+
+from .core import Prompty
+from .invoker import InvokerFactory
+from .loader import PromptyLoader
+from .renderers import export_compiled, import_compiled
+from .utils import prompty_version
+
+# file layout: MAGIC, 2 byte format version, 4 byte header length,
+# json header, pickled payload
+MAGIC = b"PROMPTYB"
+FORMAT_VERSION = 1
+# prompty version recorded when the package metadata is missing
+SOURCE_VERSION = "source"
+
+
+def _is_env_reference(attribute: str) -> bool:
+    attribute = attribute.strip()
+    return attribute.startswith("${env:") and attribute.endswith("}")
+
+
+class _BundleLoader(PromptyLoader):
+    """Loader that leaves ${env:...} references unresolved.
+
+    Environment variables (typically keys and endpoints) are resolved when
+    the bundle is loaded, so they are never written to the bundle.
+    """
+
+    def _normalize(self, attribute: typing.Any, parent: Path, deps: set) -> typing.Any:
+        if isinstance(attribute, str) and _is_env_reference(attribute):
+            return attribute.strip()
+        return super()._normalize(attribute, parent, deps)
+
+
+def _transform(
+    obj: typing.Any,
+    leaf: typing.Callable[[typing.Any], typing.Any],
+    memo: dict[int, typing.Any],
+) -> typing.Any:
+    # rebuilds only what changed so shared (base) objects stay shared
+    if id(obj) in memo:
+        return memo[id(obj)]
+
+    result = obj
+    if isinstance(obj, (str, Path)):
+        result = leaf(obj)
+    elif isinstance(obj, list):
+        values = [_transform(v, leaf, memo) for v in obj]
+        if any(a is not b for a, b in zip(values, obj)):
+            result = values
+    elif isinstance(obj, dict):
+        items = {k: _transform(v, leaf, memo) for k, v in obj.items()}
+        if any(items[k] is not v for k, v in obj.items()):
+            result = items
+    elif is_dataclass(obj) and not isinstance(obj, type):
+        changes = {}
+        for f in fields(obj):
+            # the template body is not front matter
+            if isinstance(obj, Prompty) and f.name == "content":
+                continue
+            value = getattr(obj, f.name)
+            new = _transform(value, leaf, memo)
+            if new is not value:
+                changes[f.name] = new
+        if changes:
+            result = replace(obj, **changes)
+            if isinstance(result, Prompty):
+                result.freeze()
+
+    memo[id(obj)] = result
+    return result
+
+
+def _header() -> dict[str, str]:
+    try:
+        version = prompty_version()
+    except importlib.metadata.PackageNotFoundError:
+        # running from a source checkout that is not installed
+        version = SOURCE_VERSION
+    return {
+        "python": importlib.util.MAGIC_NUMBER.hex(),
+        "prompty": version,
+        "jinja2": jinja2.__version__,
+    }
+
+
+def _templates(prompty: Prompty) -> dict[str, str]:
+    templates: dict[str, str] = {}
+    current: Union[Prompty, None] = prompty
+    while current is not None:
+        if isinstance(current.content, str):
+            templates[Path(current.file).name] = current.content
+        current = current.basePrompty
+    return templates
+
+
+def compile_bundle(
+    source: Union[str, Path],
+    output: Union[str, Path],
+    pattern: str = "**/*.prompty",
+    configuration: str = "default",
+) -> dict[str, Prompty]:
+    """Compile prompties into a single bundle for fast cold starts.
+
+    The bundle holds the loaded prompties (front matter parsed, ${file:...}
+    references inlined, prompty.json applied), compiled Jinja code and
+    tokenized mustache templates. ${env:...} references are kept and
+    resolved by ``load_bundle``. Paths are stored relative to the source
+    directory.
+
+    Parameters
+    ----------
+    source : str | Path
+        A prompty file or a directory to search
+    output : str | Path
+        The bundle file to write
+    pattern : str, optional
+        Glob pattern used when source is a directory, by default "**/*.prompty"
+    configuration : str, optional
+        The prompty.json configuration to use, by default "default"
+
+    Returns
+    -------
+    dict[str, Prompty]
+        The bundled prompties by key (path relative to the source directory,
+        without the .prompty suffix)
+    """
+    source = Path(source).resolve().absolute()
+    root = source if source.is_dir() else source.parent
+    files = sorted(root.glob(pattern)) if source.is_dir() else [source]
+
+    loader = _BundleLoader(configuration)
+    prompties = {
+        f.relative_to(root).with_suffix("").as_posix(): loader.load(f) for f in files
+    }
+
+    compiled: dict[str, list] = {"jinja": [], "mustache": []}
+    for prompty in prompties.values():
+        name = InvokerFactory._get_name("renderer", prompty)
+        if name in ["jinja2", "mustache"]:
+            exported = export_compiled(_templates(prompty), name)
+            compiled["jinja"].extend(exported["jinja"])
+            compiled["mustache"].extend(exported["mustache"])
+
+    def relative(value: typing.Any) -> typing.Any:
+        if isinstance(value, Path) and value.is_relative_to(root):
+            return value.relative_to(root)
+        return value
+
+    memo: dict[int, typing.Any] = {}
+    payload = {
+        "prompties": {k: _transform(p, relative, memo) for k, p in prompties.items()},
+        "compiled": compiled,
+    }
+
+    header = json.dumps(_header()).encode("utf-8")
+    with open(output, "wb") as f:
+        f.write(MAGIC)
+        f.write(FORMAT_VERSION.to_bytes(2, "little"))
+        f.write(len(header).to_bytes(4, "little"))
+        f.write(header)
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    return prompties
+
+
+def _read_payload(data: typing.Any, path: Path) -> typing.Any:
+    # data is bytes or an mmap; both slice to bytes
+    if data[: len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a prompty bundle")
+    offset = len(MAGIC)
+    version = int.from_bytes(data[offset : offset + 2], "little")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported prompty bundle format {version} in {path}")
+    size = int.from_bytes(data[offset + 2 : offset + 6], "little")
+    header = json.loads(data[offset + 6 : offset + 6 + size])
+    expected = _header()
+    if header != expected:
+        raise ValueError(
+            f"Prompty bundle {path} was compiled for {header}, "
+            f"this runtime is {expected}; recompile it"
+        )
+    # unpickle straight from the (mapped) buffer without copying it
+    with memoryview(data) as view, view[offset + 6 + size :] as payload:
+        return pickle.loads(payload)
+
+
+def load_bundle(
+    bundle: Union[str, Path],
+    base_dir: Union[str, Path, None] = None,
+    use_mmap: bool = True,
+) -> dict[str, Prompty]:
+    """Load a bundle written by ``compile_bundle``.
+
+    Bundles are pickles: loading one can run arbitrary code, so only load
+    bundles you built yourself or otherwise trust.
+
+    Parameters
+    ----------
+    bundle : str | Path
+        The bundle file
+    base_dir : str | Path, optional
+        Directory the bundled paths are relative to, by default the
+        directory containing the bundle
+    use_mmap : bool, optional
+        Memory-map the bundle instead of reading it, by default True
+
+    Returns
+    -------
+    dict[str, Prompty]
+        The prompties by key, ready to execute
+
+    Raises
+    ------
+    ValueError
+        If the file is not a bundle or was compiled for a different runtime
+
+    Example
+    -------
+    >>> prompties = prompty.load_bundle("prompts.bundle")
+    >>> result = prompty.execute(prompties["basic"], inputs={...})
+    """
+    path = Path(bundle)
+    root = Path(base_dir) if base_dir is not None else path.resolve().parent
+
+    with open(path, "rb") as f:
+        if use_mmap:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                payload = _read_payload(data, path)
+        else:
+            payload = _read_payload(f.read(), path)
+
+    import_compiled(payload["compiled"])
+
+    def resolve(value: typing.Any) -> typing.Any:
+        if isinstance(value, Path):
+            return value if value.is_absolute() else root / value
+        if _is_env_reference(value):
+            return Prompty.normalize(value, root)
+        return value
+
+    memo: dict[int, typing.Any] = {}
+    return {
+        key: _transform(p, resolve, memo).freeze()
+        for key, p in payload["prompties"].items()
+    }
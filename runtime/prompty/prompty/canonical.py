@@ -0,0 +1,129 @@
+import base64
+import dataclasses
+import enum
+import hashlib
+import json
+import math
+import typing
+from pathlib import PurePath
+
+from .core import Prompty
+from .resilience import connection_key
+
+# bytes of the request hash (128 bits)
+DIGEST_SIZE = 16
+
+
+def canonicalize(value: typing.Any, keep_order: bool = False) -> typing.Any:
+    """Normalize a payload so equal requests serialize to the same bytes.
+
+    Object keys are sorted, except the properties of a json schema (their
+    order is the order a model generates them in); lists keep their order.
+    Integral floats become ints (``1.0`` and ``1`` are the same request),
+    ``-0.0`` becomes ``0``, sets are sorted, enums become their values and
+    pydantic models / dataclasses plain objects.
+
+    Parameters
+    ----------
+    value : any
+        The payload
+    keep_order : bool, optional
+        Keep the key order of this (top level) object, by default False
+
+    Returns
+    -------
+    any
+        The json compatible, normalized payload
+    """
+    if value is None or isinstance(value, (str, bool)):
+        return value
+    if isinstance(value, int):
+        return int(value)
+    if isinstance(value, float):
+        if not math.isfinite(value):
+            raise ValueError(f"{value} has no canonical json representation")
+        return int(value) if value.is_integer() else value
+    if isinstance(value, dict):
+        keys = list(value) if keep_order else sorted(value, key=str)
+        return {str(k): canonicalize(value[k], k == "properties") for k in keys}
+    if isinstance(value, (list, tuple)):
+        return [canonicalize(v) for v in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted((canonicalize(v) for v in value), key=canonical_json)
+    if isinstance(value, enum.Enum):
+        return canonicalize(value.value)
+    if isinstance(value, PurePath):
+        return value.as_posix()
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(value).decode("ascii")
+    if hasattr(value, "model_dump"):
+        return canonicalize(value.model_dump(mode="json", exclude_none=True))
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return canonicalize({f.name: getattr(value, f.name) for f in dataclasses.fields(value)})
+    raise TypeError(f"{type(value).__name__} has no canonical json representation")
+
+
+def canonical_json(value: typing.Any) -> str:
+    """Serialize a payload canonically (see canonicalize), without
+    insignificant whitespace.
+
+    Parameters
+    ----------
+    value : any
+        The payload
+
+    Returns
+    -------
+    str
+        The canonical json
+    """
+    return json.dumps(
+        canonicalize(value),
+        ensure_ascii=False,
+        separators=(",", ":"),
+        allow_nan=False,
+    )
+
+
+def canonical_hash(value: typing.Any) -> str:
+    """Hash the canonical json of a payload (blake2b, 128 bits).
+
+    Parameters
+    ----------
+    value : any
+        The payload
+
+    Returns
+    -------
+    str
+        The hex digest
+    """
+    data = canonical_json(value).encode("utf-8")
+    return hashlib.blake2b(data, digest_size=DIGEST_SIZE).hexdigest()
+
+
+def request_key(prompty: Prompty, data: typing.Any) -> str:
+    """Identifies an executor request: the connection, api, parameters and
+    the content sent. Equal keys mean interchangeable responses (for caches
+    and request deduplication).
+
+    Parameters
+    ----------
+    prompty : Prompty
+        The prompty executing the request
+    data : any
+        The content sent to the executor
+
+    Returns
+    -------
+    str
+        The request hash
+    """
+    return canonical_hash(
+        {
+            "connection": connection_key(prompty),
+            "api": prompty.model.api,
+            "parameters": prompty.model.parameters,
+            "data": data,
+        }
+    )
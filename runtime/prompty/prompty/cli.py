@@ -9,6 +9,8 @@ from dotenv import load_dotenv
 from dataclasses import asdict, is_dataclass
 
 import prompty
+from prompty.invoker import InvokerFactory
+from prompty.session import ChatSession
 from prompty.tracer import PromptyTracer, Tracer, console_tracer, trace
 
 
@@ -28,7 +30,10 @@ def normalize_path(p, create_dir=False) -> Path:
 
 
 def dynamic_import(module: str):
-    # built in modules
+    # registered (built in and entry point) invokers are imported on first use
+    if InvokerFactory.has("executor", module):
+        return
+
     if module == "azure" or module == "azure_openai":
         t = "prompty.azure"
     elif module == "serverless":
@@ -51,29 +56,31 @@ def chat_mode(prompt_path: str):
     B = "\033[34m"  # blue
     #P = "\033[35m"  # purple
     print(f"Executing {str(prompt_path)} in chat mode...")
-    p = prompty.load(str(prompt_path))
-    if "chat_history" not in p.sample:
-        print(
-            f"{R}{str(prompt_path)} needs to have a chat_history input to work in chat mode{W}"
-        )
-        return
-    else:
+    with prompty.PromptyWatcher() as watcher:
+        handle = watcher.watch(prompt_path)
+        p = handle.prompty
+        if "chat_history" not in p.sample:
+            print(
+                f"{R}{str(prompt_path)} needs to have a chat_history input to work in chat mode{W}"
+            )
+            return
 
         try:
             # load executor / processor types
             dynamic_import(p.model.configuration["type"])
-            chat_history = p.sample["chat_history"]
+            # renders the template once, turns are appended as they come
+            session = ChatSession(p, {"chat_history": p.sample["chat_history"]})
             while True:
                 user_input = input(f"\n{B}User:{W} ")
                 if user_input == "exit":
                     break
-                # reloadable prompty file
-                chat_history.append({"role": "user", "content": user_input})
-                result = prompty.execute(
-                    prompt_path, inputs={"chat_history": chat_history}
-                )
+                # edits to the prompty file are picked up by the watcher
+                if handle.error is not None:
+                    print(f"{R}Reload failed, using the previous version: {handle.error}{W}")
+                if handle.prompty is not session.prompty:
+                    session.reload(handle.prompty)
+                result = session.send(user_input)
                 print(f"\n{G}Assistant:{W} {result}")
-                chat_history.append({"role": "assistant", "content": result})
         except Exception as e:
             print(f"{type(e).__qualname__}: {e}")
 
@@ -161,5 +168,29 @@ def run(source, env, verbose, chat, inputs):
         execute(str(prompt_path), inputs=inputs, raw=verbose)
 
 
+@click.command(name="compile")
+@click.option("--source", "-s", required=True, help="Prompty file or directory")
+@click.option("--output", "-o", required=True, help="Bundle file to write")
+@click.option("--pattern", "-p", default="**/*.prompty", show_default=True)
+@click.option("--config", "-c", default="default", show_default=True)
+def compile_bundle(source, output, pattern, config):
+    """Compile prompties into a bundle for prompty.load_bundle.
+
+    ${env:...} references are resolved when the bundle is loaded, not here.
+    """
+    source_path = normalize_path(source)
+    if not source_path.exists():
+        print(f"{str(source_path)} does not exist")
+        return
+
+    output_path = normalize_path(output)
+    prompties = prompty.compile_bundle(
+        source_path, output_path, pattern=pattern, configuration=config
+    )
+    for key in prompties:
+        print(f"  {key}")
+    print(f"Compiled {len(prompties)} prompty file(s) into {str(output_path)}")
+
+
 if __name__ == "__main__":
     chat_mode(source="./tests/prompts/basic.prompt")
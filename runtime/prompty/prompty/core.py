@@ -1,12 +1,84 @@
-import copy
 import os
+import sys
 import typing
 from collections.abc import AsyncIterator, Iterator
-from dataclasses import dataclass, field, fields, asdict
+from dataclasses import (
+    FrozenInstanceError,
+    dataclass,
+    field,
+    fields,
+    is_dataclass,
+    replace,
+)
 from pathlib import Path
 from typing import Any, Dict, List, Literal, Union
 from .tracer import Tracer, to_dict
-from .utils import load_json, load_json_async
+from .utils import load_json, load_json_async, run_in_thread
+
+
+# model.configuration keys used by the runtime itself, executors do not
+# pass them on to their clients
+RUNTIME_CONFIGURATION_KEYS = ["type", "resilience", "context_window", "stable_prefix"]
+
+
+def _add_slots(cls: typing.Any) -> type:
+    # python 3.9 fallback for dataclass(slots=True): rebuild the class
+    # with __slots__ for its fields (defaults live in the generated __init__)
+    field_names = tuple(f.name for f in fields(cls))
+    cls_dict = dict(cls.__dict__)
+    cls_dict["__slots__"] = field_names
+    for name in (*field_names, "__dict__", "__weakref__"):
+        cls_dict.pop(name, None)
+    slotted = type(cls)(cls.__name__, cls.__bases__, cls_dict)
+    slotted.__qualname__ = cls.__qualname__
+    return slotted
+
+
+# dataclass(slots=True) needs python 3.10, older versions get the
+# slots added after the fact by _slots_fallback
+_SLOTS: dict[str, typing.Any] = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+_T = typing.TypeVar("_T", bound=type)
+
+
+def _slots_fallback(cls: _T) -> _T:
+    if "__slots__" in cls.__dict__:
+        return cls
+    return typing.cast(_T, _add_slots(cls))
+
+
+def _shallow_asdict(obj: typing.Any) -> dict[str, typing.Any]:
+    """Like dataclasses.asdict without the deep copy: nested settings objects
+    are converted, plain containers are shared with the original."""
+    d: dict[str, typing.Any] = {}
+    for f in fields(obj):
+        value = getattr(obj, f.name)
+        if is_dataclass(value) and not isinstance(value, type):
+            value = _shallow_asdict(value)
+        elif isinstance(value, dict) and any(is_dataclass(v) for v in value.values()):
+            value = {
+                k: _shallow_asdict(v) if is_dataclass(v) else v
+                for k, v in value.items()
+            }
+        d[f.name] = value
+    return d
+
+
+class _Freezable:
+    """Mixin allowing a settings object to be made read-only once it is shared."""
+
+    __slots__ = ("_frozen",)
+
+    def __setattr__(self, name: str, value: typing.Any) -> None:
+        if getattr(self, "_frozen", False):
+            raise FrozenInstanceError(
+                f"cannot assign to field '{name}' of frozen {type(self).__name__}"
+            )
+        object.__setattr__(self, name, value)
+
+    def freeze(self):
+        object.__setattr__(self, "_frozen", True)
+        return self
 
 
 @dataclass
@@ -16,8 +88,9 @@ class ToolCall:
     arguments: str
 
 
-@dataclass
-class PropertySettings:
+@_slots_fallback
+@dataclass(**_SLOTS)
+class PropertySettings(_Freezable):
     """PropertySettings class to define the properties of the model
 
     Attributes
@@ -28,15 +101,20 @@ class PropertySettings:
         The default value of the property
     description : str
         The description of the property
+    pack : dict
+        How an array input may be packed into the context window (see
+        prompty.packing), by default not packed
     """
 
     type: Literal["string", "number", "array", "object", "boolean"]
     default: Union[str, int, float, list, dict, bool, None] = field(default=None)
     description: str = field(default="")
+    pack: dict = field(default_factory=dict)
 
 
-@dataclass
-class ModelSettings:
+@_slots_fallback
+@dataclass(**_SLOTS)
+class ModelSettings(_Freezable):
     """ModelSettings class to define the model of the prompty
 
     Attributes
@@ -57,8 +135,9 @@ class ModelSettings:
     response: dict = field(default_factory=dict)
 
 
-@dataclass
-class TemplateSettings:
+@_slots_fallback
+@dataclass(**_SLOTS)
+class TemplateSettings(_Freezable):
     """TemplateSettings class to define the template of the prompty
 
     Attributes
@@ -73,8 +152,9 @@ class TemplateSettings:
     parser: str = field(default="")
 
 
-@dataclass
-class Prompty:
+@_slots_fallback
+@dataclass(**_SLOTS)
+class Prompty(_Freezable):
     """Prompty class to define the prompty
 
     Attributes
@@ -140,11 +220,14 @@ class Prompty:
             v = getattr(self, field.name)
             if v != "" and v != {} and v != [] and v is not None:
                 if k == "model":
-                    d[k] = asdict(self.model)
+                    d[k] = _shallow_asdict(self.model)
                 elif k == "template":
-                    d[k] = asdict(self.template)
+                    d[k] = _shallow_asdict(self.template)
                 elif k == "inputs" or k == "outputs":
-                    d[k] = copy.deepcopy(v)
+                    d[k] = {
+                        key: _shallow_asdict(value) if is_dataclass(value) else value
+                        for key, value in v.items()
+                    }
                 elif k == "file":
                     d[k] = (
                         str(self.file.as_posix())
@@ -159,6 +242,100 @@ class Prompty:
                     d[k] = v
         return d
 
+    def to_dict(self) -> dict[str, typing.Any]:
+        """Serialize every field without deep copying (containers such as the
+        model configuration are shared with this prompty and must not be
+        modified).
+
+        Returns
+        -------
+        dict
+            The prompty as a dictionary
+        """
+        return _shallow_asdict(self)
+
+    def freeze(self) -> "Prompty":
+        """Make this prompty (and its nested settings and base chain) read-only
+        so a single instance can be shared across threads, tasks and caches.
+        The runtime never mutates a prompty; per-call changes go through
+        with_overrides.
+
+        Returns
+        -------
+        Prompty
+            This prompty
+        """
+        self.model.freeze()
+        self.template.freeze()
+        for value in [*self.inputs.values(), *self.outputs.values()]:
+            if isinstance(value, _Freezable):
+                value.freeze()
+        if self.basePrompty is not None:
+            self.basePrompty.freeze()
+        # no zero-argument super(): slotted dataclasses are rebuilt classes
+        return _Freezable.freeze(self)
+
+    def with_overrides(
+        self,
+        configuration: dict[str, typing.Any] = {},
+        parameters: dict[str, typing.Any] = {},
+    ) -> "Prompty":
+        """Create a per-call view of this prompty with configuration and
+        parameter overrides layered on top. The original is left untouched
+        and everything apart from the model settings is shared.
+
+        Parameters
+        ----------
+        configuration : Dict[str, any], optional
+            The configuration overrides, by default {}
+        parameters : Dict[str, any], optional
+            The parameter overrides, by default {}
+
+        Returns
+        -------
+        Prompty
+            This prompty when there is nothing to override, otherwise a new one
+        """
+        if configuration == {} and parameters == {}:
+            return self
+
+        return self.derive(
+            model={"configuration": configuration, "parameters": parameters}
+        )
+
+    def derive(self, **changes: typing.Any) -> "Prompty":
+        """Create a variant of this prompty (e.g. a per-tenant override) that
+        shares every unchanged nested settings object with it.
+
+        Parameters
+        ----------
+        **changes : any
+            Prompty fields to replace. ``model`` may be a dict whose
+            configuration / parameters / response entries are layered over
+            this prompty's (other model keys are replaced).
+
+        Returns
+        -------
+        Prompty
+            The derived prompty
+
+        Example
+        -------
+        >>> tenant = base.derive(model={"parameters": {"temperature": 0}}, name="tenant")
+        """
+        model = changes.get("model")
+        if isinstance(model, dict):
+            updates: dict[str, typing.Any] = {
+                key: (
+                    param_hoisting(value, getattr(self.model, key))
+                    if isinstance(value, dict)
+                    else value
+                )
+                for key, value in model.items()
+            }
+            changes["model"] = replace(self.model, **updates)
+        return replace(self, **changes)
+
     @staticmethod
     def hoist_base_prompty(top: "Prompty", base: "Prompty") -> "Prompty":
         top.name = base.name if top.name == "" else top.name
@@ -201,14 +378,14 @@ class Prompty:
 
     @staticmethod
     async def _process_file_async(file: str, parent: Path) -> typing.Any:
-        f = Path(parent / Path(file)).resolve().absolute()
-        if f.exists():
+        f = await run_in_thread(_existing_file, parent / Path(file))
+        if f is not None:
             items = await load_json_async(f)
             if isinstance(items, list):
-                return [Prompty.normalize(value, parent) for value in items]
+                return [await Prompty.normalize_async(value, parent) for value in items]
             elif isinstance(items, dict):
                 return {
-                    key: Prompty.normalize(value, parent)
+                    key: await Prompty.normalize_async(value, parent)
                     for key, value in items.items()
                 }
             else:
@@ -291,6 +468,76 @@ class Prompty:
             return attribute
 
 
+def _existing_file(path: Path) -> Union[Path, None]:
+    f = path.resolve().absolute()
+    return f if f.exists() else None
+
+
+def _load_raw_prompty(attributes: dict, content: str, p: Path, global_config: dict):
+    if "model" not in attributes:
+        attributes["model"] = {}
+
+    if "configuration" not in attributes["model"]:
+        attributes["model"]["configuration"] = global_config
+    else:
+        attributes["model"]["configuration"] = param_hoisting(
+            attributes["model"]["configuration"],
+            global_config,
+        )
+
+    # pull model settings out of attributes
+    try:
+        model = ModelSettings(**attributes.pop("model"))
+    except Exception as e:
+        raise ValueError(f"Error in model settings: {e}")
+
+    # pull template settings
+    try:
+        if "template" in attributes:
+            t = attributes.pop("template")
+            if isinstance(t, dict):
+                template = TemplateSettings(**t)
+            # has to be a string denoting the type
+            else:
+                template = TemplateSettings(type=t, parser="prompty")
+        else:
+            template = TemplateSettings(type="jinja2", parser="prompty")
+    except Exception as e:
+        raise ValueError(f"Error in template loader: {e}")
+
+    # formalize inputs and outputs
+    if "inputs" in attributes:
+        try:
+            inputs = {
+                k: PropertySettings(**v) for (k, v) in attributes.pop("inputs").items()
+            }
+        except Exception as e:
+            raise ValueError(f"Error in inputs: {e}")
+    else:
+        inputs = {}
+    if "outputs" in attributes:
+        try:
+            outputs = {
+                k: PropertySettings(**v) for (k, v) in attributes.pop("outputs").items()
+            }
+        except Exception as e:
+            raise ValueError(f"Error in outputs: {e}")
+    else:
+        outputs = {}
+
+    prompty = Prompty(
+        model=model,
+        inputs=inputs,
+        outputs=outputs,
+        template=template,
+        content=content,
+        file=p,
+        **attributes
+    )
+
+    return prompty
+
+
 def param_hoisting(
     top: dict[str, typing.Any],
     bottom: dict[str, typing.Any],
@@ -306,20 +553,62 @@ def param_hoisting(
     return new_dict
 
 
+def _close(iterator: typing.Any) -> None:
+    close = getattr(iterator, "close", None)
+    if close is not None:
+        close()
+
+
+async def _aclose(iterator: typing.Any) -> None:
+    # async generators and azure sdk streams have aclose(), openai's
+    # AsyncStream has an async close()
+    close = getattr(iterator, "aclose", None) or getattr(iterator, "close", None)
+    if close is not None:
+        result = close()
+        if hasattr(result, "__await__"):
+            await result
+
+
 class PromptyStream(Iterator):
     """PromptyStream class to iterate over LLM stream.
-    Necessary for Prompty to handle streaming data when tracing."""
+    Necessary for Prompty to handle streaming data when tracing.
 
-    def __init__(self, name: str, iterator: Iterator):
+    Closing the stream (or leaving a ``with`` block) before it is exhausted
+    closes the underlying response, so the service stops generating.
+
+    Attributes
+    ----------
+    name : str
+        The name of the invoker that created the stream
+    iterator : Iterator
+        The iterator being wrapped
+    source : Iterator, optional
+        The stream the iterator reads from, closed along with it
+    """
+
+    def __init__(
+        self, name: str, iterator: Iterator, source: Union[Iterator, None] = None
+    ):
         self.name = name
         self.iterator = iterator
+        self.source = source
         self.items: list[typing.Any] = []
         self.__name__ = "PromptyStream"
+        self._closed = False
+        self._traced = False
 
     def __iter__(self):
         return self
 
+    def __enter__(self) -> "PromptyStream":
+        return self
+
+    def __exit__(self, *args: typing.Any) -> None:
+        self.close()
+
     def __next__(self):
+        if self._closed:
+            raise StopIteration
         try:
             # enumerate but add to list
             o = self.iterator.__next__()
@@ -329,42 +618,167 @@ class PromptyStream(Iterator):
         except StopIteration:
             # StopIteration is raised
             # contents are exhausted
-            if len(self.items) > 0:
-                with Tracer.start("PromptyStream") as trace:
-                    trace("signature", f"{self.name}.PromptyStream")
-                    trace("inputs", "None")
-                    trace("result", [to_dict(s) for s in self.items])
-
+            self._trace()
             raise StopIteration
 
+    def close(self) -> None:
+        """Stop iterating and close the underlying response."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            _close(self.iterator)
+        finally:
+            if self.source is not None:
+                _close(self.source)
+            self._trace()
+
+    def _trace(self) -> None:
+        if len(self.items) > 0 and not self._traced:
+            self._traced = True
+            with Tracer.start("PromptyStream") as trace:
+                trace("signature", f"{self.name}.PromptyStream")
+                trace("inputs", "None")
+                trace("result", [to_dict(s) for s in self.items])
+
 
 class AsyncPromptyStream(AsyncIterator):
     """AsyncPromptyStream class to iterate over LLM stream.
-    Necessary for Prompty to handle streaming data when tracing."""
+    Necessary for Prompty to handle streaming data when tracing.
+
+    ``aclose()`` (or leaving an ``async with`` block) propagates to the
+    underlying SDK stream, closing the HTTP response so the service stops
+    generating and the pooled connection is released. Chunks are read on
+    demand unless ``read_ahead`` is set, in which case a bounded buffer is
+    filled in the background and reading pauses while it is full.
+
+    Attributes
+    ----------
+    name : str
+        The name of the invoker that created the stream
+    iterator : AsyncIterator
+        The iterator being wrapped
+    source : AsyncIterator, optional
+        The stream the iterator reads from, closed along with it
+
+    Example
+    -------
+    >>> async with await prompty.execute_async(p, inputs=...) as stream:
+    ...     async for chunk in stream.read_ahead(16):
+    ...         await websocket.send_text(chunk)
+    """
 
-    def __init__(self, name: str, iterator: AsyncIterator):
+    def __init__(
+        self,
+        name: str,
+        iterator: AsyncIterator,
+        source: Union[AsyncIterator, None] = None,
+    ):
         self.name = name
         self.iterator = iterator
+        self.source = source
         self.items: list[typing.Any] = []
         self.__name__ = "AsyncPromptyStream"
+        self._closed = False
+        self._traced = False
+        self._read_ahead = 0
+        self._queue: typing.Any = None
+        self._reader: typing.Any = None
 
     def __aiter__(self):
         return self
 
+    async def __aenter__(self) -> "AsyncPromptyStream":
+        return self
+
+    async def __aexit__(self, *args: typing.Any) -> None:
+        await self.aclose()
+
+    def read_ahead(self, size: int) -> "AsyncPromptyStream":
+        """Buffer up to ``size`` chunks ahead of the consumer.
+
+        Parameters
+        ----------
+        size : int
+            The maximum number of buffered chunks
+
+        Returns
+        -------
+        AsyncPromptyStream
+            The stream itself
+        """
+        if size < 1:
+            raise ValueError("read_ahead size must be at least 1")
+        if self._reader is not None or self.items:
+            raise ValueError("read_ahead must be set before iterating the stream")
+        self._read_ahead = size
+        return self
+
     async def __anext__(self):
+        if self._closed:
+            raise StopAsyncIteration
         try:
             # enumerate but add to list
-            o = await self.iterator.__anext__()
+            if self._read_ahead:
+                o = await self._next_buffered()
+            else:
+                o = await self.iterator.__anext__()
             self.items.append(o)
             return o
 
         except StopAsyncIteration:
             # StopIteration is raised
             # contents are exhausted
-            if len(self.items) > 0:
-                with Tracer.start("AsyncPromptyStream") as trace:
-                    trace("signature", f"{self.name}.AsyncPromptyStream")
-                    trace("inputs", "None")
-                    trace("result", [to_dict(s) for s in self.items])
+            self._trace()
+            raise StopAsyncIteration
 
+    async def aclose(self) -> None:
+        """Stop iterating and close the underlying response."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if self._reader is not None:
+                import asyncio
+
+                self._reader.cancel()
+                await asyncio.gather(self._reader, return_exceptions=True)
+            await _aclose(self.iterator)
+        finally:
+            if self.source is not None:
+                await _aclose(self.source)
+            self._trace()
+
+    async def _next_buffered(self) -> typing.Any:
+        if self._reader is None:
+            import asyncio
+
+            self._queue = asyncio.Queue(maxsize=self._read_ahead)
+            self._reader = asyncio.ensure_future(self._read())
+        kind, value = await self._queue.get()
+        if kind != "item":
+            # the reader is done, keep the outcome for later calls
+            self._queue.put_nowait((kind, value))
+        if kind == "error":
+            raise value
+        if kind == "end":
             raise StopAsyncIteration
+        return value
+
+    async def _read(self) -> None:
+        # put() waits while the buffer is full, so a slow consumer stops
+        # reading from the connection instead of growing the buffer
+        try:
+            async for o in self.iterator:
+                await self._queue.put(("item", o))
+            await self._queue.put(("end", None))
+        except Exception as e:
+            await self._queue.put(("error", e))
+
+    def _trace(self) -> None:
+        if len(self.items) > 0 and not self._traced:
+            self._traced = True
+            with Tracer.start("AsyncPromptyStream") as trace:
+                trace("signature", f"{self.name}.AsyncPromptyStream")
+                trace("inputs", "None")
+                trace("result", [to_dict(s) for s in self.items])
@@ -1,8 +1,15 @@
 import abc
+import contextlib
+import importlib
 import typing
-from typing import Callable, Literal
+from typing import Callable, Literal, Union
 
 from .core import Prompty
+from .prefix import stable_prompty
+from .ratelimit import RateLimiter, estimate_tokens
+from .resilience import Resilience
+from .scheduler import Scheduler
+from .singleflight import SingleFlight
 from .tracer import trace
 
 
@@ -87,30 +94,153 @@ class Invoker(abc.ABC):
         return await self.invoke_async(data)
 
 
+# an invoker class, or "module:attribute" to import it on first use
+InvokerRegistration = Union[type[Invoker], str]
+
+# entry point group for invokers, named "<type>:<name>" (e.g. "executor:azure")
+ENTRY_POINT_GROUP = "prompty.invokers"
+
+
 class InvokerFactory:
-    """Factory class for Invoker"""
+    """Factory class for Invoker
+
+    Invokers can be registered as classes or as "module:attribute" strings;
+    the latter are imported the first time a prompty needs them, so provider
+    SDKs are not loaded until they are used. Installed packages can also
+    publish invokers as entry points in the "prompty.invokers" group, named
+    "<type>:<name>"; these are looked up the first time an unknown name is
+    requested and never replace explicit registrations.
+
+    Example
+    -------
+    >>> InvokerFactory.add_executor("custom", "my_package.executor:CustomExecutor")
 
-    _renderers: dict[str, type[Invoker]] = {}
-    _parsers: dict[str, type[Invoker]] = {}
-    _executors: dict[str, type[Invoker]] = {}
-    _processors: dict[str, type[Invoker]] = {}
+    or, in the pyproject.toml of the package providing the invoker
+
+    >>> [project.entry-points."prompty.invokers"]
+    >>> "executor:custom" = "my_package.executor:CustomExecutor"
+    """
+
+    _renderers: dict[str, InvokerRegistration] = {}
+    _parsers: dict[str, InvokerRegistration] = {}
+    _executors: dict[str, InvokerRegistration] = {}
+    _processors: dict[str, InvokerRegistration] = {}
+    _entry_points_loaded: bool = False
 
     @classmethod
-    def add_renderer(cls, name: str, invoker: type[Invoker]) -> None:
+    def add_renderer(cls, name: str, invoker: InvokerRegistration) -> None:
         cls._renderers[name] = invoker
 
     @classmethod
-    def add_parser(cls, name: str, invoker: type[Invoker]) -> None:
+    def add_parser(cls, name: str, invoker: InvokerRegistration) -> None:
         cls._parsers[name] = invoker
 
     @classmethod
-    def add_executor(cls, name: str, invoker: type[Invoker]) -> None:
+    def add_executor(cls, name: str, invoker: InvokerRegistration) -> None:
         cls._executors[name] = invoker
 
     @classmethod
-    def add_processor(cls, name: str, invoker: type[Invoker]) -> None:
+    def add_processor(cls, name: str, invoker: InvokerRegistration) -> None:
         cls._processors[name] = invoker
 
+    @classmethod
+    def import_module(cls, module: str) -> typing.Any:
+        """Import a module that registers invokers without letting it replace
+        invoker classes that were already registered explicitly (e.g. test
+        fakes added before the real module is loaded lazily).
+
+        Parameters
+        ----------
+        module : str
+            The module to import
+
+        Returns
+        -------
+        module
+            The imported module
+        """
+        registries = [cls._renderers, cls._parsers, cls._executors, cls._processors]
+        explicit = [
+            {k: v for k, v in r.items() if not isinstance(v, str)} for r in registries
+        ]
+        try:
+            return importlib.import_module(module)
+        except ImportError as e:
+            parts = module.split(".")
+            extra = parts[1] if parts[0] == "prompty" and len(parts) > 1 else parts[0]
+            raise InvokerException(f"Error importing {module}: {e}", extra)
+        finally:
+            for registry, classes in zip(registries, explicit):
+                registry.update(classes)
+
+    @classmethod
+    def _registry(
+        cls, type: Literal["renderer", "parser", "executor", "processor"]
+    ) -> dict[str, InvokerRegistration]:
+        registries = {
+            "renderer": cls._renderers,
+            "parser": cls._parsers,
+            "executor": cls._executors,
+            "processor": cls._processors,
+        }
+        if type not in registries:
+            raise ValueError(f"Type {type} not found")
+        return registries[type]
+
+    @classmethod
+    def load_entry_points(cls) -> None:
+        """Register (without importing) the invokers published as entry points.
+
+        Called automatically the first time an unknown invoker is requested;
+        call it again to pick up packages installed since.
+        """
+        import importlib.metadata
+
+        try:
+            entry_points = importlib.metadata.entry_points(group=ENTRY_POINT_GROUP)
+        except TypeError:
+            # python 3.9
+            all_entry_points: typing.Any = importlib.metadata.entry_points()
+            entry_points = all_entry_points.get(ENTRY_POINT_GROUP, [])
+
+        for entry_point in entry_points:
+            type, _, name = entry_point.name.partition(":")
+            try:
+                registry = cls._registry(type)  # type: ignore
+            except ValueError:
+                continue
+            # explicitly registered (or already imported) invokers win
+            registry.setdefault(name, entry_point.value)
+        cls._entry_points_loaded = True
+
+    @classmethod
+    def has(
+        cls, type: Literal["renderer", "parser", "executor", "processor"], name: str
+    ) -> bool:
+        """Whether an invoker is registered (including entry points)."""
+        registry = cls._registry(type)
+        if name not in registry and not cls._entry_points_loaded:
+            cls.load_entry_points()
+        return name in registry
+
+    @classmethod
+    def _resolve(
+        cls, registry: dict[str, InvokerRegistration], name: str
+    ) -> type[Invoker]:
+        invoker = registry[name]
+        if isinstance(invoker, str):
+            module, _, attribute = invoker.partition(":")
+            imported = cls.import_module(module)
+            if attribute:
+                resolved = getattr(imported, attribute)
+                registry[name] = resolved
+                return resolved
+            # a plain module registers its invokers when imported
+            invoker = registry[name]
+            if isinstance(invoker, str):
+                raise ValueError(f"Module {module} did not register invoker {name}")
+        return invoker
+
     @classmethod
     def register_renderer(cls, name: str) -> Callable:
 
@@ -172,31 +302,31 @@ class InvokerFactory:
     ) -> Invoker:
         if type == "renderer":
             name = prompty.template.type
-            if name not in cls._renderers:
+            if not cls.has("renderer", name):
                 raise ValueError(f"Renderer {name} not found")
 
-            return cls._renderers[name](prompty)
+            return cls._resolve(cls._renderers, name)(prompty)
 
         elif type == "parser":
             name = f"{prompty.template.parser}.{prompty.model.api}"
-            if name not in cls._parsers:
+            if not cls.has("parser", name):
                 raise ValueError(f"Parser {name} not found")
 
-            return cls._parsers[name](prompty)
+            return cls._resolve(cls._parsers, name)(prompty)
 
         elif type == "executor":
             name = prompty.model.configuration["type"]
-            if name not in cls._executors:
+            if not cls.has("executor", name):
                 raise ValueError(f"Executor {name} not found")
 
-            return cls._executors[name](prompty)
+            return cls._resolve(cls._executors, name)(prompty)
 
         elif type == "processor":
             name = prompty.model.configuration["type"]
-            if name not in cls._processors:
+            if not cls.has("processor", name):
                 raise ValueError(f"Processor {name} not found")
 
-            return cls._processors[name](prompty)
+            return cls._resolve(cls._processors, name)(prompty)
 
         else:
             raise ValueError(f"Type {type} not found")
@@ -215,9 +345,42 @@ class InvokerFactory:
         elif name.startswith("NOOP"):
             return data
 
+        if type == "executor" and prompty.model.configuration.get("stable_prefix"):
+            # tools / response format serialized the same way every call
+            prompty = stable_prompty(prompty)
         invoker = cls._get_invoker(type, prompty)
-        value = invoker.run(data)
-        return value
+        if type != "executor":
+            return invoker.run(data)
+
+        # identical calls in flight share one upstream call (see SingleFlight)
+        flight = SingleFlight.installed()
+        key = SingleFlight.key(prompty, data) if flight is not None else None
+        if flight is not None and key is not None:
+            return flight.run(key, lambda: cls._execute(name, invoker, prompty, data))
+        return cls._execute(name, invoker, prompty, data)
+
+    @classmethod
+    def _execute(cls, name: str, invoker: Invoker, prompty: Prompty, data: typing.Any) -> typing.Any:
+        with contextlib.ExitStack() as stack:
+            # executor calls wait for a slot (see Scheduler), then for the
+            # deployment's rate limits (see RateLimiter)
+            scheduler = Scheduler.installed()
+            slot = None if scheduler is None else stack.enter_context(scheduler.slot(prompty))
+            limiter = RateLimiter.get(prompty)
+            if limiter is not None:
+                tokens = estimate_tokens(data, prompty.model.parameters)
+                limiter.acquire(tokens)
+            # retries / timeouts / circuit breaker (see Resilience), the
+            # multi executor applies them per connection
+            policy = None if name == "multi" else Resilience.from_configuration(prompty.model.configuration)
+            if policy is not None:
+                value = policy.call(prompty, invoker.run, data)
+            else:
+                value = invoker.run(data)
+            if limiter is not None:
+                limiter.settle(tokens, value)
+            # streams keep the slot until they are read or closed
+            return value if slot is None else slot.hold(value)
 
     @classmethod
     async def run_async(
@@ -232,9 +395,38 @@ class InvokerFactory:
             return default
         elif name.startswith("NOOP"):
             return data
+        if type == "executor" and prompty.model.configuration.get("stable_prefix"):
+            prompty = stable_prompty(prompty)
         invoker = cls._get_invoker(type, prompty)
-        value = await invoker.run_async(data)
-        return value
+        if type != "executor":
+            return await invoker.run_async(data)
+
+        flight = SingleFlight.installed()
+        if flight is not None:
+            import asyncio
+
+            key = SingleFlight.key(prompty, data, asyncio.get_running_loop())
+            if key is not None:
+                return await flight.run_async(key, lambda: cls._execute_async(name, invoker, prompty, data))
+        return await cls._execute_async(name, invoker, prompty, data)
+
+    @classmethod
+    async def _execute_async(cls, name: str, invoker: Invoker, prompty: Prompty, data: typing.Any) -> typing.Any:
+        async with contextlib.AsyncExitStack() as stack:
+            scheduler = Scheduler.installed()
+            slot = None if scheduler is None else await stack.enter_async_context(scheduler.slot_async(prompty))
+            limiter = RateLimiter.get(prompty)
+            if limiter is not None:
+                tokens = estimate_tokens(data, prompty.model.parameters)
+                await limiter.acquire_async(tokens)
+            policy = None if name == "multi" else Resilience.from_configuration(prompty.model.configuration)
+            if policy is not None:
+                value = await policy.call_async(prompty, invoker.run_async, data)
+            else:
+                value = await invoker.run_async(data)
+            if limiter is not None:
+                limiter.settle(tokens, value)
+            return value if slot is None else slot.hold(value)
 
     @classmethod
     def run_renderer(
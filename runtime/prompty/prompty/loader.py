@@ -0,0 +1,437 @@
+import asyncio
+import threading
+import typing
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Union
+
+from .core import Prompty, _load_raw_prompty
+from .tracer import trace
+from .utils import (
+    _find_global_config_async,
+    _find_global_config_cached,
+    clear_config_cache,
+    load_global_config,
+    load_global_config_async,
+    load_json,
+    load_prompty,
+    load_prompty_async,
+    run_in_thread,
+)
+
+# prompty nodes are keyed by (file, configuration), json nodes by file
+NodeKey = Union[Path, tuple[Path, str]]
+
+
+@dataclass
+class _Node:
+    value: typing.Any
+    dependencies: set = field(default_factory=set)
+
+
+def _resolve(path: Path) -> Path:
+    return path.resolve().absolute()
+
+
+def _mtime(path: Path) -> Union[int, None]:
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def _node_path(key: NodeKey) -> Path:
+    return key[0] if isinstance(key, tuple) else key
+
+
+def _file_reference(attribute: str) -> Union[str, None]:
+    attribute = attribute.strip()
+    if attribute.startswith("${") and attribute.endswith("}"):
+        variable = attribute[2:-1].split(":")
+        if variable[0] == "file" and len(variable) > 1:
+            return variable[1]
+    return None
+
+
+class PromptyLoader:
+    """Loads prompties through a dependency graph.
+
+    Every file (a prompty, its base chain, ``${file:...}`` JSON and the
+    prompty.json it picks its configuration from) is a node that is loaded
+    once and shared by everything depending on it. Loaded prompties are
+    frozen so a single instance can be handed to any number of callers.
+    When a file changes, ``invalidate`` (or ``refresh``) drops it together
+    with everything that depends on it; the next load rebuilds only those.
+
+    Attributes
+    ----------
+    configuration : str
+        The prompty.json configuration used for prompties loaded directly
+        (base prompties use "default", as with prompty.load)
+
+    Example
+    -------
+    >>> loader = prompty.PromptyLoader()
+    >>> p = loader.load("prompts/basic.prompty")
+    >>> loader.refresh()  # reload whatever changed on disk
+    """
+
+    def __init__(self, configuration: str = "default") -> None:
+        self.configuration = configuration
+        self._nodes: dict[NodeKey, _Node] = {}
+        self._dependents: dict[NodeKey, set[NodeKey]] = {}
+        self._mtimes: dict[Path, Union[int, None]] = {}
+        self._pending: dict[NodeKey, Future] = {}
+        self._pending_async: dict[NodeKey, asyncio.Future] = {}
+        # prompties whose last load failed, reloaded when they change
+        self._failed: set[NodeKey] = set()
+        self._lock = threading.RLock()
+
+    @trace(description="Load a prompty file through the dependency graph.")
+    def load(
+        self,
+        prompty_file: Union[str, Path],
+        base_dir: Union[str, Path, None] = None,
+    ) -> Prompty:
+        """Load a prompty file (and its dependencies) once.
+
+        Parameters
+        ----------
+        prompty_file : str | Path
+            The path to the prompty file
+        base_dir : str | Path, optional
+            Directory relative paths are resolved against, by default the
+            current working directory
+
+        Returns
+        -------
+        Prompty
+            The shared, frozen prompty
+        """
+        p = _resolve(Path(base_dir or ".") / prompty_file)
+        return self._load_prompty(p, self.configuration, ())
+
+    @trace(description="Load a prompty file through the dependency graph.")
+    async def load_async(
+        self,
+        prompty_file: Union[str, Path],
+        base_dir: Union[str, Path, None] = None,
+    ) -> Prompty:
+        """Load a prompty file (and its dependencies) once (Async).
+
+        Parameters
+        ----------
+        prompty_file : str | Path
+            The path to the prompty file
+        base_dir : str | Path, optional
+            Directory relative paths are resolved against, by default the
+            current working directory
+
+        Returns
+        -------
+        Prompty
+            The shared, frozen prompty
+        """
+        p = await run_in_thread(_resolve, Path(base_dir or ".") / prompty_file)
+        return await self._load_prompty_async(p, self.configuration, ())
+
+    def get(self, prompty_file: Union[str, Path]) -> Union[Prompty, None]:
+        """Return the loaded prompty for a file if it is in the graph."""
+        node = self._nodes.get((Path(prompty_file), self.configuration))
+        return node.value if node is not None else None
+
+    def dependencies(self, prompty_file: Union[str, Path]) -> set[Path]:
+        """Every file a loaded prompty depends on (including itself).
+
+        Parameters
+        ----------
+        prompty_file : str | Path
+            The absolute path of a loaded prompty
+
+        Returns
+        -------
+        set[Path]
+            The files, empty if the prompty is not loaded
+        """
+        key: NodeKey = (Path(prompty_file), self.configuration)
+        files: set[Path] = set()
+        with self._lock:
+            stack = [key] if key in self._nodes else []
+            seen: set[NodeKey] = set()
+            while stack:
+                current = stack.pop()
+                if current in seen:
+                    continue
+                seen.add(current)
+                files.add(_node_path(current))
+                node = self._nodes.get(current)
+                if node is not None:
+                    stack.extend(node.dependencies)
+        return files
+
+    def files(self) -> set[Path]:
+        """Every file tracked by the graph."""
+        with self._lock:
+            return set(self._mtimes)
+
+    def invalidate(self, path: Union[str, Path]) -> set[Path]:
+        """Drop a file and everything depending on it from the graph.
+
+        Parameters
+        ----------
+        path : str | Path
+            The absolute path of the changed file
+
+        Returns
+        -------
+        set[Path]
+            The prompty files that were dropped and need reloading
+        """
+        path = Path(path)
+        dropped: set[Path] = set()
+        with self._lock:
+            stack: list[NodeKey] = [
+                key for key in self._nodes if _node_path(key) == path
+            ]
+            stack.extend(key for key in self._dependents if _node_path(key) == path)
+            for key in [key for key in self._failed if _node_path(key) == path]:
+                self._failed.discard(key)
+                if isinstance(key, tuple):
+                    dropped.add(key[0])
+            while stack:
+                key = stack.pop()
+                node = self._nodes.pop(key, None)
+                if node is not None:
+                    for dependency in node.dependencies:
+                        dependents = self._dependents.get(dependency)
+                        if dependents is not None:
+                            dependents.discard(key)
+                    if isinstance(key, tuple):
+                        dropped.add(key[0])
+                stack.extend(self._dependents.pop(key, ()))
+
+            self._mtimes.pop(path, None)
+
+        if path.name == "prompty.json":
+            clear_config_cache(path)
+        return dropped
+
+    def refresh(self) -> set[Path]:
+        """Invalidate every tracked file whose modification time changed.
+
+        Returns
+        -------
+        set[Path]
+            The prompty files that were dropped and need reloading
+        """
+        dropped: set[Path] = set()
+        for path, mtime in list(self._mtimes.items()):
+            if _mtime(path) != mtime:
+                dropped |= self.invalidate(path)
+        return dropped
+
+    def clear(self) -> None:
+        """Forget everything."""
+        with self._lock:
+            self._nodes.clear()
+            self._dependents.clear()
+            self._mtimes.clear()
+            self._failed.clear()
+
+    def _store(self, key: NodeKey, node: _Node) -> None:
+        with self._lock:
+            self._failed.discard(key)
+            self._nodes[key] = node
+            for dependency in node.dependencies:
+                self._dependents.setdefault(dependency, set()).add(key)
+
+    def _track(self, path: Path) -> None:
+        if path not in self._mtimes:
+            self._mtimes[path] = _mtime(path)
+
+    async def _track_async(self, path: Path) -> None:
+        if path not in self._mtimes:
+            # stat off the event loop
+            self._mtimes[path] = await run_in_thread(_mtime, path)
+
+    def _once(self, key: NodeKey, build: typing.Callable[[], _Node]) -> typing.Any:
+        # concurrent loads of the same node (e.g. a shared base) wait
+        # for the first one instead of loading it again
+        with self._lock:
+            node = self._nodes.get(key)
+            if node is not None:
+                return node.value
+            pending = self._pending.get(key)
+            if pending is None:
+                self._pending[key] = Future()
+
+        if pending is not None:
+            return pending.result()
+
+        future = self._pending[key]
+        try:
+            node = build()
+            self._store(key, node)
+            future.set_result(node.value)
+            return node.value
+        except BaseException as e:
+            self._failed.add(key)
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    async def _once_async(
+        self, key: NodeKey, build: typing.Callable[[], typing.Awaitable[_Node]]
+    ) -> typing.Any:
+        node = self._nodes.get(key)
+        if node is not None:
+            return node.value
+        pending = self._pending_async.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending_async[key] = future
+        try:
+            node = await build()
+            self._store(key, node)
+            future.set_result(node.value)
+            return node.value
+        except BaseException as e:
+            self._failed.add(key)
+            future.set_exception(e)
+            # retrieved here so an unawaited failure is not reported
+            future.exception()
+            raise
+        finally:
+            self._pending_async.pop(key, None)
+
+    def _check_cycle(self, key: NodeKey, chain: tuple) -> tuple:
+        if key in chain:
+            cycle = " -> ".join(str(_node_path(k)) for k in (*chain, key))
+            raise ValueError(f"Circular base prompty reference: {cycle}")
+        return (*chain, key)
+
+    def _load_json(self, path: Path) -> typing.Any:
+        def build() -> _Node:
+            self._track(path)
+            return _Node(load_json(path))
+
+        return self._once(path, build)
+
+    def _normalize(self, attribute: typing.Any, parent: Path, deps: set) -> typing.Any:
+        if isinstance(attribute, str):
+            file = _file_reference(attribute)
+            if file is None:
+                return Prompty.normalize(attribute, parent)
+
+            f = _resolve(parent / file)
+            if not f.exists():
+                raise FileNotFoundError(f"File {file} not found")
+            deps.add(f)
+            # shared parsed json, normalized relative to the referencing prompty
+            return self._normalize(self._load_json(f), parent, deps)
+        elif isinstance(attribute, list):
+            return [self._normalize(value, parent, deps) for value in attribute]
+        elif isinstance(attribute, dict):
+            return {
+                key: self._normalize(value, parent, deps)
+                for key, value in attribute.items()
+            }
+        else:
+            return attribute
+
+    def _load_prompty(self, p: Path, configuration: str, chain: tuple) -> Prompty:
+        key: NodeKey = (p, configuration)
+        chain = self._check_cycle(key, chain)
+
+        def build() -> _Node:
+            deps: set[NodeKey] = set()
+            self._track(p)
+            matter = load_prompty(p)
+            attributes = self._normalize(matter["attributes"], p.parent, deps)
+
+            config = _find_global_config_cached(p.parent)
+            if config is not None:
+                self._track(config)
+                deps.add(config)
+            global_config = self._normalize(
+                load_global_config(p.parent, configuration), p.parent, deps
+            )
+
+            prompty = _load_raw_prompty(attributes, matter["body"], p, global_config)
+            if "base" in attributes:
+                base_path = _resolve(p.parent / attributes["base"])
+                base = self._load_prompty(base_path, "default", chain)
+                deps.add((base_path, "default"))
+                prompty = Prompty.hoist_base_prompty(prompty, base)
+
+            return _Node(prompty.freeze(), deps)
+
+        return self._once(key, build)
+
+    async def _normalize_async(
+        self, attribute: typing.Any, parent: Path, deps: set
+    ) -> typing.Any:
+        if isinstance(attribute, str):
+            file = _file_reference(attribute)
+            if file is None:
+                return Prompty.normalize(attribute, parent)
+
+            f = await run_in_thread(_resolve, parent / file)
+            if not await run_in_thread(f.exists):
+                raise FileNotFoundError(f"File {file} not found")
+            deps.add(f)
+            contents = await self._once_async(f, lambda: self._build_json_async(f))
+            return await self._normalize_async(contents, parent, deps)
+        elif isinstance(attribute, list):
+            return [await self._normalize_async(v, parent, deps) for v in attribute]
+        elif isinstance(attribute, dict):
+            return {
+                key: await self._normalize_async(value, parent, deps)
+                for key, value in attribute.items()
+            }
+        else:
+            return attribute
+
+    async def _build_json_async(self, path: Path) -> _Node:
+        await self._track_async(path)
+        return _Node(await run_in_thread(load_json, path))
+
+    async def _load_prompty_async(
+        self, p: Path, configuration: str, chain: tuple
+    ) -> Prompty:
+        key: NodeKey = (p, configuration)
+        chain = self._check_cycle(key, chain)
+
+        async def build() -> _Node:
+            deps: set[NodeKey] = set()
+            await self._track_async(p)
+            matter = await load_prompty_async(p)
+            attributes = await self._normalize_async(
+                matter["attributes"], p.parent, deps
+            )
+
+            config = await _find_global_config_async(p.parent)
+            if config is not None:
+                await self._track_async(config)
+                deps.add(config)
+            global_config = await self._normalize_async(
+                await load_global_config_async(p.parent, configuration),
+                p.parent,
+                deps,
+            )
+
+            prompty = _load_raw_prompty(attributes, matter["body"], p, global_config)
+            if "base" in attributes:
+                base_path = await run_in_thread(_resolve, p.parent / attributes["base"])
+                base = await self._load_prompty_async(base_path, "default", chain)
+                deps.add((base_path, "default"))
+                prompty = Prompty.hoist_base_prompty(prompty, base)
+
+            return _Node(prompty.freeze(), deps)
+
+        return await self._once_async(key, build)
@@ -0,0 +1,324 @@
+import collections
+import contextvars
+import math
+import threading
+import time
+import typing
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import replace
+from pathlib import Path
+from typing import Union
+
+from .core import Prompty
+from .invoker import Invoker, InvokerFactory
+from .resilience import Resilience, connection_key
+from .utils import load_global_config
+
+# configuration keys of the multi executor itself (not passed to connections)
+_MULTI_KEYS = ["type", "connections", "hedge", "hedge_percentile"]
+
+# latency samples kept per connection, and needed before hedging
+SAMPLE_SIZE = 100
+MIN_HEDGE_SAMPLES = 20
+
+
+class ConnectionStats:
+    """Observed latency and error rate of a connection
+
+    Attributes
+    ----------
+    latency : float | None
+        Exponentially weighted average latency in seconds
+    error_rate : float
+        Exponentially weighted error rate
+    samples : deque[float]
+        The latest successful latencies
+    """
+
+    # weight of the newest observation in the averages
+    ALPHA = 0.2
+
+    def __init__(self) -> None:
+        self.latency: Union[float, None] = None
+        self.error_rate = 0.0
+        self.samples: collections.deque[float] = collections.deque(maxlen=SAMPLE_SIZE)
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, error: bool = False) -> None:
+        with self._lock:
+            self.error_rate += self.ALPHA * ((1.0 if error else 0.0) - self.error_rate)
+            if error:
+                return
+            self.samples.append(latency)
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += self.ALPHA * (latency - self.latency)
+
+    def percentile(self, percentile: float) -> Union[float, None]:
+        """The latency percentile, once enough requests were observed."""
+        with self._lock:
+            if len(self.samples) < MIN_HEDGE_SAMPLES:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))]
+
+    def score(self) -> float:
+        if self.latency is None:
+            # unobserved connections go first so every connection gets
+            # measured, ones that only failed so far go last
+            return math.inf if self.error_rate > 0 else 0.0
+        return self.latency * (1.0 + 10.0 * self.error_rate)
+
+
+def connections(prompty: Prompty) -> list[Prompty]:
+    """The prompties (one per connection) a multi prompty executes against.
+
+    Connections are names of prompty.json configurations or configuration
+    dicts; the latter inherit the other keys of the multi configuration.
+    """
+    configuration = prompty.model.configuration
+    shared = {k: v for k, v in configuration.items() if k not in _MULTI_KEYS}
+    parent = Path(prompty.file).parent if prompty.file else Path.cwd()
+
+    result = []
+    for connection in configuration.get("connections", []):
+        if isinstance(connection, str):
+            connection = Prompty.normalize(load_global_config(parent, connection), parent)
+        else:
+            connection = {**shared, **connection}
+        if connection.get("type") in [None, "multi"]:
+            raise ValueError(f"Connection {connection} needs an executor type other than multi")
+        model = replace(prompty.model, configuration=connection)
+        result.append(replace(prompty, model=model))
+
+    if len(result) == 0:
+        raise ValueError("The multi executor needs at least one connection")
+    return result
+
+
+def _discard(result: typing.Any) -> None:
+    close = getattr(result, "close", None)
+    if close is not None:
+        close()
+
+
+def _discard_future(future: Future) -> None:
+    # a hedged request that lost the race, its response is not needed
+    if not future.cancelled() and future.exception() is None:
+        _discard(future.result())
+
+
+async def _discard_async(result: typing.Any) -> None:
+    close = getattr(result, "aclose", None)
+    if close is not None:
+        await close()
+    else:
+        _discard(result)
+
+
+class MultiExecutor(Invoker):
+    """Executes against several connections, routed by observed latency and
+    error rate.
+
+    The fastest healthy connection is tried first and the next one when it
+    fails. Once a connection has enough history, a request still running
+    past its p95 latency is hedged: a duplicate goes to the next connection
+    and the first response wins, the other request is cancelled (async) or
+    discarded (sync, a running thread cannot be interrupted).
+
+    Example
+    -------
+    >>> model:
+    >>>   configuration:
+    >>>     type: multi
+    >>>     connections: [eastus, westus, swedencentral]  # prompty.json names
+    >>>     hedge_percentile: 95
+    """
+
+    _stats: dict[str, ConnectionStats] = {}
+    _stats_lock = threading.Lock()
+    _pool: Union[ThreadPoolExecutor, None] = None
+
+    def __init__(self, prompty: Prompty) -> None:
+        super().__init__(prompty)
+        configuration = self.prompty.model.configuration
+        self.connections = connections(self.prompty)
+        self.hedge = bool(configuration.get("hedge", True))
+        self.hedge_percentile = float(configuration.get("hedge_percentile", 95))
+
+    @classmethod
+    def stats(cls, prompty: Prompty) -> ConnectionStats:
+        """The stats of the connection a (single connection) prompty uses."""
+        key = connection_key(prompty)
+        with cls._stats_lock:
+            if key not in cls._stats:
+                cls._stats[key] = ConnectionStats()
+            return cls._stats[key]
+
+    @classmethod
+    def reset(cls) -> None:
+        """Forget the observed latencies and errors."""
+        with cls._stats_lock:
+            cls._stats = {}
+
+    def ranked(self) -> list[Prompty]:
+        """The connections in the order they will be tried."""
+        # sorted is stable: ties keep the configured order
+        return sorted(self.connections, key=lambda p: self.stats(p).score())
+
+    def _deadline(self, prompty: Prompty, remaining: int) -> Union[float, None]:
+        if not self.hedge or remaining == 0:
+            return None
+        return self.stats(prompty).percentile(self.hedge_percentile)
+
+    def _call(self, prompty: Prompty, data: typing.Any) -> typing.Any:
+        stats = self.stats(prompty)
+        start = time.perf_counter()
+        invoker = InvokerFactory._get_invoker("executor", prompty)
+        policy = Resilience.from_configuration(prompty.model.configuration)
+        try:
+            if policy is not None:
+                result = policy.call(prompty, invoker.run, data)
+            else:
+                result = invoker.run(data)
+        except Exception:
+            stats.record(time.perf_counter() - start, error=True)
+            raise
+        stats.record(time.perf_counter() - start)
+        return result
+
+    async def _call_async(self, prompty: Prompty, data: typing.Any) -> typing.Any:
+        stats = self.stats(prompty)
+        start = time.perf_counter()
+        invoker = InvokerFactory._get_invoker("executor", prompty)
+        policy = Resilience.from_configuration(prompty.model.configuration)
+        try:
+            if policy is not None:
+                result = await policy.call_async(prompty, invoker.run_async, data)
+            else:
+                result = await invoker.run_async(data)
+        except Exception:
+            stats.record(time.perf_counter() - start, error=True)
+            raise
+        stats.record(time.perf_counter() - start)
+        return result
+
+    @classmethod
+    def _executor_pool(cls) -> ThreadPoolExecutor:
+        with cls._stats_lock:
+            if cls._pool is None:
+                cls._pool = ThreadPoolExecutor(thread_name_prefix="prompty-multi")
+            return cls._pool
+
+    def invoke(self, data: typing.Any) -> typing.Any:
+        """Invoke the fastest connection, hedging and failing over
+
+        Parameters
+        ----------
+        data : any
+            The data to send to the connection's executor
+
+        Returns
+        -------
+        any
+            The first successful response
+        """
+        candidates = self.ranked()
+        first = candidates.pop(0)
+        deadline = self._deadline(first, len(candidates))
+        if deadline is None:
+            # nothing to race, call in this thread
+            try:
+                return self._call(first, data)
+            except Exception as e:
+                if not candidates:
+                    raise
+                error: Exception = e
+        else:
+            pool = self._executor_pool()
+            context = contextvars.copy_context()
+            pending: set[Future] = {pool.submit(context.run, self._call, first, data)}
+            done, _ = wait(pending, timeout=deadline)
+            if not done:
+                # hedge
+                second = candidates.pop(0)
+                pending.add(pool.submit(contextvars.copy_context().run, self._call, second, data))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        for loser in pending:
+                            if not loser.cancel():
+                                loser.add_done_callback(_discard_future)
+                        return future.result()
+                    error = typing.cast(Exception, future.exception())
+
+        # fail over to the remaining connections in order
+        for prompty in candidates:
+            try:
+                return self._call(prompty, data)
+            except Exception as e:
+                error = e
+        raise error
+
+    async def invoke_async(self, data: typing.Any) -> typing.Any:
+        """Invoke the fastest connection, hedging and failing over (Async)
+
+        Parameters
+        ----------
+        data : any
+            The data to send to the connection's executor
+
+        Returns
+        -------
+        any
+            The first successful response
+        """
+        import asyncio
+
+        candidates = self.ranked()
+        first = candidates.pop(0)
+        deadline = self._deadline(first, len(candidates))
+        pending = {asyncio.ensure_future(self._call_async(first, data))}
+        error: Union[BaseException, None] = None
+        try:
+            done, _ = await asyncio.wait(pending, timeout=deadline)
+            if not done:
+                # hedge
+                second = candidates.pop(0)
+                pending.add(asyncio.ensure_future(self._call_async(second, data)))
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((t for t in done if t.exception() is None), None)
+                for task in done:
+                    if task is not winner and task.exception() is None:
+                        # both finished at once
+                        await _discard_async(task.result())
+                    elif task.exception() is not None:
+                        error = task.exception()
+                if winner is not None:
+                    return winner.result()
+                if not pending and candidates:
+                    # fail over
+                    pending.add(asyncio.ensure_future(self._call_async(candidates.pop(0), data)))
+        finally:
+            # cancel the loser (or everything when cancelled ourselves)
+            for task in pending:
+                task.cancel()
+        raise typing.cast(BaseException, error)
+
+
+class MultiProcessor(Invoker):
+    """Processes responses of the multi executor with the processor of its
+    first connection (connections are expected to share a response format)."""
+
+    def __init__(self, prompty: Prompty) -> None:
+        super().__init__(prompty)
+        self.processor = InvokerFactory._get_invoker("processor", connections(self.prompty)[0])
+
+    def invoke(self, data: typing.Any) -> typing.Any:
+        return self.processor.invoke(data)
+
+    async def invoke_async(self, data: typing.Any) -> typing.Any:
+        return await self.processor.invoke_async(data)
@@ -1,10 +1,25 @@
 # __init__.py
-from prompty.invoker import InvokerException
+import typing
 
-try:
-    from .executor import OpenAIExecutor  # noqa
-    from .processor import OpenAIProcessor  # noqa
-except ImportError as e:
+from prompty.invoker import InvokerException, InvokerFactory
+from prompty.utils import installed
+
+if not installed("openai"):
     raise InvokerException(
-        f"Error registering OpenAIExecutor and OpenAIProcessor: {e}", "openai"
+        "Error registering OpenAIExecutor and OpenAIProcessor", "openai"
     )
+
+# the SDKs are imported when a prompty first uses these invokers
+InvokerFactory.add_executor("openai", "prompty.openai.executor:OpenAIExecutor")
+InvokerFactory.add_processor("openai", "prompty.openai.processor:OpenAIProcessor")
+
+_invokers = {
+    "OpenAIExecutor": "prompty.openai.executor",
+    "OpenAIProcessor": "prompty.openai.processor",
+}
+
+
+def __getattr__(name: str) -> typing.Any:
+    if name in _invokers:
+        return getattr(InvokerFactory.import_module(_invokers[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,4 +1,3 @@
-import importlib.metadata
 import typing
 from collections.abc import Iterator
 
@@ -6,10 +5,9 @@ from openai import OpenAI
 
 from prompty.tracer import Tracer
 
-from ..core import Prompty, PromptyStream
+from ..core import RUNTIME_CONFIGURATION_KEYS, Prompty, PromptyStream
 from ..invoker import Invoker, InvokerFactory
-
-VERSION = importlib.metadata.version("prompty")
+from ..utils import prompty_version
 
 
 @InvokerFactory.register_executor("openai")
@@ -21,7 +19,7 @@ class OpenAIExecutor(Invoker):
         self.kwargs = {
             key: value
             for key, value in self.prompty.model.configuration.items()
-            if key != "type" and key != "name"
+            if key not in RUNTIME_CONFIGURATION_KEYS and key != "name"
         }
 
         self.api = self.prompty.model.api
@@ -49,8 +47,8 @@ class OpenAIExecutor(Invoker):
             trace("inputs", self.kwargs)
             client = OpenAI(
                 default_headers={
-                    "User-Agent": f"prompty/{VERSION}",
-                    "x-ms-useragent": f"prompty/{VERSION}",
+                    "User-Agent": f"prompty/{prompty_version()}",
+                    "x-ms-useragent": f"prompty/{prompty_version()}",
                 },
                 **self.kwargs,
             )
@@ -7,6 +7,7 @@ from openai.types.create_embedding_response import CreateEmbeddingResponse
 
 from ..core import Prompty, PromptyStream, ToolCall
 from ..invoker import Invoker, InvokerFactory
+from ..streaming import stream_events, stream_mode
 
 
 @InvokerFactory.register_processor("openai")
@@ -54,6 +55,8 @@ class OpenAIProcessor(Invoker):
             else:
                 return [item.embedding for item in data.data]
         elif isinstance(data, Iterator):
+            if stream_mode(self.prompty) == "events":
+                return PromptyStream("OpenAIProcessor", stream_events(data), source=data)
 
             def generator():
                 for chunk in data:
@@ -64,7 +67,7 @@ class OpenAIProcessor(Invoker):
                         content = chunk.choices[0].delta.content
                         yield content
 
-            return PromptyStream("OpenAIProcessor", generator())
+            return PromptyStream("OpenAIProcessor", generator(), source=data)
         else:
             return data
 
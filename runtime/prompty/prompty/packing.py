@@ -0,0 +1,265 @@
+import typing
+from collections.abc import Generator
+from typing import Union
+
+from .core import Prompty
+from .invoker import InvokerFactory
+from .tokens import count_messages, count_text, model_name
+
+_PACK_KEYS = {"score", "field", "min_items"}
+
+# trimming attempts for the item that only partially fits
+_TRIM_ATTEMPTS = 3
+
+
+def token_budget(prompty: Prompty) -> Union[int, None]:
+    """The tokens the prepared prompt may use: the ``context_window`` of the
+    model configuration less the completion tokens requested, if configured."""
+    window = prompty.model.configuration.get("context_window")
+    if not window:
+        return None
+    parameters = prompty.model.parameters
+    completion = parameters.get("max_completion_tokens", parameters.get("max_tokens")) or 0
+    return int(window) - int(completion)
+
+
+def _settings(prompty: Prompty) -> dict[str, dict]:
+    settings = {}
+    for name, value in prompty.inputs.items():
+        if not value.pack:
+            continue
+        unknown = set(value.pack) - _PACK_KEYS
+        if unknown:
+            raise ValueError(f"Unknown pack settings {sorted(unknown)} for input {name}")
+        settings[name] = value.pack
+    return settings
+
+
+class _Plan:
+    """Items of the packed inputs ranked best first; the top ``min_items``
+    of every input are always kept."""
+
+    def __init__(self, inputs: dict[str, typing.Any], settings: dict[str, dict]) -> None:
+        self.inputs = inputs
+        self.settings = settings
+        self.required: list[tuple[str, int]] = []
+        self.optional: list[tuple[str, int]] = []
+        for name, pack in settings.items():
+            items = inputs.get(name)
+            if not isinstance(items, list):
+                continue
+            ranked = sorted(range(len(items)), key=lambda i: (-self._score(pack, items[i], i), i))
+            minimum = int(pack.get("min_items", 0))
+            self.required.extend((name, i) for i in ranked[:minimum])
+            self.optional.extend((name, i) for i in ranked[minimum:])
+        # best first across inputs (stable, so ties keep their input's order)
+        self.optional.sort(key=lambda k: -self._score(settings[k[0]], inputs[k[0]][k[1]], k[1]))
+
+    @staticmethod
+    def _score(pack: dict, item: typing.Any, index: int) -> float:
+        if "score" not in pack:
+            # unscored lists are in order of relevance
+            return -index
+        score = item.get(pack["score"]) if isinstance(item, dict) else None
+        return float(score) if isinstance(score, (int, float)) else 0.0
+
+    def text(self, key: tuple[str, int]) -> Union[str, None]:
+        """The trimmable text of an item, if any."""
+        name, index = key
+        item = self.inputs[name][index]
+        if isinstance(item, str):
+            return item
+        field = self.settings[name].get("field")
+        if field and isinstance(item, dict) and isinstance(item.get(field), str):
+            return item[field]
+        return None
+
+    def keep(
+        self, count: int, trimmed: Union[tuple[tuple[str, int], str], None] = None
+    ) -> dict[str, typing.Any]:
+        """The inputs with the required and ``count`` best optional items
+        (plus a trimmed one), each list in its original order."""
+        kept = set(self.required) | set(self.optional[:count])
+        replaced: dict[tuple[str, int], typing.Any] = {}
+        if trimmed is not None:
+            key, text = trimmed
+            kept.add(key)
+            item = self.inputs[key[0]][key[1]]
+            field = self.settings[key[0]].get("field")
+            replaced[key] = text if isinstance(item, str) else {**item, field: text}
+
+        inputs = {**self.inputs}
+        for name in self.settings:
+            if isinstance(self.inputs.get(name), list):
+                inputs[name] = [
+                    replaced.get((name, i), item)
+                    for i, item in enumerate(self.inputs[name])
+                    if (name, i) in kept
+                ]
+        return inputs
+
+
+def _prefix(text: str, tokens: int, model: Union[str, None]) -> str:
+    # the longest word-boundary prefix counting at most ``tokens`` tokens
+    words = text.split(" ")
+    low, high = 0, len(words)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_text(" ".join(words[:middle]), model) <= tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return " ".join(words[:low])
+
+
+def _search(
+    plan: _Plan, budget: int, model: Union[str, None]
+) -> Generator[dict[str, typing.Any], int, dict[str, typing.Any]]:
+    # yields candidate inputs and is sent their token count, returns the
+    # inputs to use (always one of the candidates)
+    total = len(plan.optional)
+    candidate = plan.keep(total)
+    used = yield candidate
+    if used <= budget:
+        return candidate
+
+    # fewest items next: when even those do not fit there is nothing to pack
+    low = candidate
+    if total > 0:
+        low = plan.keep(0)
+        used = yield low
+    if used > budget:
+        raise ValueError(f"The prompt needs {used} tokens even with the fewest items, the budget is {budget}")
+
+    # binary search for the most items that fit
+    fewest, most = 0, total - 1
+    while fewest < most:
+        middle = (fewest + most + 1) // 2
+        candidate = plan.keep(middle)
+        tokens = yield candidate
+        if tokens <= budget:
+            fewest, low, used = middle, candidate, tokens
+        else:
+            most = middle - 1
+
+    # fill what is left with the start of the next item
+    key = plan.optional[fewest]
+    text = plan.text(key)
+    allowed = budget - used
+    for _ in range(_TRIM_ATTEMPTS):
+        if text is None or allowed <= 0:
+            break
+        text = _prefix(text, allowed, model)
+        if not text:
+            break
+        candidate = plan.keep(fewest, (key, text))
+        tokens = yield candidate
+        if tokens <= budget:
+            return candidate
+        allowed -= tokens - budget
+    return low
+
+
+def _search_for(
+    prompty: Prompty, inputs: dict[str, typing.Any], budget: Union[int, None]
+) -> Union[Generator[dict[str, typing.Any], int, dict[str, typing.Any]], None]:
+    budget = budget if budget is not None else token_budget(prompty)
+    settings = _settings(prompty)
+    if budget is None or not settings:
+        return None
+    plan = _Plan(inputs, settings)
+    if not plan.optional and not plan.required:
+        return None
+    return _search(plan, budget, model_name(prompty))
+
+
+def pack(
+    prompty: Prompty, inputs: dict[str, typing.Any], budget: Union[int, None] = None
+) -> tuple[dict[str, typing.Any], typing.Any]:
+    """Render and parse a prompty, dropping or trimming items of its packed
+    inputs until the prompt fits the token budget.
+
+    Array inputs declare how they may be packed with ``pack``: items with
+    the lowest ``score`` (by default the last ones) are dropped first, the
+    best item that does not fit is cut short when it has a text ``field``
+    (or is a string) and ``min_items`` are always kept. The number of items
+    kept is binary searched, so the template is rendered a logarithmic
+    number of times.
+
+    Parameters
+    ----------
+    prompty : Prompty
+        The prompty
+    inputs : dict[str, any]
+        The (hoisted) inputs
+    budget : int, optional
+        The token budget, by default the model's ``context_window`` less
+        its ``max_tokens``
+
+    Returns
+    -------
+    tuple[dict, any]
+        The packed inputs and the parsed content
+
+    Example
+    -------
+    >>> inputs:
+    >>>   documents:
+    >>>     type: array
+    >>>     pack: {score: relevance, field: content, min_items: 1}
+    """
+    search = _search_for(prompty, inputs, budget)
+    if search is None:
+        render = InvokerFactory.run_renderer(prompty, inputs, prompty.content)
+        return inputs, InvokerFactory.run_parser(prompty, render)
+
+    model = model_name(prompty)
+    rendered: list[tuple[dict, typing.Any]] = []
+    candidate = next(search)
+    try:
+        while True:
+            render = InvokerFactory.run_renderer(prompty, candidate, prompty.content)
+            content = InvokerFactory.run_parser(prompty, render)
+            rendered.append((candidate, content))
+            candidate = search.send(count_messages(content, model).total)
+    except StopIteration as done:
+        return next((i, c) for i, c in rendered if i is done.value)
+
+
+async def pack_async(
+    prompty: Prompty, inputs: dict[str, typing.Any], budget: Union[int, None] = None
+) -> tuple[dict[str, typing.Any], typing.Any]:
+    """Render and parse a prompty, dropping or trimming items of its packed
+    inputs until the prompt fits the token budget (Async)
+
+    Parameters
+    ----------
+    prompty : Prompty
+        The prompty
+    inputs : dict[str, any]
+        The (hoisted) inputs
+    budget : int, optional
+        The token budget, by default the model's ``context_window`` less
+        its ``max_tokens``
+
+    Returns
+    -------
+    tuple[dict, any]
+        The packed inputs and the parsed content
+    """
+    search = _search_for(prompty, inputs, budget)
+    if search is None:
+        render = await InvokerFactory.run_renderer_async(prompty, inputs, prompty.content)
+        return inputs, await InvokerFactory.run_parser_async(prompty, render)
+
+    model = model_name(prompty)
+    rendered: list[tuple[dict, typing.Any]] = []
+    candidate = next(search)
+    try:
+        while True:
+            render = await InvokerFactory.run_renderer_async(prompty, candidate, prompty.content)
+            content = await InvokerFactory.run_parser_async(prompty, render)
+            rendered.append((candidate, content))
+            candidate = search.send(count_messages(content, model).total)
+    except StopIteration as done:
+        return next((i, c) for i, c in rendered if i is done.value)
@@ -1,9 +1,12 @@
+import asyncio
 import base64
 import re
+import typing
 from pathlib import Path
 
 from .core import Prompty
 from .invoker import Invoker
+from .utils import load_bytes_async, run_in_thread
 
 
 class PromptyChatParser(Invoker):
@@ -12,10 +15,16 @@ class PromptyChatParser(Invoker):
     def __init__(self, prompty: Prompty) -> None:
         super().__init__(prompty)
         self.roles = ["assistant", "function", "system", "user"]
-        if isinstance(self.prompty.file, str):
-            self.prompty.file = Path(self.prompty.file).resolve().absolute()
+        # the prompty is shared, so resolve the path without storing it back
+        file = self.prompty.file
+        if isinstance(file, str):
+            file = Path(file).resolve().absolute()
 
-        self.path = self.prompty.file.parent
+        self.path = file.parent
+
+    # images larger than this (in bytes) are base64 encoded
+    # in the thread pool when parsing asynchronously
+    offload_threshold: int = 256 * 1024
 
     def inline_image(self, image_item: str) -> str:
         """Inline Image
@@ -36,42 +45,62 @@ class PromptyChatParser(Invoker):
         # otherwise, it's a local file - need to base64 encode it
         else:
             image_path = self.path / image_item
+            mime_type = self._mime_type(image_path)
             with open(image_path, "rb") as f:
                 base64_image = base64.b64encode(f.read()).decode("utf-8")
 
-            if image_path.suffix == ".png":
-                return f"data:image/png;base64,{base64_image}"
-            elif image_path.suffix == ".jpg":
-                return f"data:image/jpeg;base64,{base64_image}"
-            elif image_path.suffix == ".jpeg":
-                return f"data:image/jpeg;base64,{base64_image}"
-            else:
-                raise ValueError(
-                    f"Invalid image format {image_path.suffix} - currently only .png and .jpg / .jpeg are supported."
-                )
+            return f"data:{mime_type};base64,{base64_image}"
 
-    def parse_content(self, content: str):
-        """for parsing inline images
+    async def inline_image_async(self, image_item: str) -> str:
+        """Inline Image (Async)
 
         Parameters
         ----------
-        content : str
-            The content to parse
+        image_item : str
+            The image item to inline
 
         Returns
         -------
-        any
-            The parsed content
+        str
+            The inlined image
         """
+        # pass through if it's a url or base64 encoded
+        if image_item.startswith("http") or image_item.startswith("data"):
+            return image_item
+        # otherwise, it's a local file - need to base64 encode it
+        else:
+            image_path = self.path / image_item
+            mime_type = self._mime_type(image_path)
+            image = await load_bytes_async(image_path)
+            if len(image) > self.offload_threshold:
+                encoded = await run_in_thread(base64.b64encode, image)
+            else:
+                encoded = base64.b64encode(image)
+
+            return f"data:{mime_type};base64,{encoded.decode('utf-8')}"
+
+    def _mime_type(self, image_path: Path) -> str:
+        if image_path.suffix == ".png":
+            return "image/png"
+        elif image_path.suffix == ".jpg":
+            return "image/jpeg"
+        elif image_path.suffix == ".jpeg":
+            return "image/jpeg"
+        else:
+            raise ValueError(
+                f"Invalid image format {image_path.suffix} - currently only .png and .jpg / .jpeg are supported."
+            )
+
+    def _content_items(self, content: str) -> typing.Union[str, list[dict]]:
         # regular expression to parse markdown images
         image = r"(?P<alt>!\[[^\]]*\])\((?P<filename>.*?)(?=\"|\))\)"
         matches = re.findall(image, content, flags=re.MULTILINE)
         if len(matches) > 0:
-            content_items = []
+            content_items: list[dict] = []
             content_chunks = re.split(image, content, flags=re.MULTILINE)
             current_chunk = 0
             for i in range(len(content_chunks)):
-                # image entry
+                # image entry (url is resolved by the caller)
                 if (
                     current_chunk < len(matches)
                     and content_chunks[i] == matches[current_chunk][0]
@@ -80,9 +109,7 @@ class PromptyChatParser(Invoker):
                         {
                             "type": "image_url",
                             "image_url": {
-                                "url": self.inline_image(
-                                    matches[current_chunk][1].split(" ")[0].strip()
-                                )
+                                "url": matches[current_chunk][1].split(" ")[0].strip()
                             },
                         }
                     )
@@ -102,20 +129,52 @@ class PromptyChatParser(Invoker):
         else:
             return content
 
-    def invoke(self, data: str) -> list[dict[str, str]]:
-        """Invoke the Prompty Chat Parser
+    def parse_content(self, content: str):
+        """for parsing inline images
 
         Parameters
         ----------
-        data : str
-            The data to parse
+        content : str
+            The content to parse
 
         Returns
         -------
-        str
-            The parsed data
+        any
+            The parsed content
+        """
+        items = self._content_items(content)
+        if isinstance(items, list):
+            for item in items:
+                if item["type"] == "image_url":
+                    item["image_url"]["url"] = self.inline_image(
+                        item["image_url"]["url"]
+                    )
+        return items
+
+    async def parse_content_async(self, content: str):
+        """for parsing inline images (Async)
+
+        Parameters
+        ----------
+        content : str
+            The content to parse
+
+        Returns
+        -------
+        any
+            The parsed content
         """
-        messages = []
+        items = self._content_items(content)
+        if isinstance(items, list):
+            images = [item["image_url"] for item in items if item["type"] == "image_url"]
+            urls = await asyncio.gather(
+                *[self.inline_image_async(image["url"]) for image in images]
+            )
+            for image, url in zip(images, urls):
+                image["url"] = url
+        return items
+
+    def _chunks(self, data: str) -> list[tuple[str, str]]:
         separator = r"(?i)^\s*#?\s*(" + "|".join(self.roles) + r")\s*:\s*\n"
 
         # get valid chunks - remove empty items
@@ -136,13 +195,28 @@ class PromptyChatParser(Invoker):
         if len(chunks) % 2 != 0:
             raise ValueError("Invalid prompt format")
 
-        # create messages
-        for i in range(0, len(chunks), 2):
-            role = chunks[i].strip().lower()
-            content = chunks[i + 1].strip()
-            messages.append({"role": role, "content": self.parse_content(content)})
+        return [
+            (chunks[i].strip().lower(), chunks[i + 1].strip())
+            for i in range(0, len(chunks), 2)
+        ]
+
+    def invoke(self, data: str) -> list[dict[str, str]]:
+        """Invoke the Prompty Chat Parser
+
+        Parameters
+        ----------
+        data : str
+            The data to parse
 
-        return messages
+        Returns
+        -------
+        str
+            The parsed data
+        """
+        return [
+            {"role": role, "content": self.parse_content(content)}
+            for role, content in self._chunks(data)
+        ]
 
     async def invoke_async(self, data: str) -> list[dict[str, str]]:
         """Invoke the Prompty Chat Parser (Async)
@@ -157,4 +231,11 @@ class PromptyChatParser(Invoker):
         str
             The parsed data
         """
-        return self.invoke(data)
+        chunks = self._chunks(data)
+        contents = await asyncio.gather(
+            *[self.parse_content_async(content) for _, content in chunks]
+        )
+        return [
+            {"role": role, "content": content}
+            for (role, _), content in zip(chunks, contents)
+        ]
@@ -0,0 +1,138 @@
+import json
+import typing
+from dataclasses import dataclass, field, replace
+
+from .canonical import canonicalize
+from .core import Prompty, param_hoisting
+from .tokens import count_text, model_name
+
+# parameters serialized into the prompt ahead of the messages
+_PROMPT_PARAMETERS = ["tools", "response_format", "functions"]
+
+
+def _tool_name(tool: typing.Any) -> tuple[str, str]:
+    if not isinstance(tool, dict):
+        return ("", "")
+    function = tool.get("function")
+    name = function.get("name", "") if isinstance(function, dict) else tool.get("name", "")
+    return (str(tool.get("type", "")), str(name))
+
+
+def stable_parameters(parameters: dict[str, typing.Any]) -> dict[str, typing.Any]:
+    """Model parameters serialized the same way whatever order the front
+    matter and overrides declared them in: keys are sorted (json schema
+    property order is kept) and tools are sorted by name.
+
+    Parameters
+    ----------
+    parameters : dict[str, any]
+        The model parameters
+
+    Returns
+    -------
+    dict[str, any]
+        The reordered parameters
+    """
+    stable = {k: parameters[k] for k in sorted(parameters)}
+    for key in _PROMPT_PARAMETERS:
+        value = stable.get(key)
+        if isinstance(value, list):
+            stable[key] = [canonicalize(v) for v in sorted(value, key=_tool_name)]
+        elif isinstance(value, dict):
+            stable[key] = canonicalize(value)
+    return stable
+
+
+def stable_prompty(prompty: Prompty) -> Prompty:
+    """The prompty with stable parameters (see stable_parameters)."""
+    model = replace(prompty.model, parameters=stable_parameters(prompty.model.parameters))
+    return replace(prompty, model=model)
+
+
+@dataclass
+class PrefixReport:
+    """Which parts of a prompty's prompt change between inputs
+
+    Attributes
+    ----------
+    messages : int
+        The most messages any of the inputs rendered
+    varying : list[int]
+        Positions of the messages that differ between the inputs
+    stable_messages : int
+        Leading messages identical for every input
+    stable_characters : int
+        Length of the prompt prefix (serialized messages) identical for
+        every input
+    stable_tokens : int
+        Tokens of that prefix, the most a provider can cache
+    stable_parameters : bool
+        Whether tools and response format already serialize in a stable
+        order (otherwise enable ``stable_prefix``)
+    """
+
+    messages: int = field(default=0)
+    varying: list[int] = field(default_factory=list)
+    stable_messages: int = field(default=0)
+    stable_characters: int = field(default=0)
+    stable_tokens: int = field(default=0)
+    stable_parameters: bool = field(default=True)
+
+
+def _serialize(message: typing.Any) -> str:
+    return json.dumps(message, ensure_ascii=False)
+
+
+def analyze_prefix(prompty: Prompty, inputs: list[dict[str, typing.Any]]) -> PrefixReport:
+    """Render a prompty with several inputs and report which message
+    positions vary, to find dynamic values that break provider-side prompt
+    caching (which only applies to a byte-identical prefix).
+
+    Parameters
+    ----------
+    prompty : Prompty
+        The prompty
+    inputs : list[dict[str, any]]
+        Representative inputs
+
+    Returns
+    -------
+    PrefixReport
+        The varying positions and the size of the stable prefix
+
+    Example
+    -------
+    >>> report = analyze_prefix(p, [{"question": "a"}, {"question": "b"}])
+    >>> report.varying
+    [1]
+    """
+    from .packing import pack
+
+    rendered = []
+    for values in inputs:
+        _, content = pack(prompty, param_hoisting(values, prompty.sample))
+        rendered.append(content if isinstance(content, list) else [content])
+
+    parameters = prompty.model.parameters
+    report = PrefixReport(
+        messages=max((len(r) for r in rendered), default=0),
+        stable_parameters=all(
+            _serialize(parameters.get(k)) == _serialize(v) for k, v in stable_parameters(parameters).items()
+        ),
+    )
+    if not rendered:
+        return report
+
+    missing = object()
+    for position in range(report.messages):
+        messages = [r[position] if position < len(r) else missing for r in rendered]
+        if any(m is missing or m != messages[0] for m in messages):
+            report.varying.append(position)
+    report.stable_messages = report.varying[0] if report.varying else report.messages
+
+    texts = ["".join(_serialize(m) for m in r) for r in rendered]
+    length = min(len(t) for t in texts)
+    common = next((i for i in range(length) if any(t[i] != texts[0][i] for t in texts)), length)
+    report.stable_characters = common
+    report.stable_tokens = count_text(texts[0][:common], model_name(prompty))
+    return report
@@ -0,0 +1,205 @@
+import threading
+import time
+import typing
+from typing import Union
+
+from .core import Prompty
+from .tokens import count_tokens
+
+
+def estimate_tokens(data: typing.Any, parameters: Union[dict, None] = None) -> int:
+    """Estimate the tokens a request counts against a tokens-per-minute budget.
+
+    Azure OpenAI counts the prompt plus the requested ``max_tokens`` when
+    admitting a request, so the estimate does the same.
+
+    Parameters
+    ----------
+    data : any
+        The parsed messages (or prompt / embedding input) sent to the executor
+    parameters : dict, optional
+        The model parameters
+
+    Returns
+    -------
+    int
+        The estimated token count
+    """
+    tokens = count_tokens(data) + 1
+    parameters = parameters or {}
+    completion = parameters.get("max_completion_tokens", parameters.get("max_tokens"))
+    if isinstance(completion, int):
+        tokens += completion
+    return tokens
+
+
+class TokenBucket:
+    """Token bucket refilling its capacity once per minute.
+
+    Callers reserve an amount up front and are told how long to wait, so
+    concurrent callers are admitted in the order they arrived.
+
+    Attributes
+    ----------
+    capacity : float
+        The budget per minute
+    level : float
+        The budget currently available (negative while reservations wait)
+    """
+
+    def __init__(self, capacity: float) -> None:
+        self.capacity = float(capacity)
+        self.level = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        rate = self.capacity / 60.0
+        self.level = min(self.capacity, self.level + (now - self._updated) * rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """Take ``amount`` from the bucket.
+
+        Returns
+        -------
+        float
+            Seconds to wait before the reservation is covered
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            # a single request larger than the budget waits for a full bucket
+            self.level -= min(amount, self.capacity)
+            if self.level >= 0:
+                return 0.0
+            return -self.level / (self.capacity / 60.0)
+
+    def give_back(self, amount: float) -> None:
+        """Return an over-estimated part of a reservation."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.level = min(self.capacity, self.level + amount)
+
+    def observe(self, remaining: float) -> None:
+        """Adopt the budget the service reports as left (it also sees the
+        other clients of the deployment)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.level = min(self.level, remaining)
+
+
+class RateLimiter:
+    """Client-side requests-per-minute and tokens-per-minute limits for a
+    deployment.
+
+    Limiters are registered by deployment (``azure_deployment``,
+    ``deployment``, ``model`` or ``name`` from the model configuration) and
+    applied to every executor call for prompties using that deployment.
+    Token usage is estimated from the parsed messages before sending and
+    corrected once the response reports its usage; the
+    ``x-ratelimit-remaining-*`` response headers lower the local budget
+    when other clients share the deployment.
+
+    Attributes
+    ----------
+    requests : TokenBucket | None
+        The requests-per-minute budget
+    tokens : TokenBucket | None
+        The tokens-per-minute budget
+
+    Example
+    -------
+    >>> RateLimiter.add("gpt-4o", RateLimiter(requests_per_minute=60, tokens_per_minute=80_000))
+    """
+
+    _limiters: dict[str, "RateLimiter"] = {}
+
+    def __init__(
+        self,
+        requests_per_minute: Union[int, None] = None,
+        tokens_per_minute: Union[int, None] = None,
+    ) -> None:
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    @classmethod
+    def add(cls, deployment: str, limiter: "RateLimiter") -> None:
+        cls._limiters[deployment] = limiter
+
+    @classmethod
+    def remove(cls, deployment: str) -> None:
+        cls._limiters.pop(deployment, None)
+
+    @classmethod
+    def clear(cls) -> None:
+        cls._limiters = {}
+
+    @staticmethod
+    def deployment(prompty: Prompty) -> Union[str, None]:
+        configuration = prompty.model.configuration
+        for key in ["azure_deployment", "deployment", "model", "name"]:
+            if configuration.get(key):
+                return str(configuration[key])
+        return None
+
+    @classmethod
+    def get(cls, prompty: Prompty) -> Union["RateLimiter", None]:
+        """The limiter for the deployment a prompty uses, if any."""
+        if not cls._limiters:
+            return None
+        deployment = cls.deployment(prompty)
+        return cls._limiters.get(deployment) if deployment is not None else None
+
+    def reserve(self, tokens: int) -> float:
+        """Reserve a request using ``tokens`` tokens.
+
+        Returns
+        -------
+        float
+            Seconds to wait before sending the request
+        """
+        delay = 0.0
+        if self.requests is not None:
+            delay = self.requests.reserve(1)
+        if self.tokens is not None:
+            delay = max(delay, self.tokens.reserve(tokens))
+        return delay
+
+    def acquire(self, tokens: int) -> None:
+        """Wait until a request using ``tokens`` tokens can be sent."""
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, tokens: int) -> None:
+        """Wait until a request using ``tokens`` tokens can be sent."""
+        delay = self.reserve(tokens)
+        if delay > 0:
+            import asyncio
+
+            await asyncio.sleep(delay)
+
+    def settle(self, estimated: int, response: typing.Any) -> None:
+        """Give back what the estimate over-reserved once the response
+        reports its usage."""
+        usage = getattr(response, "usage", None)
+        total = getattr(usage, "total_tokens", None)
+        if self.tokens is not None and isinstance(total, int) and total < estimated:
+            self.tokens.give_back(estimated - total)
+
+    def update(self, headers: typing.Any) -> None:
+        """Adapt to the ``x-ratelimit-*`` headers of a response.
+
+        Parameters
+        ----------
+        headers : Mapping[str, str]
+            The response headers
+        """
+        for name, bucket in [("requests", self.requests), ("tokens", self.tokens)]:
+            remaining = headers.get(f"x-ratelimit-remaining-{name}")
+            if bucket is None or remaining is None:
+                continue
+            try:
+                bucket.observe(float(remaining))
+            except ValueError:
+                continue
@@ -0,0 +1,269 @@
+import asyncio
+import os
+import time
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Union
+
+from .core import Prompty
+from .invoker import InvokerFactory
+from .loader import PromptyLoader
+from .utils import run_in_thread
+
+
+@dataclass
+class LoadResult:
+    """Outcome of loading a single file into a registry
+
+    Attributes
+    ----------
+    path : Path
+        The prompty file
+    prompty : Prompty | None
+        The loaded prompty, None if loading failed
+    elapsed : float
+        Time spent loading (and warming), in seconds
+    error : Exception | None
+        The error raised while loading, if any
+    """
+
+    path: Path
+    prompty: Union[Prompty, None] = None
+    elapsed: float = 0.0
+    error: Union[Exception, None] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def warm_prompty(prompty: Prompty) -> None:
+    """Resolve the renderer and parser of a prompty and compile its template.
+
+    Parameters
+    ----------
+    prompty : Prompty
+        The prompty to warm
+    """
+    for type in ["renderer", "parser"]:
+        if InvokerFactory._get_name(type, prompty).startswith("NOOP"):  # type: ignore
+            continue
+        invoker = InvokerFactory._get_invoker(type, prompty)  # type: ignore
+        if hasattr(invoker, "warm"):
+            invoker.warm()
+
+
+class PromptyRegistry:
+    """A catalog of prompties loaded from a directory tree.
+
+    Files are loaded in parallel through a shared PromptyLoader (so base
+    prompties and referenced files are only read once) and indexed by their
+    path relative to the directory (without the .prompty suffix), their
+    name and their tags. A file that fails to load is reported in
+    ``results`` and does not stop the others.
+
+    Example
+    -------
+    >>> registry = prompty.PromptyRegistry()
+    >>> results = registry.load_directory("prompts", warm=True)
+    >>> [r.path for r in results if not r.ok]
+    >>> p = registry.get("sub/basic")
+    >>> evaluators = registry.by_tag("evaluation")
+    """
+
+    def __init__(self, loader: Union[PromptyLoader, None] = None) -> None:
+        self.loader = loader if loader is not None else PromptyLoader()
+        self.results: dict[Path, LoadResult] = {}
+        self._by_key: dict[str, Prompty] = {}
+        self._by_name: dict[str, list[Prompty]] = {}
+        self._by_tag: dict[str, list[Prompty]] = {}
+
+    def __len__(self) -> int:
+        return len(self._by_key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._by_key or key in self._by_name
+
+    def __iter__(self) -> typing.Iterator[Prompty]:
+        return iter(self._by_key.values())
+
+    def keys(self) -> list[str]:
+        return list(self._by_key)
+
+    def get(self, key: str) -> Prompty:
+        """Look up a prompty by relative path (without suffix) or name.
+
+        Parameters
+        ----------
+        key : str
+            The relative path, e.g. "sub/basic", or the prompty name
+
+        Returns
+        -------
+        Prompty
+            The prompty
+
+        Raises
+        ------
+        KeyError
+            If no prompty matches
+        ValueError
+            If the name matches more than one prompty
+        """
+        if key in self._by_key:
+            return self._by_key[key]
+        if key not in self._by_name:
+            raise KeyError(key)
+        matches = self._by_name[key]
+        if len(matches) > 1:
+            files = ", ".join(str(p.file) for p in matches)
+            raise ValueError(f"Prompty name {key} is ambiguous ({files})")
+        return matches[0]
+
+    def by_tag(self, tag: str) -> list[Prompty]:
+        """All prompties carrying a tag."""
+        return list(self._by_tag.get(tag, []))
+
+    def add(self, key: str, prompty: Prompty) -> None:
+        """Index a prompty under a key, its name and its tags."""
+        previous = self._by_key.get(key)
+        if previous is not None:
+            self._unindex(previous)
+        self._by_key[key] = prompty
+        self._by_name.setdefault(prompty.name, []).append(prompty)
+        for tag in prompty.tags:
+            self._by_tag.setdefault(tag, []).append(prompty)
+
+    def _unindex(self, prompty: Prompty) -> None:
+        for index, key in [(self._by_name, prompty.name)] + [
+            (self._by_tag, tag) for tag in prompty.tags
+        ]:
+            entries = [p for p in index.get(key, []) if p is not prompty]
+            if entries:
+                index[key] = entries
+            else:
+                index.pop(key, None)
+
+    def _discover(self, directory: Path, pattern: str) -> list[Path]:
+        return sorted(p.resolve().absolute() for p in directory.glob(pattern))
+
+    def _key(self, directory: Path, path: Path) -> str:
+        return path.relative_to(directory).with_suffix("").as_posix()
+
+    def _load_one(self, path: Path, warm: bool) -> LoadResult:
+        start = time.perf_counter()
+        result = LoadResult(path=path)
+        try:
+            result.prompty = self.loader.load(path)
+            if warm:
+                warm_prompty(result.prompty)
+        except Exception as e:
+            result.error = e
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    def _collect(self, directory: Path, results: list[LoadResult]) -> None:
+        for result in results:
+            self.results[result.path] = result
+            if result.prompty is not None:
+                self.add(self._key(directory, result.path), result.prompty)
+
+    def load_directory(
+        self,
+        directory: Union[str, Path],
+        pattern: str = "**/*.prompty",
+        max_workers: Union[int, None] = None,
+        warm: bool = False,
+    ) -> list[LoadResult]:
+        """Load every prompty under a directory using a thread pool.
+
+        Parameters
+        ----------
+        directory : str | Path
+            The directory to search
+        pattern : str, optional
+            Glob pattern for the files to load, by default "**/*.prompty"
+        max_workers : int, optional
+            Number of loading threads, by default min(32, cpu count + 4)
+        warm : bool, optional
+            Compile templates and resolve invokers eagerly, by default False
+
+        Returns
+        -------
+        list[LoadResult]
+            One result per file, in path order
+        """
+        root = Path(directory).resolve().absolute()
+        files = self._discover(root, pattern)
+        workers = max_workers or min(32, (os.cpu_count() or 1) + 4)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda p: self._load_one(p, warm), files))
+        self._collect(root, results)
+        return results
+
+    async def load_directory_async(
+        self,
+        directory: Union[str, Path],
+        pattern: str = "**/*.prompty",
+        concurrency: int = 32,
+        warm: bool = False,
+    ) -> list[LoadResult]:
+        """Load every prompty under a directory concurrently (Async).
+
+        Parameters
+        ----------
+        directory : str | Path
+            The directory to search
+        pattern : str, optional
+            Glob pattern for the files to load, by default "**/*.prompty"
+        concurrency : int, optional
+            Maximum number of files loading at once, by default 32
+        warm : bool, optional
+            Compile templates and resolve invokers eagerly, by default False
+
+        Returns
+        -------
+        list[LoadResult]
+            One result per file, in path order
+        """
+        root = await run_in_thread(lambda: Path(directory).resolve().absolute())
+        files = await run_in_thread(self._discover, root, pattern)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def load_one(path: Path) -> LoadResult:
+            async with semaphore:
+                start = time.perf_counter()
+                result = LoadResult(path=path)
+                try:
+                    result.prompty = await self.loader.load_async(path)
+                    if warm:
+                        await run_in_thread(warm_prompty, result.prompty)
+                except Exception as e:
+                    result.error = e
+                result.elapsed = time.perf_counter() - start
+                return result
+
+        results = list(await asyncio.gather(*[load_one(p) for p in files]))
+        self._collect(root, results)
+        return results
+
+    def warm(self) -> list[LoadResult]:
+        """Warm every loaded prompty, reporting failures per file.
+
+        Returns
+        -------
+        list[LoadResult]
+            The files that failed to warm
+        """
+        failed = []
+        for result in self.results.values():
+            if result.prompty is None:
+                continue
+            try:
+                warm_prompty(result.prompty)
+            except Exception as e:
+                failed.append(LoadResult(path=result.path, error=e))
+        return failed
+
@@ -1,60 +1,195 @@
+import functools
+import marshal
+import threading
 import typing
+from collections import OrderedDict
 from pathlib import Path
+from types import CodeType
 
-from jinja2 import DictLoader, Environment
-from .mustache import render
+from jinja2 import DictLoader, Environment, Template
+from .mustache import render, tokenize
 
 from .core import Prompty
 from .invoker import Invoker
+from .utils import run_in_thread, size_hint
+
+
+def _file_path(prompty: Prompty) -> Path:
+    # the prompty is shared, so resolve the path without storing it back
+    if isinstance(prompty.file, str):
+        return Path(prompty.file).resolve().absolute()
+    return prompty.file
+
+
+# compiled template code keyed by (name, source, async), kept separately from
+# the templates so it can be exported to and seeded from a bundle
+_jinja_code: "OrderedDict[tuple[str, str, bool], CodeType]" = OrderedDict()
+_jinja_code_lock = threading.Lock()
+JINJA_CODE_CACHE_SIZE = 1024
+
+# mustache token lists seeded from a bundle
+_mustache_token_cache: dict[str, tuple[tuple[str, str], ...]] = {}
+
+
+def _compiled_code(
+    environment: Environment, name: str, source: str, filename: typing.Optional[str]
+) -> CodeType:
+    key = (name, source, environment.is_async)
+    with _jinja_code_lock:
+        code = _jinja_code.get(key)
+    if code is None:
+        code = environment.compile(source, name, filename)
+        with _jinja_code_lock:
+            _jinja_code[key] = code
+            while len(_jinja_code) > JINJA_CODE_CACHE_SIZE:
+                _jinja_code.popitem(last=False)
+    return code
+
+
+class _CompiledLoader(DictLoader):
+    """DictLoader that reuses compiled template code across environments."""
+
+    def load(
+        self,
+        environment: Environment,
+        name: str,
+        globals: typing.Optional[typing.MutableMapping[str, typing.Any]] = None,
+    ) -> Template:
+        source, filename, uptodate = self.get_source(environment, name)
+        code = _compiled_code(environment, name, source, filename)
+        return environment.template_class.from_code(
+            environment, code, environment.make_globals(globals), uptodate
+        )
+
+
+@functools.lru_cache(maxsize=512)
+def _jinja_template(
+    templates: tuple[tuple[str, str], ...], name: str, enable_async: bool
+) -> Template:
+    # compiled templates are shared by every render of the same sources
+    env = Environment(
+        loader=_CompiledLoader(dict(templates)), enable_async=enable_async
+    )
+    return env.get_template(name)
+
+
+@functools.lru_cache(maxsize=512)
+def _tokenize(template: str) -> tuple[tuple[str, str], ...]:
+    return tuple(tokenize(template))
+
+
+def _mustache_tokens(template: str) -> tuple[tuple[str, str], ...]:
+    tokens = _mustache_token_cache.get(template)
+    return tokens if tokens is not None else _tokenize(template)
+
+
+def export_compiled(templates: dict[str, str], type: str = "jinja2") -> dict[str, list]:
+    """Compiled code (jinja2) or token lists (mustache) for templates.
+
+    The result can be passed to ``import_compiled`` in another process
+    running the same Python and Jinja versions.
+
+    Parameters
+    ----------
+    templates : dict[str, str]
+        Template sources by name
+    type : str, optional
+        The template type, "jinja2" or "mustache", by default "jinja2"
+
+    Returns
+    -------
+    dict[str, list]
+        The "jinja" and "mustache" entries
+    """
+    jinja = []
+    mustache = []
+    if type == "mustache":
+        mustache = [(source, _mustache_tokens(source)) for source in templates.values()]
+    elif type == "jinja2":
+        for enable_async in [False, True]:
+            env = Environment(enable_async=enable_async)
+            for name, source in templates.items():
+                code = _compiled_code(env, name, source, None)
+                jinja.append((name, source, enable_async, marshal.dumps(code)))
+    return {"jinja": jinja, "mustache": mustache}
+
+
+def import_compiled(compiled: dict[str, list]) -> None:
+    """Seed the template caches from ``export_compiled`` output."""
+    with _jinja_code_lock:
+        for name, source, enable_async, code in compiled.get("jinja", []):
+            _jinja_code[(name, source, enable_async)] = marshal.loads(code)
+    for source, tokens in compiled.get("mustache", []):
+        _mustache_token_cache[source] = tokens
 
 
 class Jinja2Renderer(Invoker):
     """Jinja2 Renderer"""
 
+    # combined template + input size (in characters) above which
+    # async rendering is moved to the thread pool (see utils.set_thread_pool)
+    offload_threshold: int = 64 * 1024
+
     def __init__(self, prompty: Prompty) -> None:
         super().__init__(prompty)
         self.templates: dict[str, str] = {}
         # generate template dictionary
         cur_prompt: typing.Union[Prompty, None] = self.prompty
         while cur_prompt:
-            if isinstance(cur_prompt.file, str):
-                cur_prompt.file = Path(cur_prompt.file).resolve().absolute()
-
             if isinstance(cur_prompt.content, str):
-                self.templates[cur_prompt.file.name] = cur_prompt.content
+                self.templates[_file_path(cur_prompt).name] = cur_prompt.content
 
             cur_prompt = cur_prompt.basePrompty
 
-        if isinstance(self.prompty.file, str):
-            self.prompty.file = Path(self.prompty.file).resolve().absolute()
+        self.name = _file_path(self.prompty).name
 
-        self.name = self.prompty.file.name
+    def warm(self) -> None:
+        """Compile the templates ahead of the first render."""
+        sources = tuple(self.templates.items())
+        for enable_async in [False, True]:
+            t = _jinja_template(sources, self.name, enable_async)
+            # templates pulled in with extends/include are compiled too
+            for name in self.templates:
+                t.environment.get_template(name)
 
     def invoke(self, data: typing.Any) -> typing.Any:
-        env = Environment(loader=DictLoader(self.templates))
-        t = env.get_template(self.name)
+        t = _jinja_template(tuple(self.templates.items()), self.name, False)
         generated = t.render(**data)
         return generated
 
-    async def invoke_async(self, data: str) -> str:
-        """Invoke the Prompty Chat Parser (Async)
+    async def invoke_async(self, data: typing.Any) -> typing.Any:
+        """Invoke the Jinja2 Renderer (Async)
+
+        Large renders are offloaded to the thread pool; smaller ones use
+        Jinja's native async rendering so awaitable inputs are resolved
+        without blocking the event loop.
 
         Parameters
         ----------
-        data : str
-            The data to parse
+        data : any
+            The data to render
 
         Returns
         -------
         str
-            The parsed data
+            The rendered template
         """
-        return self.invoke(data)
+        size = size_hint(self.templates, self.offload_threshold)
+        if size_hint(data, self.offload_threshold - size) + size > self.offload_threshold:
+            return await run_in_thread(self.invoke, data)
+
+        t = _jinja_template(tuple(self.templates.items()), self.name, True)
+        generated = await t.render_async(**data)
+        return generated
 
 
 class MustacheRenderer(Invoker):
     """Render a mustache template."""
 
+    # combined template + input size (in characters) above which
+    # async rendering is moved to the thread pool (see utils.set_thread_pool)
+    offload_threshold: int = 64 * 1024
+
     def __init__(self, prompty: Prompty) -> None:
         super().__init__(prompty)
         self.templates = {}
@@ -64,21 +199,32 @@ class MustacheRenderer(Invoker):
             cur_prompt = cur_prompt.basePrompty
         self.name = Path(self.prompty.file).name
 
+    def _template(self) -> typing.Any:
+        content = self.prompty.content
+        return _mustache_tokens(content) if isinstance(content, str) else content
+
+    def warm(self) -> None:
+        """Tokenize the template ahead of the first render."""
+        self._template()
+
     def invoke(self, data: str) -> str:
-        generated = render(self.prompty.content, data)  # type: ignore
+        generated = render(self._template(), data)  # type: ignore
         return generated
 
     async def invoke_async(self, data: str) -> str:
-        """Invoke the Prompty Chat Parser (Async)
+        """Invoke the Mustache Renderer (Async)
 
         Parameters
         ----------
         data : str
-            The data to parse
+            The data to render
 
         Returns
         -------
         str
-            The parsed data
+            The rendered template
         """
+        size = size_hint(self.prompty.content, self.offload_threshold)
+        if size_hint(data, self.offload_threshold - size) + size > self.offload_threshold:
+            return await run_in_thread(self.invoke, data)
         return self.invoke(data)
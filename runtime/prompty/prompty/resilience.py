@@ -0,0 +1,416 @@
+import email.utils
+import random
+import threading
+import time
+import typing
+from dataclasses import dataclass, field
+from typing import Union
+
+from . import utils
+from .core import Prompty
+from .tracer import Tracer
+
+if typing.TYPE_CHECKING:
+    from concurrent.futures import Executor
+
+# transient http statuses worth retrying
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+# threads running sync attempts that have a timeout (the pool set with
+# utils.set_thread_pool is used when there is one); timed out attempts keep
+# their thread until the call returns, later ones queue behind them
+ATTEMPT_WORKERS = 16
+_attempt_pool: "Union[Executor, None]" = None
+_attempt_pool_lock = threading.Lock()
+
+# transport errors without a status (openai / azure core / builtin)
+_TRANSIENT_ERRORS = {
+    "APIConnectionError",
+    "APITimeoutError",
+    "ServiceRequestError",
+    "ServiceResponseError",
+}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a connection whose circuit breaker is open"""
+
+    def __init__(self, connection: str, retry_in: float) -> None:
+        super().__init__(f"Circuit open for {connection}, retry in {retry_in:.1f}s")
+        self.connection = connection
+        self.retry_in = retry_in
+
+
+def connection_key(prompty: Prompty) -> str:
+    """Identifies the connection (executor type, endpoint and deployment) a
+    prompty executes against."""
+    c = prompty.model.configuration
+    endpoint = c.get("azure_endpoint") or c.get("endpoint") or c.get("base_url") or ""
+    deployment = c.get("azure_deployment") or c.get("deployment") or c.get("model") or c.get("name") or ""
+    return f"{c.get('type', '')}:{endpoint}:{deployment}"
+
+
+def _status(error: BaseException) -> Union[int, None]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def is_transient(error: BaseException) -> bool:
+    """Whether a failed request is worth retrying (timeouts, connection
+    errors, throttling and server errors)."""
+    status = _status(error)
+    if status is not None:
+        return status in RETRY_STATUSES
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    return any(t.__name__ in _TRANSIENT_ERRORS for t in type(error).__mro__)
+
+
+def retry_after(error: BaseException) -> Union[float, None]:
+    """The delay the service asked for, in seconds, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if headers is None:
+        return None
+    milliseconds = headers.get("retry-after-ms")
+    value = headers.get("retry-after")
+    try:
+        if milliseconds is not None:
+            return float(milliseconds) / 1000.0
+        if value is not None:
+            return float(value)
+    except ValueError:
+        pass
+    if value is None:
+        return None
+    try:
+        # or an http date
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, date.timestamp() - time.time())
+
+
+class CircuitBreaker:
+    """Stops calling a connection after consecutive transient failures.
+
+    After ``failures`` consecutive failures the circuit opens and calls fail
+    fast with ``CircuitOpenError`` for ``reset`` seconds; then a single trial
+    call is let through (half open) and closes the circuit if it succeeds.
+
+    Attributes
+    ----------
+    failures : int
+        Consecutive failures opening the circuit
+    reset : float
+        Seconds the circuit stays open
+    """
+
+    _breakers: dict[str, "CircuitBreaker"] = {}
+    _breakers_lock = threading.Lock()
+
+    def __init__(self, failures: int = 5, reset: float = 30.0) -> None:
+        self.failures = failures
+        self.reset = reset
+        self._consecutive = 0
+        self._opened_at: Union[float, None] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get(cls, connection: str, failures: int = 5, reset: float = 30.0) -> "CircuitBreaker":
+        """The breaker of a connection (created on first use)."""
+        with cls._breakers_lock:
+            breaker = cls._breakers.get(connection)
+            if breaker is None:
+                breaker = cls._breakers[connection] = CircuitBreaker(failures, reset)
+            else:
+                breaker.failures = failures
+                breaker.reset = reset
+            return breaker
+
+    @classmethod
+    def clear(cls) -> None:
+        with cls._breakers_lock:
+            cls._breakers = {}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at < self.reset:
+                return "open"
+            return "half_open"
+
+    def allow(self, connection: str) -> None:
+        """Raise ``CircuitOpenError`` unless a call may go through."""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            elapsed = time.monotonic() - self._opened_at
+            if elapsed >= self.reset and not self._trial:
+                self._trial = True
+                return
+            raise CircuitOpenError(connection, max(0.0, self.reset - elapsed))
+
+    def success(self) -> None:
+        with self._lock:
+            self._consecutive = 0
+            self._opened_at = None
+            self._trial = False
+
+    def failure(self) -> None:
+        with self._lock:
+            self._consecutive += 1
+            if self._trial or self._consecutive >= self.failures:
+                self._opened_at = time.monotonic()
+            self._trial = False
+
+
+@dataclass
+class Resilience:
+    """Retry, timeout and circuit breaker policy for executor calls.
+
+    Configured under ``resilience`` in the model configuration (or the
+    prompty.json configuration it comes from). Transient failures are
+    retried with jittered exponential backoff, waiting at least as long as
+    a ``retry-after`` header asks; nothing is retried past the total
+    deadline. Every attempt is traced as its own span. Set the client's own
+    ``max_retries`` to 0 to leave retrying to this policy.
+
+    Attributes
+    ----------
+    retries : int
+        Retries after the first attempt, by default 2
+    timeout : float | None
+        Seconds per attempt, by default unbounded
+    deadline : float | None
+        Seconds for all attempts and backoff together, by default unbounded
+    backoff : float
+        Base backoff in seconds, doubled every retry, by default 0.5
+    max_backoff : float
+        Backoff cap in seconds, by default 30
+    failures : int
+        Consecutive transient failures opening the connection's circuit,
+        by default 5
+    reset : float
+        Seconds the circuit stays open, by default 30
+
+    Example
+    -------
+    >>> model:
+    >>>   configuration:
+    >>>     resilience:
+    >>>       retries: 3
+    >>>       timeout: 20
+    >>>       deadline: 60
+    >>>       circuit_breaker: {failures: 5, reset: 30}
+    """
+
+    retries: int = field(default=2)
+    timeout: Union[float, None] = field(default=None)
+    deadline: Union[float, None] = field(default=None)
+    backoff: float = field(default=0.5)
+    max_backoff: float = field(default=30.0)
+    failures: int = field(default=5)
+    reset: float = field(default=30.0)
+
+    @staticmethod
+    def from_configuration(configuration: dict) -> Union["Resilience", None]:
+        """The policy configured for a model configuration, if any."""
+        settings = configuration.get("resilience")
+        if not settings:
+            return None
+        if not isinstance(settings, dict):
+            raise ValueError(f"resilience must be an object, got {settings!r}")
+        breaker = settings.get("circuit_breaker", {})
+        unknown = set(settings) - {"retries", "timeout", "deadline", "backoff", "max_backoff", "circuit_breaker"}
+        if unknown:
+            raise ValueError(f"Unknown resilience settings {sorted(unknown)}")
+        return Resilience(
+            retries=int(settings.get("retries", 2)),
+            timeout=settings.get("timeout"),
+            deadline=settings.get("deadline"),
+            backoff=float(settings.get("backoff", 0.5)),
+            max_backoff=float(settings.get("max_backoff", 30.0)),
+            failures=int(breaker.get("failures", 5)),
+            reset=float(breaker.get("reset", 30.0)),
+        )
+
+    def _delay(self, attempt: int, error: BaseException) -> float:
+        # full jitter, but never sooner than the service asked for
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2**attempt))
+        requested = retry_after(error)
+        return max(delay, requested) if requested is not None else delay
+
+    def _next(
+        self, attempt: int, error: BaseException, started: float
+    ) -> Union[float, None]:
+        # the delay before the next attempt, None to give up
+        if attempt >= self.retries or not is_transient(error):
+            return None
+        delay = self._delay(attempt, error)
+        if self.deadline is not None and time.monotonic() + delay - started >= self.deadline:
+            return None
+        return delay
+
+    def _timeout(self, started: float) -> Union[float, None]:
+        remaining = None if self.deadline is None else self.deadline - (time.monotonic() - started)
+        if self.timeout is None:
+            return remaining
+        return self.timeout if remaining is None else min(self.timeout, remaining)
+
+    def call(
+        self, prompty: Prompty, invoke: typing.Callable[[typing.Any], typing.Any], data: typing.Any
+    ) -> typing.Any:
+        """Call ``invoke(data)`` under this policy
+
+        Parameters
+        ----------
+        prompty : Prompty
+            The prompty (its connection keys the circuit breaker)
+        invoke : Callable
+            The executor call
+        data : any
+            The data to send
+
+        Returns
+        -------
+        any
+            The result of the first successful attempt
+        """
+        connection = connection_key(prompty)
+        breaker = CircuitBreaker.get(connection, self.failures, self.reset)
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            breaker.allow(connection)
+            with Tracer.start("attempt") as trace:
+                trace("signature", f"{connection}.attempt")
+                trace("inputs", {"attempt": attempt + 1})
+                try:
+                    result = self._attempt(invoke, data, self._timeout(started))
+                except Exception as e:
+                    delay = self._failed(breaker, attempt, e, started, trace)
+                    if delay is None:
+                        raise
+                else:
+                    breaker.success()
+                    trace("result", "success")
+                    return result
+            time.sleep(delay)
+            attempt += 1
+
+    async def call_async(
+        self, prompty: Prompty, invoke: typing.Callable[[typing.Any], typing.Awaitable], data: typing.Any
+    ) -> typing.Any:
+        """Call ``await invoke(data)`` under this policy (Async)
+
+        Parameters
+        ----------
+        prompty : Prompty
+            The prompty (its connection keys the circuit breaker)
+        invoke : Callable
+            The executor call
+        data : any
+            The data to send
+
+        Returns
+        -------
+        any
+            The result of the first successful attempt
+        """
+        import asyncio
+
+        connection = connection_key(prompty)
+        breaker = CircuitBreaker.get(connection, self.failures, self.reset)
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            breaker.allow(connection)
+            with Tracer.start("attempt") as trace:
+                trace("signature", f"{connection}.attempt")
+                trace("inputs", {"attempt": attempt + 1})
+                timeout = self._timeout(started)
+                try:
+                    result = await asyncio.wait_for(invoke(data), timeout)
+                except asyncio.TimeoutError as e:
+                    # not the builtin TimeoutError before python 3.11, raise
+                    # the same error as the sync path
+                    error = TimeoutError(f"Attempt timed out after {timeout:.1f}s")
+                    delay = self._failed(breaker, attempt, error, started, trace)
+                    if delay is None:
+                        raise error from e
+                except Exception as e:
+                    delay = self._failed(breaker, attempt, e, started, trace)
+                    if delay is None:
+                        raise
+                else:
+                    breaker.success()
+                    trace("result", "success")
+                    return result
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _failed(
+        self,
+        breaker: CircuitBreaker,
+        attempt: int,
+        error: BaseException,
+        started: float,
+        trace: typing.Callable[[str, typing.Any], typing.Any],
+    ) -> Union[float, None]:
+        if is_transient(error):
+            breaker.failure()
+        else:
+            # the service answered (e.g. a bad request), it is healthy
+            breaker.success()
+        trace("error", f"{type(error).__name__}: {error}")
+        delay = self._next(attempt, error, started)
+        if delay is not None:
+            trace("retry_in", delay)
+        return delay
+
+    @staticmethod
+    def _attempt(
+        invoke: typing.Callable[[typing.Any], typing.Any], data: typing.Any, timeout: Union[float, None]
+    ) -> typing.Any:
+        if timeout is None:
+            return invoke(data)
+
+        # a sync call cannot be interrupted: it runs in a thread and is
+        # abandoned (its result discarded) when the attempt times out
+        import concurrent.futures
+        import contextvars
+
+        future = _pool().submit(contextvars.copy_context().run, invoke, data)
+        try:
+            return future.result(timeout=max(0.0, timeout))
+        except concurrent.futures.TimeoutError:
+            # still queued behind other calls: never started
+            if not future.cancel():
+                future.add_done_callback(_close_result)
+            raise TimeoutError(f"Attempt timed out after {timeout:.1f}s") from None
+
+
+def _pool() -> "Executor":
+    global _attempt_pool
+    if utils._thread_pool is not None:
+        return utils._thread_pool
+    with _attempt_pool_lock:
+        if _attempt_pool is None:
+            import concurrent.futures
+
+            _attempt_pool = concurrent.futures.ThreadPoolExecutor(
+                max_workers=ATTEMPT_WORKERS, thread_name_prefix="prompty-attempt"
+            )
+        return _attempt_pool
+
+
+def _close_result(future: typing.Any) -> None:
+    if not future.cancelled() and future.exception() is None:
+        close = getattr(future.result(), "close", None)
+        if close is not None:
+            close()
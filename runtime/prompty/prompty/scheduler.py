@@ -0,0 +1,367 @@
+import contextlib
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+import typing
+from collections.abc import AsyncIterator, Iterator
+from typing import Union
+
+from .core import AsyncPromptyStream, Prompty, PromptyStream, _aclose, _close
+
+# priority classes, lower runs first
+PRIORITIES = {"interactive": 0, "default": 1, "batch": 2}
+
+_priority: contextvars.ContextVar[Union[str, int, None]] = contextvars.ContextVar(
+    "prompty_priority", default=None
+)
+_tenant: contextvars.ContextVar[Union[str, None]] = contextvars.ContextVar(
+    "prompty_tenant", default=None
+)
+
+
+@contextlib.contextmanager
+def scheduling(
+    priority: Union[str, int, None] = None, tenant: Union[str, None] = None
+) -> Iterator[None]:
+    """Set the priority and tenant of the executor calls made in this context.
+
+    Parameters
+    ----------
+    priority : str | int, optional
+        A priority class ("interactive", "default", "batch") or a number,
+        lower runs first
+    tenant : str, optional
+        The flow calls are fairly queued by, by default the prompty name
+
+    Example
+    -------
+    >>> with prompty.scheduling(priority="batch", tenant="nightly-eval"):
+    ...     result = prompty.execute("prompts/basic.prompty")
+    """
+    tokens: list[tuple[contextvars.ContextVar, contextvars.Token]] = []
+    if priority is not None:
+        tokens.append((_priority, _priority.set(priority)))
+    if tenant is not None:
+        tokens.append((_tenant, _tenant.set(tenant)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class _Waiter:
+    __slots__ = (
+        "priority",
+        "start",
+        "sequence",
+        "queued_at",
+        "event",
+        "loop",
+        "future",
+        "admitted",
+        "cancelled",
+    )
+
+    def __init__(self, priority: int, start: float, sequence: int) -> None:
+        self.priority = priority
+        self.start = start
+        self.sequence = sequence
+        self.queued_at = time.monotonic()
+        self.event: typing.Any = None
+        self.loop: typing.Any = None
+        self.future: typing.Any = None
+        self.admitted = False
+        self.cancelled = False
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.start, self.sequence) < (
+            other.priority,
+            other.start,
+            other.sequence,
+        )
+
+    def wake(self) -> None:
+        if self.event is not None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future: typing.Any) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class _Held(Iterator):
+    """Reads a stream, releasing its executor slot once it is exhausted,
+    fails or is closed."""
+
+    def __init__(self, stream: Iterator, release: typing.Callable[[], None]) -> None:
+        self.stream = stream
+        self._release: Union[typing.Callable[[], None], None] = release
+
+    def __next__(self) -> typing.Any:
+        try:
+            return next(self.stream)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        release, self._release = self._release, None
+        if release is not None:
+            try:
+                _close(self.stream)
+            finally:
+                release()
+
+    def __del__(self) -> None:
+        # never read to the end nor closed
+        release, self._release = self._release, None
+        if release is not None:
+            release()
+
+
+class _AsyncHeld(AsyncIterator):
+    """_Held for async streams."""
+
+    def __init__(self, stream: AsyncIterator, release: typing.Callable[[], None]) -> None:
+        self.stream = stream
+        self._release: Union[typing.Callable[[], None], None] = release
+
+    async def __anext__(self) -> typing.Any:
+        try:
+            return await self.stream.__anext__()
+        except BaseException:
+            await self.aclose()
+            raise
+
+    async def aclose(self) -> None:
+        release, self._release = self._release, None
+        if release is not None:
+            try:
+                await _aclose(self.stream)
+            finally:
+                release()
+
+    def __del__(self) -> None:
+        release, self._release = self._release, None
+        if release is not None:
+            release()
+
+
+class _Slot:
+    """An admitted executor call, see Scheduler.slot."""
+
+    def __init__(self, scheduler: "Scheduler") -> None:
+        self.scheduler = scheduler
+        self.held = False
+
+    def hold(self, value: typing.Any) -> typing.Any:
+        """Keep the slot while a streamed result is read: returns a stream
+        releasing it once exhausted or closed (other results as is)."""
+        if isinstance(value, PromptyStream):
+            self.held = True
+            stream: typing.Any = PromptyStream(value.name, _Held(value, self.scheduler._release))
+        elif isinstance(value, AsyncPromptyStream):
+            self.held = True
+            stream = AsyncPromptyStream(value.name, _AsyncHeld(value, self.scheduler._release))
+        else:
+            return value
+        # the wrapped stream traces the chunks
+        stream._traced = True
+        return stream
+
+
+class Scheduler:
+    """Admits executor calls by priority with fair queuing between flows.
+
+    At most ``max_concurrency`` executor calls run at a time; waiting calls
+    are admitted strictly by priority class, and within a class by
+    start-time fair queuing over their flow (the tenant set with
+    ``scheduling``, otherwise the prompty name), so one busy flow cannot
+    starve the others. Works for sync and async calls alike; a streamed
+    result holds its slot until it is read to the end or closed.
+
+    Attributes
+    ----------
+    max_concurrency : int
+        The maximum number of concurrent executor calls
+    weights : dict[str, float]
+        Relative share per flow, by default 1
+
+    Example
+    -------
+    >>> Scheduler.install(Scheduler(max_concurrency=16, weights={"chat": 4}))
+    >>> result = prompty.execute("prompts/basic.prompty", priority="interactive")
+    """
+
+    _installed: Union["Scheduler", None] = None
+
+    def __init__(
+        self, max_concurrency: int = 8, weights: Union[dict[str, float], None] = None
+    ) -> None:
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.max_concurrency = max_concurrency
+        self.weights = weights or {}
+        self._lock = threading.Lock()
+        self._queue: list[_Waiter] = []
+        self._sequence = itertools.count()
+        self._running = 0
+        self._virtual = 0.0
+        self._finish: dict[str, float] = {}
+        self._finish_limit = 64
+        self._depth: dict[int, int] = {}
+        self._admitted: dict[int, int] = {}
+        self._wait_total: dict[int, float] = {}
+        self._wait_max: dict[int, float] = {}
+
+    @classmethod
+    def install(cls, scheduler: Union["Scheduler", None]) -> None:
+        """Schedule every executor call through ``scheduler`` (None to stop)."""
+        cls._installed = scheduler
+
+    @classmethod
+    def installed(cls) -> Union["Scheduler", None]:
+        return cls._installed
+
+    @staticmethod
+    def _priority(value: Union[str, int, None]) -> int:
+        if value is None:
+            return PRIORITIES["default"]
+        if isinstance(value, int):
+            return value
+        if value not in PRIORITIES:
+            raise ValueError(f"Priority {value} not found, use one of {list(PRIORITIES)} or a number")
+        return PRIORITIES[value]
+
+    def _enqueue(self, prompty: Prompty, loop: typing.Any = None) -> Union[_Waiter, None]:
+        priority = self._priority(_priority.get())
+        flow = _tenant.get() or prompty.name
+        with self._lock:
+            # start-time fair queuing: a flow's next call starts where its
+            # previous one finished (in virtual time)
+            start = max(self._virtual, self._finish.get(flow, 0.0))
+            self._finish[flow] = start + 1.0 / self.weights.get(flow, 1.0)
+            if len(self._finish) > self._finish_limit:
+                self._prune()
+            waiter = _Waiter(priority, start, next(self._sequence))
+            # cancelled waiters stay in the heap until popped, count live ones
+            if self._running < self.max_concurrency and not any(self._depth.values()):
+                self._admit(waiter)
+                return None
+            if loop is None:
+                waiter.event = threading.Event()
+            else:
+                waiter.loop = loop
+                waiter.future = loop.create_future()
+            heapq.heappush(self._queue, waiter)
+            self._depth[priority] = self._depth.get(priority, 0) + 1
+            return waiter
+
+    def _prune(self) -> None:
+        # called with the lock held; flows that finished in virtual time
+        # start at the virtual time anyway, forget them
+        virtual = self._virtual
+        self._finish = {f: t for f, t in self._finish.items() if t > virtual}
+        self._finish_limit = max(64, 2 * len(self._finish))
+
+    def _admit(self, waiter: _Waiter) -> None:
+        # called with the lock held
+        self._running += 1
+        self._virtual = max(self._virtual, waiter.start)
+        waited = time.monotonic() - waiter.queued_at
+        p = waiter.priority
+        self._admitted[p] = self._admitted.get(p, 0) + 1
+        self._wait_total[p] = self._wait_total.get(p, 0.0) + waited
+        self._wait_max[p] = max(self._wait_max.get(p, 0.0), waited)
+        waiter.admitted = True
+
+    def _release(self) -> None:
+        with self._lock:
+            self._running -= 1
+            while self._queue and self._running < self.max_concurrency:
+                waiter = heapq.heappop(self._queue)
+                if waiter.cancelled:
+                    continue
+                self._depth[waiter.priority] -= 1
+                self._admit(waiter)
+                waiter.wake()
+            if self._running == 0 and not any(self._depth.values()):
+                # idle: no flow is behind another, start every flow afresh
+                self._virtual = max(self._finish.values(), default=self._virtual)
+                self._finish.clear()
+
+    def _cancel(self, waiter: _Waiter) -> None:
+        with self._lock:
+            admitted = waiter.admitted
+            if not admitted:
+                waiter.cancelled = True
+                self._depth[waiter.priority] -= 1
+        if admitted:
+            # admitted while being cancelled, pass the slot on
+            self._release()
+
+    @contextlib.contextmanager
+    def slot(self, prompty: Prompty) -> Iterator[_Slot]:
+        """Wait for (and hold) an executor slot. The slot is released on
+        leaving the block, unless handed to a stream with ``hold``."""
+        waiter = self._enqueue(prompty)
+        if waiter is not None:
+            waiter.event.wait()
+        slot = _Slot(self)
+        try:
+            yield slot
+        finally:
+            if not slot.held:
+                self._release()
+
+    @contextlib.asynccontextmanager
+    async def slot_async(self, prompty: Prompty) -> AsyncIterator[_Slot]:
+        """Wait for (and hold) an executor slot. The slot is released on
+        leaving the block, unless handed to a stream with ``hold``."""
+        import asyncio
+
+        waiter = self._enqueue(prompty, asyncio.get_running_loop())
+        if waiter is not None:
+            try:
+                await waiter.future
+            except asyncio.CancelledError:
+                self._cancel(waiter)
+                raise
+        slot = _Slot(self)
+        try:
+            yield slot
+        finally:
+            if not slot.held:
+                self._release()
+
+    def metrics(self) -> dict[str, typing.Any]:
+        """Queue depth and wait times per priority class.
+
+        Returns
+        -------
+        dict
+            ``running``, ``max_concurrency`` and, per priority, ``queued``,
+            ``admitted``, ``wait_total`` and ``wait_max`` (seconds)
+        """
+        names = {v: k for k, v in PRIORITIES.items()}
+        with self._lock:
+            priorities = set(self._depth) | set(self._admitted)
+            return {
+                "running": self._running,
+                "max_concurrency": self.max_concurrency,
+                "priorities": {
+                    names.get(p, str(p)): {
+                        "queued": self._depth.get(p, 0),
+                        "admitted": self._admitted.get(p, 0),
+                        "wait_total": self._wait_total.get(p, 0.0),
+                        "wait_max": self._wait_max.get(p, 0.0),
+                    }
+                    for p in sorted(priorities)
+                },
+            }
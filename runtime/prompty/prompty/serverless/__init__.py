@@ -1,8 +1,25 @@
 # __init__.py
-from prompty.invoker import InvokerException
+import typing
 
-try:
-    from .executor import ServerlessExecutor # noqa
-    from .processor import ServerlessProcessor  # noqa
-except ImportError:
-    raise InvokerException("Error registering ServerlessExecutor and ServerlessProcessor", "serverless")
+from prompty.invoker import InvokerException, InvokerFactory
+from prompty.utils import installed
+
+if not installed("azure.identity", "azure.ai.inference"):
+    raise InvokerException(
+        "Error registering ServerlessExecutor and ServerlessProcessor", "serverless"
+    )
+
+# the SDKs are imported when a prompty first uses these invokers
+InvokerFactory.add_executor("serverless", "prompty.serverless.executor:ServerlessExecutor")
+InvokerFactory.add_processor("serverless", "prompty.serverless.processor:ServerlessProcessor")
+
+_invokers = {
+    "ServerlessExecutor": "prompty.serverless.executor",
+    "ServerlessProcessor": "prompty.serverless.processor",
+}
+
+
+def __getattr__(name: str) -> typing.Any:
+    if name in _invokers:
+        return getattr(InvokerFactory.import_module(_invokers[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
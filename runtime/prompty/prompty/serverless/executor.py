@@ -1,4 +1,3 @@
-import importlib.metadata
 import typing
 from collections.abc import Iterator
 
@@ -19,11 +18,10 @@ from azure.ai.inference.models import (
 )
 from azure.core.credentials import AzureKeyCredential
 
-from ..core import AsyncPromptyStream, Prompty, PromptyStream
+from ..core import RUNTIME_CONFIGURATION_KEYS, AsyncPromptyStream, Prompty, PromptyStream
 from ..invoker import Invoker, InvokerFactory
 from ..tracer import Tracer
-
-VERSION = importlib.metadata.version("prompty")
+from ..utils import prompty_version
 
 
 @InvokerFactory.register_executor("serverless")
@@ -35,7 +33,7 @@ class ServerlessExecutor(Invoker):
         self.kwargs = {
             key: value
             for key, value in self.prompty.model.configuration.items()
-            if key != "type"
+            if key not in RUNTIME_CONFIGURATION_KEYS
         }
 
         self.endpoint = self.prompty.model.configuration["endpoint"]
@@ -102,7 +100,7 @@ class ServerlessExecutor(Invoker):
                 )
                 trace("inputs", cargs)
                 client: typing.Any = ChatCompletionsClient(
-                    user_agent=f"prompty/{VERSION}",
+                    user_agent=f"prompty/{prompty_version()}",
                     **cargs,
                 )
                 trace("result", client)
@@ -136,7 +134,7 @@ class ServerlessExecutor(Invoker):
                 trace("description", "Azure Unified Inference SDK Embeddings Client")
                 trace("inputs", cargs)
                 client = EmbeddingsClient(
-                    user_agent=f"prompty/{VERSION}",
+                    user_agent=f"prompty/{prompty_version()}",
                     **cargs,
                 )
                 trace("result", client)
@@ -191,7 +189,7 @@ class ServerlessExecutor(Invoker):
                 )
                 trace("inputs", cargs)
                 client: typing.Any = AsyncChatCompletionsClient(
-                    user_agent=f"prompty/{VERSION}",
+                    user_agent=f"prompty/{prompty_version()}",
                     **cargs,
                 )
                 trace("result", client)
@@ -228,7 +226,7 @@ class ServerlessExecutor(Invoker):
                 )
                 trace("inputs", cargs)
                 client = AsyncEmbeddingsClient(
-                    user_agent=f"prompty/{VERSION}",
+                    user_agent=f"prompty/{prompty_version()}",
                     **cargs,
                 )
                 trace("result", client)
@@ -5,6 +5,7 @@ from azure.ai.inference.models import ChatCompletions, EmbeddingsResult
 
 from ..core import AsyncPromptyStream, Prompty, PromptyStream, ToolCall
 from ..invoker import Invoker, InvokerFactory
+from ..streaming import stream_events, stream_events_async, stream_mode
 
 
 @InvokerFactory.register_processor("serverless")
@@ -52,6 +53,8 @@ class ServerlessProcessor(Invoker):
             else:
                 return [item.embedding for item in data.data]
         elif isinstance(data, Iterator):
+            if stream_mode(self.prompty) == "events":
+                return PromptyStream("ServerlessProcessor", stream_events(data), source=data)
 
             def generator():
                 for chunk in data:
@@ -62,7 +65,7 @@ class ServerlessProcessor(Invoker):
                         content = chunk.choices[0].delta.content
                         yield content
 
-            return PromptyStream("ServerlessProcessor", generator())
+            return PromptyStream("ServerlessProcessor", generator(), source=data)
         else:
             return data
 
@@ -102,6 +105,10 @@ class ServerlessProcessor(Invoker):
             else:
                 return [item.embedding for item in data.data]
         elif isinstance(data, AsyncIterator):
+            if stream_mode(self.prompty) == "events":
+                return AsyncPromptyStream(
+                    "ServerlessProcessor", stream_events_async(data), source=data
+                )
 
             async def generator():
                 async for chunk in data:
@@ -112,6 +119,6 @@ class ServerlessProcessor(Invoker):
                         content = chunk.choices[0].delta.content
                         yield content
 
-            return AsyncPromptyStream("ServerlessProcessor", generator())
+            return AsyncPromptyStream("ServerlessProcessor", generator(), source=data)
         else:
             return data
@@ -0,0 +1,168 @@
+import typing
+from typing import Union
+
+from .core import Prompty, param_hoisting
+from .invoker import InvokerFactory
+from .tracer import trace
+
+# stands in for the history when splitting the rendered template
+_MARKER = "__prompty_session_turn__"
+
+
+class ChatSession:
+    """A conversation with a chat prompty that renders its template once.
+
+    The template is rendered a single time with a placeholder turn in its
+    history input, which splits the parsed messages into a static prefix
+    (usually the system message) and suffix. Every turn is parsed on its own
+    and inserted between them, so a turn costs the same however long the
+    conversation is and the prefix stays byte-identical across turns (as
+    provider-side prompt caching needs). Templates that do not render the
+    history as plain turns are re-rendered in full every turn.
+
+    Attributes
+    ----------
+    prompty : Prompty
+        The prompty
+    inputs : dict[str, any]
+        The static inputs (everything but the history)
+    history : list[dict]
+        The turns so far, as ``{"role": ..., "content": ...}``
+    history_input : str
+        The input the template renders the history from
+
+    Example
+    -------
+    >>> session = ChatSession(prompty.load("chat.prompty"), {"firstName": "Jane"})
+    >>> session.send("What is the meaning of life?")
+    >>> session.send("Are you sure?")
+    """
+
+    def __init__(
+        self,
+        prompty: Prompty,
+        inputs: dict[str, typing.Any] = {},
+        history_input: str = "chat_history",
+    ) -> None:
+        self.history_input = history_input
+        self.history: list[dict[str, typing.Any]] = []
+        self._turns: list[typing.Any] = []
+        self.reload(prompty, inputs)
+
+    def reload(self, prompty: Prompty, inputs: Union[dict[str, typing.Any], None] = None) -> None:
+        """Render the static parts again, for a changed prompty or inputs
+        (the history is kept)."""
+        self.prompty = prompty
+        if inputs is not None:
+            self.inputs = {k: v for k, v in inputs.items() if k != self.history_input}
+            if self.history_input in inputs and not self.history:
+                for turn in inputs[self.history_input]:
+                    self.history.append(dict(turn))
+        messages = self._render([{"role": "user", "content": _MARKER}])
+        marker = [i for i, m in enumerate(messages) if m == {"role": "user", "content": _MARKER}]
+        if len(marker) == 1 and isinstance(messages, list):
+            self._prefix: Union[list, None] = messages[: marker[0]]
+            self._suffix: list = messages[marker[0] + 1 :]
+        else:
+            # the history is not rendered as plain turns
+            self._prefix, self._suffix = None, []
+        self._turns = [self._parse(turn) for turn in self.history]
+
+    def _render(self, history: list) -> typing.Any:
+        inputs = param_hoisting({**self.inputs, self.history_input: history}, self.prompty.sample)
+        render = InvokerFactory.run_renderer(self.prompty, inputs, self.prompty.content)
+        return InvokerFactory.run_parser(self.prompty, render)
+
+    def _parse(self, turn: dict[str, typing.Any]) -> typing.Any:
+        if self._prefix is None or not isinstance(turn.get("content"), str):
+            return turn
+        # the same messages the template and parser would produce
+        parsed = InvokerFactory.run_parser(self.prompty, f"{turn['role']}:\n{turn['content']}")
+        return parsed[0] if isinstance(parsed, list) and len(parsed) == 1 else turn
+
+    @property
+    def messages(self) -> list:
+        """The messages to send (the prefix list entries are reused as is)."""
+        if self._prefix is None:
+            return self._render(self.history)
+        return [*self._prefix, *self._turns, *self._suffix]
+
+    def add(self, role: str, content: typing.Any) -> None:
+        """Append a turn to the conversation."""
+        turn = {"role": role, "content": content}
+        self.history.append(turn)
+        self._turns.append(self._parse(turn))
+
+    def _respond(self, result: typing.Any) -> typing.Any:
+        # streams and tool calls are added by the caller once consumed
+        if isinstance(result, str):
+            self.add("assistant", result)
+        return result
+
+    @trace(description="Send a chat session turn")
+    def send(
+        self,
+        content: str,
+        configuration: dict[str, typing.Any] = {},
+        parameters: dict[str, typing.Any] = {},
+        raw: bool = False,
+    ) -> typing.Any:
+        """Add a user turn and run the conversation against the model
+
+        Parameters
+        ----------
+        content : str
+            The user message
+        configuration : Dict[str, any], optional
+            The configuration to use, by default {}
+        parameters : Dict[str, any], optional
+            The parameters to use, by default {}
+        raw : bool, optional
+            Whether to skip processing, by default False
+
+        Returns
+        -------
+        any
+            The result of the prompt, text results are added to the
+            history as the assistant turn
+        """
+        self.add("user", content)
+        prompty = self.prompty.with_overrides(configuration, parameters)
+        result = InvokerFactory.run_executor(prompty, self.messages)
+        if raw:
+            return result
+        return self._respond(InvokerFactory.run_processor(prompty, result))
+
+    @trace(description="Send a chat session turn")
+    async def send_async(
+        self,
+        content: str,
+        configuration: dict[str, typing.Any] = {},
+        parameters: dict[str, typing.Any] = {},
+        raw: bool = False,
+    ) -> typing.Any:
+        """Add a user turn and run the conversation against the model (Async)
+
+        Parameters
+        ----------
+        content : str
+            The user message
+        configuration : Dict[str, any], optional
+            The configuration to use, by default {}
+        parameters : Dict[str, any], optional
+            The parameters to use, by default {}
+        raw : bool, optional
+            Whether to skip processing, by default False
+
+        Returns
+        -------
+        any
+            The result of the prompt, text results are added to the
+            history as the assistant turn
+        """
+        self.add("user", content)
+        prompty = self.prompty.with_overrides(configuration, parameters)
+        result = await InvokerFactory.run_executor_async(prompty, self.messages)
+        if raw:
+            return result
+        return self._respond(await InvokerFactory.run_processor_async(prompty, result))
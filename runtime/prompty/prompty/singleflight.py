@@ -0,0 +1,368 @@
+import threading
+import typing
+from collections.abc import AsyncIterator, Iterator
+from typing import Union
+
+from .canonical import request_key
+from .core import AsyncPromptyStream, Prompty, PromptyStream, _aclose, _close
+
+
+def _resolve(future: typing.Any) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class _Tee:
+    """Shares one stream between readers; every reader replays the chunks
+    from the start. The source is closed once every reader closed it."""
+
+    def __init__(self, source: Iterator, release: typing.Callable[[], None]) -> None:
+        self.source = source
+        self.items: list[typing.Any] = []
+        self.finished = False
+        self.abandoned = False
+        self.error: Union[BaseException, None] = None
+        self.readers = 0
+        self._release = release
+        self._lock = threading.Lock()
+
+    def reader(self) -> Union[PromptyStream, None]:
+        with self._lock:
+            if self.abandoned:
+                return None
+            self.readers += 1
+        stream = PromptyStream("SingleFlight", _Cursor(self))
+        # the source traces the chunks once
+        stream._traced = True
+        return stream
+
+    def get(self, index: int) -> typing.Any:
+        end = False
+        with self._lock:
+            if index < len(self.items):
+                return self.items[index]
+            if not self.finished:
+                try:
+                    self.items.append(next(self.source))
+                    return self.items[index]
+                except StopIteration:
+                    self.finished = end = True
+                except BaseException as e:
+                    self.finished = end = True
+                    self.error = e
+            error = self.error
+        if end:
+            self._release()
+        if error is not None:
+            raise error
+        raise StopIteration
+
+    def detach(self) -> None:
+        with self._lock:
+            self.readers -= 1
+            abandon = self.readers == 0 and not self.finished
+            if abandon:
+                self.finished = self.abandoned = True
+        if abandon:
+            try:
+                _close(self.source)
+            finally:
+                self._release()
+
+
+class _Cursor(Iterator):
+    def __init__(self, tee: _Tee) -> None:
+        self.tee = tee
+        self.index = 0
+        self.closed = False
+
+    def __next__(self) -> typing.Any:
+        if self.closed:
+            raise StopIteration
+        try:
+            item = self.tee.get(self.index)
+        except BaseException:
+            self.close()
+            raise
+        self.index += 1
+        return item
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            self.tee.detach()
+
+
+class _AsyncTee:
+    """_Tee for async streams (readers share the event loop)."""
+
+    def __init__(self, source: AsyncIterator, release: typing.Callable[[], None]) -> None:
+        import asyncio
+
+        self.source = source
+        self.items: list[typing.Any] = []
+        self.finished = False
+        self.abandoned = False
+        self.error: Union[BaseException, None] = None
+        self.readers = 0
+        self._release = release
+        self._lock = asyncio.Lock()
+
+    def reader(self) -> Union[AsyncPromptyStream, None]:
+        if self.abandoned:
+            return None
+        self.readers += 1
+        stream = AsyncPromptyStream("SingleFlight", _AsyncCursor(self))
+        stream._traced = True
+        return stream
+
+    async def get(self, index: int) -> typing.Any:
+        async with self._lock:
+            if index < len(self.items):
+                return self.items[index]
+            if not self.finished:
+                try:
+                    self.items.append(await self.source.__anext__())
+                    return self.items[index]
+                except StopAsyncIteration:
+                    self.finished = True
+                    self._release()
+                except BaseException as e:
+                    self.finished = True
+                    self.error = e
+                    self._release()
+        if self.error is not None:
+            raise self.error
+        raise StopAsyncIteration
+
+    async def detach(self) -> None:
+        self.readers -= 1
+        if self.readers == 0 and not self.finished:
+            self.finished = self.abandoned = True
+            try:
+                await _aclose(self.source)
+            finally:
+                self._release()
+
+
+class _AsyncCursor(AsyncIterator):
+    def __init__(self, tee: _AsyncTee) -> None:
+        self.tee = tee
+        self.index = 0
+        self.closed = False
+
+    async def __anext__(self) -> typing.Any:
+        if self.closed:
+            raise StopAsyncIteration
+        try:
+            item = await self.tee.get(self.index)
+        except BaseException:
+            await self.aclose()
+            raise
+        self.index += 1
+        return item
+
+    async def aclose(self) -> None:
+        if not self.closed:
+            self.closed = True
+            await self.tee.detach()
+
+
+class _Flight:
+    """One upstream call and the callers waiting for it."""
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.futures: list[tuple[typing.Any, typing.Any]] = []
+        self.result: typing.Any = None
+        self.error: Union[BaseException, None] = None
+        self.tee: Union[_Tee, _AsyncTee, None] = None
+        self.followers = 0
+        self.cancelled = False
+        self._lock = threading.Lock()
+
+    def finish(
+        self,
+        result: typing.Any,
+        error: Union[BaseException, None],
+        release: typing.Callable[[], None],
+        cancelled: bool = False,
+    ) -> None:
+        self.cancelled = cancelled
+        if error is None and isinstance(result, AsyncIterator):
+            self.tee = _AsyncTee(result, release)
+        elif error is None and isinstance(result, Iterator):
+            self.tee = _Tee(result, release)
+        with self._lock:
+            self.result, self.error = result, error
+            self.done.set()
+            futures, self.futures = self.futures, []
+        for loop, future in futures:
+            loop.call_soon_threadsafe(_resolve, future)
+        if self.tee is None:
+            release()
+
+    def wait_future(self, loop: typing.Any) -> typing.Any:
+        # an asyncio future completed with the flight, None once it is done
+        with self._lock:
+            if self.done.is_set():
+                return None
+            future = loop.create_future()
+            self.futures.append((loop, future))
+            return future
+
+    def outcome(self) -> typing.Any:
+        """The result for one caller (a new reader for streams), raises the
+        error of the call; the flight itself when the call has to be made
+        again (the stream was abandoned or the call cancelled)."""
+        if self.cancelled:
+            return self
+        if self.error is not None:
+            raise self.error
+        if self.tee is not None:
+            reader = self.tee.reader()
+            return self if reader is None else reader
+        return self.result
+
+
+class SingleFlight:
+    """Coalesces identical concurrent executor calls into one upstream call.
+
+    Calls with the same connection, parameters and content (see
+    ``canonical.request_key``) that arrive while one is in flight wait for
+    it and share its result (or error) instead of sending their own
+    request; streamed responses are teed, every caller gets a stream
+    replaying the chunks from the start. Works across threads and asyncio
+    tasks; coalesced calls do not take a scheduler slot or rate limit.
+
+    Example
+    -------
+    >>> SingleFlight.install(SingleFlight())
+    """
+
+    _installed: Union["SingleFlight", None] = None
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._flights: dict[str, _Flight] = {}
+        self._calls = 0
+        self._coalesced = 0
+
+    @classmethod
+    def install(cls, flight: Union["SingleFlight", None]) -> None:
+        """Coalesce every executor call through ``flight`` (None to stop)."""
+        cls._installed = flight
+
+    @classmethod
+    def installed(cls) -> Union["SingleFlight", None]:
+        return cls._installed
+
+    @staticmethod
+    def key(prompty: Prompty, data: typing.Any, loop: typing.Any = None) -> Union[str, None]:
+        """The key identical calls share, None for calls that cannot be
+        compared."""
+        try:
+            key = request_key(prompty, data)
+        except (TypeError, ValueError):
+            return None
+        if prompty.model.parameters.get("stream"):
+            # sync and async streams are not interchangeable, async ones
+            # are bound to their event loop
+            return f"{key}:{id(loop)}" if loop is not None else f"{key}:sync"
+        return key
+
+    def _join(self, key: str) -> tuple[_Flight, bool]:
+        with self._lock:
+            self._calls += 1
+            flight = self._flights.get(key)
+            if flight is not None and not (flight.tee is not None and flight.tee.abandoned):
+                flight.followers += 1
+                self._coalesced += 1
+                return flight, False
+            flight = self._flights[key] = _Flight()
+            return flight, True
+
+    def _release(self, key: str, flight: _Flight) -> None:
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def run(self, key: str, call: typing.Callable[[], typing.Any]) -> typing.Any:
+        """Run ``call()`` unless an identical call is in flight
+
+        Parameters
+        ----------
+        key : str
+            The key of the call
+        call : Callable
+            The upstream call
+
+        Returns
+        -------
+        any
+            The result of the (shared) call
+        """
+        flight, leader = self._join(key)
+        if leader:
+            try:
+                result = call()
+            except Exception as e:
+                flight.finish(None, e, lambda: self._release(key, flight))
+                raise
+            except BaseException:
+                # interrupted, the others make the call themselves
+                flight.finish(None, None, lambda: self._release(key, flight), cancelled=True)
+                raise
+            flight.finish(result, None, lambda: self._release(key, flight))
+        else:
+            flight.done.wait()
+        outcome = flight.outcome()
+        # every reader left before this caller joined the stream
+        return self.run(key, call) if outcome is flight else outcome
+
+    async def run_async(self, key: str, call: typing.Callable[[], typing.Awaitable]) -> typing.Any:
+        """Run ``await call()`` unless an identical call is in flight
+
+        Parameters
+        ----------
+        key : str
+            The key of the call
+        call : Callable
+            The upstream call
+
+        Returns
+        -------
+        any
+            The result of the (shared) call
+        """
+        import asyncio
+
+        flight, leader = self._join(key)
+        if leader:
+            try:
+                result = await call()
+            except Exception as e:
+                flight.finish(None, e, lambda: self._release(key, flight))
+                raise
+            except BaseException:
+                flight.finish(None, None, lambda: self._release(key, flight), cancelled=True)
+                raise
+            flight.finish(result, None, lambda: self._release(key, flight))
+        else:
+            future = flight.wait_future(asyncio.get_running_loop())
+            if future is not None:
+                # shielded: the upstream call goes on for the other callers
+                await asyncio.shield(future)
+        outcome = flight.outcome()
+        return await self.run_async(key, call) if outcome is flight else outcome
+
+    def metrics(self) -> dict[str, int]:
+        """Calls seen, calls coalesced and calls in flight.
+
+        Returns
+        -------
+        dict
+            ``calls``, ``coalesced`` and ``in_flight``
+        """
+        with self._lock:
+            return {"calls": self._calls, "coalesced": self._coalesced, "in_flight": len(self._flights)}
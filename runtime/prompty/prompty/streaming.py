@@ -0,0 +1,240 @@
+import typing
+from collections.abc import AsyncIterator, Iterator
+from dataclasses import dataclass, field
+from typing import Union
+
+from .core import Prompty, ToolCall
+
+
+@dataclass
+class ContentEvent:
+    """A piece of the streamed message content
+
+    Attributes
+    ----------
+    content : str
+        The content delta
+    """
+
+    content: str
+
+
+@dataclass
+class ToolCallEvent:
+    """A tool call, emitted once all of its argument deltas were received
+
+    Attributes
+    ----------
+    tool_call : ToolCall
+        The assembled tool call
+    """
+
+    tool_call: ToolCall
+
+
+@dataclass
+class FinishEvent:
+    """The last event of a stream
+
+    Attributes
+    ----------
+    finish_reason : str | None
+        Why the model stopped generating (e.g. "stop", "tool_calls")
+    usage : dict | None
+        Token usage, when the service reports it (e.g. with
+        stream_options.include_usage)
+    tool_calls : list[ToolCall]
+        Every tool call of the response
+    """
+
+    finish_reason: Union[str, None] = field(default=None)
+    usage: Union[dict, None] = field(default=None)
+    tool_calls: list[ToolCall] = field(default_factory=list)
+
+
+StreamEvent = Union[ContentEvent, ToolCallEvent, FinishEvent]
+
+
+def stream_mode(prompty: Prompty) -> str:
+    """How processors stream responses, set with ``model.response.stream``:
+    "content" (the default) yields content strings, "events" yields
+    ``StreamEvent`` objects."""
+    return prompty.model.response.get("stream", "content")
+
+
+def _as_dict(obj: typing.Any) -> dict:
+    if isinstance(obj, dict):
+        return obj
+    if hasattr(obj, "model_dump"):
+        # openai (pydantic)
+        return obj.model_dump(exclude_none=True)
+    if hasattr(obj, "as_dict"):
+        # azure sdk models
+        return obj.as_dict()
+    return dict(vars(obj))
+
+
+class StreamAssembler:
+    """Turns chat completion chunks into ``StreamEvent`` objects.
+
+    Tool call deltas are collected per tool call (argument fragments are
+    joined once, when the call is complete) so each chunk costs the same
+    regardless of how much was streamed before it.
+
+    Attributes
+    ----------
+    finish_reason : str | None
+        The finish reason, once received
+    usage : dict | None
+        The token usage, once received
+    tool_calls : list[ToolCall]
+        The tool calls completed so far
+
+    Example
+    -------
+    >>> assembler = StreamAssembler()
+    >>> for chunk in response:
+    ...     for event in assembler.feed(chunk):
+    ...         ...
+    >>> events = assembler.finish()
+    """
+
+    def __init__(self) -> None:
+        self.finish_reason: Union[str, None] = None
+        self.usage: Union[dict, None] = None
+        self.tool_calls: list[ToolCall] = []
+        # index -> [id, name, argument fragments]
+        self._pending: dict[int, list] = {}
+        self._current: Union[int, None] = None
+
+    def feed(self, chunk: typing.Any) -> list[StreamEvent]:
+        """Process a chunk
+
+        Parameters
+        ----------
+        chunk : any
+            A streamed chat completion chunk (openai or azure ai inference)
+
+        Returns
+        -------
+        list[StreamEvent]
+            The events completed by this chunk
+        """
+        events: list[StreamEvent] = []
+        usage = getattr(chunk, "usage", None)
+        if usage is not None:
+            self.usage = _as_dict(usage)
+
+        for choice in chunk.choices or []:
+            # only the first choice is assembled (like non streamed responses)
+            if getattr(choice, "index", 0) != 0:
+                continue
+            delta = choice.delta
+            if delta is not None:
+                if delta.content:
+                    events.append(ContentEvent(content=delta.content))
+                for tool_call in getattr(delta, "tool_calls", None) or []:
+                    events.extend(self._tool_call_delta(tool_call))
+            if choice.finish_reason is not None:
+                # azure ai inference reports an enum
+                self.finish_reason = getattr(choice.finish_reason, "value", choice.finish_reason)
+                events.extend(self._complete())
+
+        return events
+
+    def finish(self) -> list[StreamEvent]:
+        """Complete the stream
+
+        Returns
+        -------
+        list[StreamEvent]
+            Any tool call still pending, followed by the ``FinishEvent``
+        """
+        events = self._complete()
+        events.append(
+            FinishEvent(
+                finish_reason=self.finish_reason,
+                usage=self.usage,
+                tool_calls=list(self.tool_calls),
+            )
+        )
+        return events
+
+    def _tool_call_delta(self, delta: typing.Any) -> list[StreamEvent]:
+        index: int = getattr(delta, "index", None) or 0
+        if getattr(delta, "index", None) is None:
+            # no index (azure ai inference): a new id starts a new call
+            current = self._current
+            entry = self._pending.get(current) if current is not None else None
+            if current is not None and entry is not None and (not delta.id or delta.id == entry[0]):
+                index = current
+            else:
+                index = len(self.tool_calls) + len(self._pending)
+
+        events: list[StreamEvent] = []
+        if self._current is not None and index > self._current:
+            # tool calls are streamed one after the other
+            events = self._complete(below=index)
+
+        entry = self._pending.setdefault(index, ["", "", []])
+        if delta.id:
+            entry[0] = delta.id
+        function = getattr(delta, "function", None)
+        if function is not None:
+            if function.name:
+                entry[1] += function.name
+            if function.arguments:
+                entry[2].append(function.arguments)
+        self._current = index
+        return events
+
+    def _complete(self, below: Union[int, None] = None) -> list[StreamEvent]:
+        events: list[StreamEvent] = []
+        for index in sorted(self._pending):
+            if below is not None and index >= below:
+                break
+            id, name, arguments = self._pending.pop(index)
+            tool_call = ToolCall(id=id, name=name, arguments="".join(arguments))
+            self.tool_calls.append(tool_call)
+            events.append(ToolCallEvent(tool_call=tool_call))
+        return events
+
+
+def stream_events(chunks: Iterator) -> Iterator[StreamEvent]:
+    """Yield the events of a chat completion stream
+
+    Parameters
+    ----------
+    chunks : Iterator
+        The streamed chat completion chunks
+
+    Returns
+    -------
+    Iterator[StreamEvent]
+        Content and tool call events, ending with a ``FinishEvent``
+    """
+    assembler = StreamAssembler()
+    for chunk in chunks:
+        yield from assembler.feed(chunk)
+    yield from assembler.finish()
+
+
+async def stream_events_async(chunks: AsyncIterator) -> AsyncIterator[StreamEvent]:
+    """Yield the events of an async chat completion stream
+
+    Parameters
+    ----------
+    chunks : AsyncIterator
+        The streamed chat completion chunks
+
+    Returns
+    -------
+    AsyncIterator[StreamEvent]
+        Content and tool call events, ending with a ``FinishEvent``
+    """
+    assembler = StreamAssembler()
+    async for chunk in chunks:
+        for event in assembler.feed(chunk):
+            yield event
+    for event in assembler.finish():
+        yield event
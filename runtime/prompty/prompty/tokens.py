@@ -0,0 +1,247 @@
+import functools
+import threading
+import typing
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Union
+
+from .core import Prompty
+from .utils import installed
+
+# chat format framing: tokens per message, per name and to prime the reply
+MESSAGE_TOKENS = 3
+NAME_TOKENS = 1
+REPLY_TOKENS = 3
+
+# image parts by detail (a 1024x1024 high detail image is 4 tiles)
+IMAGE_TOKENS = {"low": 85, "high": 765, "auto": 765}
+
+# encoding when the model is unknown to tiktoken
+DEFAULT_ENCODING = "cl100k_base"
+
+# counted texts kept per encoding
+TOKEN_CACHE_SIZE = 8192
+
+
+@dataclass
+class TokenCount:
+    """Token count of a prepared prompt
+
+    Attributes
+    ----------
+    total : int
+        Tokens the prompt counts against the context window (including
+        the chat framing)
+    messages : list[int]
+        Tokens per message
+    encoding : str
+        The tiktoken encoding used, or "heuristic"
+    """
+
+    total: int = field(default=0)
+    messages: list[int] = field(default_factory=list)
+    encoding: str = field(default="heuristic")
+
+
+@functools.lru_cache(maxsize=64)
+def _encoding(model: Union[str, None]) -> typing.Any:
+    if not installed("tiktoken"):
+        return None
+    import tiktoken  # type: ignore[import-not-found]
+
+    if model:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            pass
+    return tiktoken.get_encoding(DEFAULT_ENCODING)
+
+
+def model_name(prompty: Prompty) -> Union[str, None]:
+    """The model (or deployment, usually named after it) a prompty uses."""
+    configuration = prompty.model.configuration
+    for key in ["model", "name", "azure_deployment", "deployment"]:
+        if configuration.get(key):
+            return str(configuration[key])
+    return None
+
+
+def _heuristic(text: str) -> int:
+    # ~4 characters per token for english text, at least one per word
+    return max((len(text) + 3) // 4, len(text.split()))
+
+
+class _Counter:
+    """Counts text with one encoding, remembering recent texts."""
+
+    def __init__(self, encoding: typing.Any) -> None:
+        self.encoding = encoding
+        self.name = encoding.name if encoding is not None else "heuristic"
+        self._cache: OrderedDict[str, int] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, text: str) -> Union[int, None]:
+        with self._lock:
+            count = self._cache.get(text)
+            if count is not None:
+                self._cache.move_to_end(text)
+            return count
+
+    def _store(self, text: str, count: int) -> None:
+        with self._lock:
+            self._cache[text] = count
+            if len(self._cache) > TOKEN_CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+    def count(self, text: str) -> int:
+        count = self._cached(text)
+        if count is None:
+            if self.encoding is None:
+                count = _heuristic(text)
+            else:
+                count = len(self.encoding.encode(text, disallowed_special=()))
+            self._store(text, count)
+        return count
+
+    def count_many(self, texts: typing.Iterable[str]) -> None:
+        # encode everything not cached yet in one (multi-threaded) batch
+        missing = list(dict.fromkeys(t for t in texts if self._cached(t) is None))
+        if not missing:
+            return
+        if self.encoding is None:
+            counts = [_heuristic(t) for t in missing]
+        else:
+            counts = [len(e) for e in self.encoding.encode_batch(missing, disallowed_special=())]
+        for text, count in zip(missing, counts):
+            self._store(text, count)
+
+
+_counters: dict[Union[str, None], _Counter] = {}
+
+
+def _counter(model: Union[str, None]) -> _Counter:
+    encoding = _encoding(model)
+    key = encoding.name if encoding is not None else None
+    counter = _counters.get(key)
+    if counter is None:
+        counter = _counters.setdefault(key, _Counter(encoding))
+    return counter
+
+
+def _texts(message: typing.Any) -> typing.Iterator[str]:
+    if isinstance(message, str):
+        yield message
+    elif isinstance(message, dict):
+        content = message.get("content")
+        if isinstance(content, str):
+            yield content
+        elif isinstance(content, list):
+            for part in content:
+                if isinstance(part, dict) and isinstance(part.get("text"), str):
+                    yield part["text"]
+
+
+def _message_tokens(counter: _Counter, message: typing.Any) -> int:
+    if isinstance(message, str):
+        return counter.count(message)
+    if not isinstance(message, dict):
+        return 0
+
+    tokens = MESSAGE_TOKENS
+    if message.get("role"):
+        tokens += counter.count(str(message["role"]))
+    if message.get("name"):
+        tokens += NAME_TOKENS + counter.count(str(message["name"]))
+    content = message.get("content")
+    if isinstance(content, str):
+        tokens += counter.count(content)
+    elif isinstance(content, list):
+        for part in content:
+            if not isinstance(part, dict):
+                continue
+            if part.get("type") == "image_url":
+                image = part.get("image_url")
+                detail = image.get("detail", "auto") if isinstance(image, dict) else "auto"
+                tokens += IMAGE_TOKENS.get(detail, IMAGE_TOKENS["auto"])
+            elif isinstance(part.get("text"), str):
+                tokens += counter.count(part["text"])
+    return tokens
+
+
+def count_text(text: str, model: Union[str, None] = None) -> int:
+    """Count the tokens of a text
+
+    Parameters
+    ----------
+    text : str
+        The text
+    model : str, optional
+        The model whose encoding to use, by default cl100k_base
+
+    Returns
+    -------
+    int
+        The token count (estimated when tiktoken is not installed)
+    """
+    return _counter(model).count(text)
+
+
+def count_messages(messages: typing.Any, model: Union[str, None] = None) -> TokenCount:
+    """Count the tokens of parser output
+
+    Parameters
+    ----------
+    messages : list[dict] | str
+        Chat messages (with text and image parts), or a prompt
+    model : str, optional
+        The model whose encoding to use, by default cl100k_base
+
+    Returns
+    -------
+    TokenCount
+        The total and per message token counts
+    """
+    counter = _counter(model)
+    if isinstance(messages, (str, dict)):
+        messages = [messages]
+    if not isinstance(messages, list):
+        return TokenCount(encoding=counter.name)
+
+    counts = [_message_tokens(counter, m) for m in messages]
+    chat = any(isinstance(m, dict) for m in messages)
+    total = sum(counts) + (REPLY_TOKENS if chat else 0)
+    return TokenCount(total=total, messages=counts, encoding=counter.name)
+
+
+def count_batch(batch: list, model: Union[str, None] = None) -> list[TokenCount]:
+    """Count the tokens of many prepared prompts at once
+
+    Texts not counted before are encoded in a single batch (tiktoken
+    encodes batches on several threads), repeated texts are counted once.
+
+    Parameters
+    ----------
+    batch : list
+        Parser outputs (message lists or prompts)
+    model : str, optional
+        The model whose encoding to use, by default cl100k_base
+
+    Returns
+    -------
+    list[TokenCount]
+        The counts, in order
+    """
+    counter = _counter(model)
+    counter.count_many(
+        text
+        for messages in batch
+        for message in (messages if isinstance(messages, list) else [messages])
+        for text in _texts(message)
+    )
+    return [count_messages(messages, model) for messages in batch]
+
+
+def count_tokens(data: typing.Any, model: Union[str, None] = None) -> int:
+    """Count the tokens of whatever is sent to an executor (messages, a
+    prompt or a list of embedding inputs)."""
+    return count_messages(data, model).total
@@ -82,7 +82,8 @@ def to_dict(obj: Any) -> Any:
         return obj.isoformat()
     # safe Prompty obj serialization
     elif type(obj).__name__ == "Prompty":
-        obj_dict = asdict(obj)
+        # shallow: sanitize below rebuilds the configuration it touches
+        obj_dict = obj.to_dict()
         if "model" in obj_dict and "configuration" in obj_dict["model"]:
             obj_dict["model"]["configuration"] = sanitize("configuration", obj_dict["model"]["configuration"])
         return obj_dict
@@ -334,6 +335,10 @@ class PromptyTracer:
                 self.stack[-1]["__frames"].append(frame)
 
     def hoist_item(self, src: dict[str, Any], cur: dict[str, Any]) -> dict[str, Any]:
+        # prompt tokens served from the provider's prompt cache
+        details = src.get("prompt_tokens_details")
+        if isinstance(details, dict) and isinstance(details.get("cached_tokens"), int):
+            src = {**src, "cached_tokens": details["cached_tokens"]}
         for key, value in src.items():
             if value is None or isinstance(value, list) or isinstance(value, dict):
                 continue
@@ -1,15 +1,94 @@
+import functools
 import json
 import re
+import threading
+import time
 import typing
+from collections import OrderedDict
 from pathlib import Path
 
-import aiofiles
-import yaml
+# yaml, aiofiles, asyncio and hashlib are imported on first use to keep
+# `import prompty` cheap
+if typing.TYPE_CHECKING:
+    from concurrent.futures import Executor
 
-_yaml_regex = re.compile(
-    r"^\s*" + r"(?:---|\+\+\+)" + r"(.*?)" + r"(?:---|\+\+\+)" + r"\s*(.+)$",
-    re.S | re.M,
-)
+_leading_whitespace = re.compile(r"\s*")
+_front_matter_delimiters = ("---", "+++")
+
+# content hash of front matter -> parsed attributes
+_front_matter_cache: "OrderedDict[bytes, typing.Any]" = OrderedDict()
+_front_matter_cache_lock = threading.Lock()
+FRONT_MATTER_CACHE_SIZE = 512
+
+# executor used to move blocking work off the event loop
+# (None means the running loop's default executor)
+_thread_pool: "typing.Union[Executor, None]" = None
+
+
+@functools.cache
+def _yaml_loader() -> typing.Any:
+    import yaml
+
+    # libyaml backed loader when available (pure python otherwise)
+    return getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def set_thread_pool(executor: "typing.Union[Executor, None]") -> None:
+    """Set the executor used to offload blocking work (rendering, parsing,
+    encoding) from the event loop. Passing None reverts to the loop's
+    default executor.
+
+    Parameters
+    ----------
+    executor : Executor | None
+        The executor to use
+    """
+    global _thread_pool
+    _thread_pool = executor
+
+
+async def run_in_thread(func: typing.Callable, *args, **kwargs) -> typing.Any:
+    """Run a blocking callable in the configured thread pool and await the result."""
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _thread_pool, functools.partial(func, *args, **kwargs)
+    )
+
+
+def size_hint(data: typing.Any, limit: int) -> int:
+    """Approximate the size (in characters) of the strings contained in data.
+    Stops counting once limit is exceeded so large payloads are cheap to size."""
+    size = 0
+    stack = [data]
+    while stack and size <= limit:
+        item = stack.pop()
+        if isinstance(item, str):
+            size += len(item)
+        elif isinstance(item, dict):
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+    return size
+
+
+@functools.cache
+def prompty_version() -> str:
+    """The installed prompty version (read from package metadata on first use)."""
+    import importlib.metadata
+
+    return importlib.metadata.version("prompty")
+
+
+def installed(*modules: str) -> bool:
+    """Whether all modules can be imported, without importing them."""
+    import importlib.util
+
+    try:
+        return all(importlib.util.find_spec(m) is not None for m in modules)
+    except ModuleNotFoundError:
+        return False
 
 
 def load_text(file_path, encoding="utf-8"):
@@ -18,11 +97,20 @@ def load_text(file_path, encoding="utf-8"):
 
 
 async def load_text_async(file_path, encoding="utf-8"):
+    import aiofiles
+
     async with aiofiles.open(file_path, encoding=encoding) as f:
         content = await f.read()
         return content
 
 
+async def load_bytes_async(file_path) -> bytes:
+    import aiofiles
+
+    async with aiofiles.open(file_path, "rb") as f:
+        return await f.read()
+
+
 def load_json(file_path, encoding="utf-8"):
     return json.loads(load_text(file_path, encoding=encoding))
 
@@ -60,19 +148,126 @@ def _find_global_config(prompty_path: Path = Path.cwd()) -> typing.Union[Path, N
         return _walk_up_path(prompty_path)
 
 
+# directory -> (prompty.json location or None, monotonic time of lookup);
+# directories without a prompty.json are cached too (negative entries)
+_config_locations: dict[Path, tuple[typing.Union[Path, None], float]] = {}
+
+# prompty.json location -> (mtime_ns, monotonic time of check, parsed contents)
+_config_contents: dict[Path, tuple[int, float, dict[str, typing.Any]]] = {}
+
+# seconds a cached lookup is trusted before the filesystem is consulted
+# again (walking up for locations, checking the mtime for contents)
+CONFIG_CACHE_TTL = 5.0
+
+
+def clear_config_cache(config: typing.Union[Path, None] = None) -> None:
+    """Drop cached prompty.json lookups.
+
+    Parameters
+    ----------
+    config : Path, optional
+        Only forget this prompty.json (and the directories resolving to it),
+        by default everything is cleared
+    """
+    if config is None:
+        _config_locations.clear()
+        _config_contents.clear()
+        return
+
+    _config_contents.pop(config, None)
+    for directory, (location, _) in list(_config_locations.items()):
+        if location == config or directory == config.parent:
+            _config_locations.pop(directory, None)
+
+
+def _find_global_config_cached(prompty_path: Path) -> typing.Union[Path, None]:
+    now = time.monotonic()
+    walked: list[Path] = []
+    config: typing.Union[Path, None] = None
+    path = prompty_path
+    while True:
+        # any fresh answer on the way up is shared by the directories below
+        hit = _config_locations.get(path)
+        if hit is not None and now - hit[1] < CONFIG_CACHE_TTL:
+            config = hit[0]
+            break
+
+        walked.append(path)
+        candidate = path / "prompty.json"
+        if candidate.exists():
+            config = candidate
+            break
+
+        if path == path.parent:
+            break
+        path = path.parent
+
+    for directory in walked:
+        _config_locations[directory] = (config, now)
+
+    return config
+
+
+async def _find_global_config_async(prompty_path: Path) -> typing.Union[Path, None]:
+    hit = _config_locations.get(prompty_path)
+    if hit is not None and time.monotonic() - hit[1] < CONFIG_CACHE_TTL:
+        return hit[0]
+
+    # walking up the tree stats every level, keep it off the event loop
+    return await run_in_thread(_find_global_config_cached, prompty_path)
+
+
+def _load_config_cached(config: Path) -> dict[str, typing.Any]:
+    now = time.monotonic()
+    hit = _config_contents.get(config)
+    if hit is not None and now - hit[1] < CONFIG_CACHE_TTL:
+        return hit[2]
+
+    mtime = config.stat().st_mtime_ns
+    if hit is not None and hit[0] == mtime:
+        contents = hit[2]
+    else:
+        contents = load_json(config)
+
+    # one parsed document is shared by every configuration it contains
+    _config_contents[config] = (mtime, now, contents)
+    return contents
+
+
+async def _load_config_cached_async(config: Path) -> dict[str, typing.Any]:
+    hit = _config_contents.get(config)
+    if hit is not None and time.monotonic() - hit[1] < CONFIG_CACHE_TTL:
+        return hit[2]
+
+    return await run_in_thread(_load_config_cached, config)
+
+
+def _select_configuration(
+    config: Path, contents: dict[str, typing.Any], configuration: str
+) -> dict[str, typing.Any]:
+    if configuration in contents:
+        # shallow copy so callers cannot alter the shared document
+        return {**contents[configuration]}
+    else:
+        raise ValueError(f'Item "{configuration}" not found in "{config}"')
+
+
 def load_global_config(
     prompty_path: Path = Path.cwd(), configuration: str = "default"
 ) -> dict[str, typing.Any]:
     # prompty.config laying around?
-    config = _find_global_config(prompty_path)
+    config = _find_global_config_cached(prompty_path)
 
     # if there is one load it
     if config is not None:
-        c = load_json(config)
-        if configuration in c:
-            return c[configuration]
-        else:
-            raise ValueError(f'Item "{configuration}" not found in "{config}"')
+        try:
+            c = _load_config_cached(config)
+        except FileNotFoundError:
+            # removed since it was cached, look again
+            clear_config_cache(config)
+            return load_global_config(prompty_path, configuration)
+
+        return _select_configuration(config, c, configuration)
 
     return {}
 
@@ -81,15 +276,18 @@ async def load_global_config_async(
     prompty_path: Path = Path.cwd(), configuration: str = "default"
 ) -> dict[str, typing.Any]:
     # prompty.config laying around?
-    config = _find_global_config(prompty_path)
+    config = await _find_global_config_async(prompty_path)
 
     # if there is one load it
     if config is not None:
-        c = await load_json_async(config)
-        if configuration in c:
-            return c[configuration]
-        else:
-            raise ValueError(f'Item "{configuration}" not found in "{config}"')
+        try:
+            c = await _load_config_cached_async(config)
+        except FileNotFoundError:
+            # removed since it was cached, look again
+            clear_config_cache(config)
+            return await load_global_config_async(prompty_path, configuration)
+
+        return _select_configuration(config, c, configuration)
 
     return {}
 
@@ -101,21 +299,77 @@ def load_prompty(file_path, encoding="utf-8"):
 
 async def load_prompty_async(file_path, encoding="utf-8"):
     contents = await load_text_async(file_path, encoding=encoding)
-    return parse(contents)
+    return await run_in_thread(parse, contents)
 
 
-def parse(contents):
-    global _yaml_regex
+def _split_front_matter(contents: str) -> typing.Union[tuple[str, str], None]:
+    # front matter has to open the document, so only look at the start
+    # and for the first closing delimiter instead of scanning with a regex
+    start = _leading_whitespace.match(contents).end()  # type: ignore[union-attr]
+    if contents[start : start + 3] not in _front_matter_delimiters:
+        return None
+
+    start += 3
+    ends = [contents.find(d, start) for d in _front_matter_delimiters]
+    ends = [end for end in ends if end != -1]
+    if not ends:
+        return None
+
+    end = min(ends)
+    return contents[start:end], contents[end + 3 :].lstrip()
+
+
+def _copy_attributes(value: typing.Any) -> typing.Any:
+    # yaml only produces plain containers, cheaper than copy.deepcopy
+    if isinstance(value, dict):
+        return {k: _copy_attributes(v) for k, v in value.items()}
+    elif isinstance(value, list):
+        return [_copy_attributes(v) for v in value]
+    return value
+
 
+def parse_front_matter(fmatter: str) -> typing.Any:
+    """Parse yaml front matter, reusing the result for identical front matter.
+
+    Parameters
+    ----------
+    fmatter : str
+        The yaml front matter
+
+    Returns
+    -------
+    any
+        The parsed attributes (a private copy the caller may modify)
+    """
+    import hashlib
+
+    key = hashlib.blake2b(fmatter.encode("utf-8"), digest_size=16).digest()
+    # parse runs in worker threads (load_async, registry loading)
+    with _front_matter_cache_lock:
+        attributes = _front_matter_cache.get(key)
+        if attributes is not None:
+            _front_matter_cache.move_to_end(key)
+    if attributes is None:
+        import yaml
+
+        attributes = yaml.load(fmatter, Loader=_yaml_loader())
+        with _front_matter_cache_lock:
+            _front_matter_cache[key] = attributes
+            while len(_front_matter_cache) > FRONT_MATTER_CACHE_SIZE:
+                _front_matter_cache.popitem(last=False)
+
+    return _copy_attributes(attributes)
+
+
+def parse(contents):
     fmatter = ""
     body = ""
-    result = _yaml_regex.search(contents)
+    result = _split_front_matter(contents)
 
     if result:
-        fmatter = result.group(1)
-        body = result.group(2)
+        fmatter, body = result
     return {
-        "attributes": yaml.load(fmatter, Loader=yaml.FullLoader),
+        "attributes": parse_front_matter(fmatter),
         "body": body,
         "frontmatter": fmatter,
     }
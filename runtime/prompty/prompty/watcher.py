@@ -0,0 +1,240 @@
+import threading
+import typing
+from pathlib import Path
+from typing import Callable, Union
+
+from .core import Prompty
+from .loader import PromptyLoader
+
+
+class PromptyHandle:
+    """The current version of a watched prompty.
+
+    Reading ``prompty`` is a plain attribute access; the watcher swaps in a
+    new object when the file (or anything it depends on) changes, so
+    callers should read it per request instead of keeping the prompty.
+
+    Attributes
+    ----------
+    file : Path
+        The watched prompty file
+    version : int
+        Incremented on every successful reload
+    error : Exception | None
+        The error from the last reload, if it failed (the previous prompty
+        is kept)
+    """
+
+    def __init__(self, file: Path, prompty: Prompty) -> None:
+        self.file = file
+        self.version = 0
+        self.error: Union[Exception, None] = None
+        self._prompty = prompty
+        # held while reloading, the poll and watchdog threads may both try
+        self._lock = threading.Lock()
+
+    @property
+    def prompty(self) -> Prompty:
+        return self._prompty
+
+    def _swap(self, prompty: Prompty) -> None:
+        # called with the lock held
+        self._prompty = prompty
+        self.version += 1
+        self.error = None
+
+    def _reload(self, loader: PromptyLoader) -> bool:
+        with self._lock:
+            try:
+                self._swap(loader.load(self.file))
+                return True
+            except Exception as e:
+                # keep serving the previous version until the next change
+                self.error = e
+                return False
+
+
+class PromptyWatcher:
+    """Reloads prompties when any file they depend on changes.
+
+    Every file a watched prompty was loaded from (the prompty, its base
+    chain, ``${file:...}`` JSON and prompty.json) is tracked through the
+    loader's dependency graph. Changes are picked up with filesystem events
+    when ``watchdog`` is installed and by a polling thread otherwise; only
+    the prompties depending on a changed file are reloaded.
+
+    Attributes
+    ----------
+    loader : PromptyLoader
+        The loader whose dependency graph is tracked, by default a new one
+    interval : float
+        Polling interval in seconds, by default 1.0
+    use_watchdog : bool | None
+        Use filesystem events, by default when watchdog is installed
+
+    Example
+    -------
+    >>> with prompty.PromptyWatcher() as watcher:
+    ...     handle = watcher.watch("prompts/basic.prompty")
+    ...     result = prompty.execute(handle.prompty, inputs=...)
+    """
+
+    def __init__(
+        self,
+        loader: Union[PromptyLoader, None] = None,
+        interval: float = 1.0,
+        use_watchdog: Union[bool, None] = None,
+    ) -> None:
+        self.loader = loader if loader is not None else PromptyLoader()
+        self.interval = interval
+        self.use_watchdog = use_watchdog
+        self.handles: dict[Path, PromptyHandle] = {}
+        self._callbacks: list[Callable[[PromptyHandle], None]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Union[threading.Thread, None] = None
+        self._observer: typing.Any = None
+        self._handler: typing.Any = None
+        self._directories: set[Path] = set()
+
+    def __enter__(self) -> "PromptyWatcher":
+        self.start()
+        return self
+
+    def __exit__(self, *args: typing.Any) -> None:
+        self.stop()
+
+    def watch(
+        self,
+        prompty_file: Union[str, Path],
+        base_dir: Union[str, Path, None] = None,
+    ) -> PromptyHandle:
+        """Load a prompty and keep it up to date.
+
+        Parameters
+        ----------
+        prompty_file : str | Path
+            The path to the prompty file
+        base_dir : str | Path, optional
+            Directory relative paths are resolved against, by default the
+            current working directory
+
+        Returns
+        -------
+        PromptyHandle
+            The handle holding the current prompty
+        """
+        p = self.loader.load(prompty_file, base_dir=base_dir)
+        file = Path(p.file)
+        with self._lock:
+            handle = self.handles.get(file)
+            if handle is None:
+                handle = self.handles[file] = PromptyHandle(file, p)
+        self._sync_observer()
+        return handle
+
+    def on_reload(self, callback: Callable[[PromptyHandle], None]) -> None:
+        """Call a function after a handle was reloaded (or failed to)."""
+        with self._lock:
+            self._callbacks.append(callback)
+
+    def start(self) -> None:
+        """Start watching in the background."""
+        if self._thread is not None or self._observer is not None:
+            return
+
+        self._stop.clear()
+        if self.use_watchdog is not False:
+            try:
+                self._start_observer()
+                return
+            except ImportError:
+                if self.use_watchdog:
+                    raise
+
+        self._thread = threading.Thread(
+            target=self._poll, name="prompty-watcher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop watching."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+            self._directories = set()
+
+    def check(self) -> set[Path]:
+        """Reload whatever changed since the last check.
+
+        Returns
+        -------
+        set[Path]
+            The watched prompty files that were reloaded
+        """
+        return self._reload(self.loader.refresh())
+
+    def _poll(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def _reload(self, dropped: set[Path]) -> set[Path]:
+        reloaded = set()
+        with self._lock:
+            # failed handles are retried too, the change may fix their base
+            handles = [
+                h
+                for f, h in self.handles.items()
+                if f in dropped or (dropped and h.error is not None)
+            ]
+            callbacks = list(self._callbacks)
+        for handle in handles:
+            if handle._reload(self.loader):
+                reloaded.add(handle.file)
+            for callback in callbacks:
+                callback(handle)
+        self._sync_observer()
+        return reloaded
+
+    def _changed(self, path: typing.Any) -> None:
+        if not path:
+            return
+        path = Path(path.decode() if isinstance(path, bytes) else path)
+        path = path.resolve().absolute()
+        if path in self.loader.files():
+            self._reload(self.loader.invalidate(path))
+
+    def _start_observer(self) -> None:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+
+        watcher = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event: typing.Any) -> None:
+                if event.is_directory or event.event_type in ["opened", "closed_no_write"]:
+                    return
+                watcher._changed(event.src_path)
+                watcher._changed(getattr(event, "dest_path", None))
+
+        self._handler = Handler()
+        self._observer = Observer()
+        self._observer.start()
+        self._sync_observer()
+
+    def _sync_observer(self) -> None:
+        # watch the directories of every tracked file (new dependencies
+        # can appear after a reload)
+        if self._observer is None:
+            return
+        directories = {f.parent for f in self.loader.files()}
+        with self._lock:
+            for directory in directories - self._directories:
+                if directory.exists():
+                    self._observer.schedule(self._handler, str(directory))
+                    self._directories.add(directory)
@@ -27,13 +27,8 @@ class FakeServerlessExecutor(Invoker):
 
     def invoke(self, data: typing.Any) -> typing.Any:
         if self.prompty.file:
-            if isinstance(self.prompty.file, str):
-                self.prompty.file = Path(self.prompty.file).resolve().absolute()
-
-            p = (
-                Path(self.prompty.file.parent)
-                / f"{self.prompty.file.name}.execution.json"
-            )
+            file = Path(self.prompty.file).resolve().absolute()
+            p = file.parent / f"{file.name}.execution.json"
             with open(p, encoding="utf-8") as f:
                 j = f.read()
 
@@ -65,13 +60,8 @@ class FakeServerlessExecutor(Invoker):
             The parsed data
         """
         if self.prompty.file:
-            if isinstance(self.prompty.file, str):
-                self.prompty.file = Path(self.prompty.file).resolve().absolute()
-
-            p = (
-                Path(self.prompty.file.parent)
-                / f"{self.prompty.file.name}.execution.json"
-            )
+            file = Path(self.prompty.file).resolve().absolute()
+            p = file.parent / f"{file.name}.execution.json"
             with open(p, encoding="utf-8") as f:
                 j = f.read()
 
@@ -0,0 +1,144 @@
+import time
+import traceback
+from pathlib import Path
+
+import pytest
+
+import prompty
+from prompty import _caller_directory
+
+BASE_PATH = Path(__file__).absolute().parent
+
+
+def _deep(depth: int, fn):
+    # simulate a framework stack (server, middleware, dependency injection...)
+    if depth == 0:
+        return fn()
+    return _deep(depth - 1, fn)
+
+
+def _per_call(fn, calls: int = 200) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls
+
+
+def test_caller_resolution_deep_stack():
+    # roughly what a FastAPI handler sees behind starlette middleware
+    depth = 150
+
+    def old():
+        return Path(traceback.extract_stack()[-3].filename).parent
+
+    def new():
+        return _caller_directory()
+
+    assert _deep(depth, new) == _deep(depth, old)
+
+    before = _deep(depth, lambda: _per_call(old))
+    after = _deep(depth, lambda: _per_call(new))
+    print(f"\ncaller resolution @ depth {depth}: {before * 1e6:.1f}us -> {after * 1e6:.1f}us")
+    # ~100x faster locally, only catch a return to walking the whole stack
+    assert after < before
+
+
+@pytest.fixture
+def azure_env(monkeypatch):
+    # prompts/prompty.json reads the connection from the environment
+    monkeypatch.setenv("AZURE_OPENAI_ENDPOINT", "https://fake")
+    monkeypatch.setenv("AZURE_OPENAI_KEY", "12342323433")
+
+
+def test_load_deep_stack(azure_env):
+    calls = 50
+    relative = _deep(150, lambda: prompty.load("prompts/basic.prompty"))
+    explicit = _deep(150, lambda: prompty.load("prompts/basic.prompty", base_dir=BASE_PATH))
+    # the caller is found however deep the stack is
+    assert relative == explicit
+    assert relative.file == BASE_PATH / "prompts" / "basic.prompty"
+
+    relative_time = _deep(150, lambda: _per_call(lambda: prompty.load("prompts/basic.prompty"), calls))
+    explicit_time = _deep(
+        150,
+        lambda: _per_call(
+            lambda: prompty.load("prompts/basic.prompty", base_dir=BASE_PATH), calls
+        ),
+    )
+    print(f"\nload @ depth 150: relative {relative_time * 1e6:.1f}us, base_dir {explicit_time * 1e6:.1f}us")
+
+
+# cumulative `import prompty` budget in microseconds, ~5x what it takes
+# locally (~50ms) so only regressions like eagerly importing yaml/jinja2/
+# aiofiles fail; PROMPTY_IMPORT_BUDGET_US overrides it for other machines
+IMPORT_BUDGET_US = 250_000
+
+
+def test_import_time():
+    import os
+    import subprocess
+    import sys
+
+    heavy = ["yaml", "jinja2", "aiofiles", "asyncio", "openai", "azure.identity"]
+    code = (
+        "import sys, prompty, prompty.azure, prompty.openai, prompty.serverless\n"
+        f"print(','.join(m for m in {heavy!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # provider SDKs and template engines load on first use
+    assert result.stdout.strip() == ""
+
+    cumulative = {
+        line.split("|")[2].strip(): int(line.split("|")[1])
+        for line in result.stderr.splitlines()
+        if line.startswith("import time:") and line.count("|") == 2
+        and "cumulative" not in line
+    }
+    print(f"\nimport prompty: {cumulative['prompty'] / 1000:.1f}ms")
+    budget = int(os.environ.get("PROMPTY_IMPORT_BUDGET_US") or IMPORT_BUDGET_US)
+    assert cumulative["prompty"] < budget
+
+
+def test_lazy_invokers(azure_env):
+    import subprocess
+    import sys
+
+    from prompty.invoker import InvokerFactory
+
+    p = prompty.load(BASE_PATH / "prompts/basic.prompty")
+    # registered as "module:attribute" and imported on first use
+    assert InvokerFactory._get_invoker("renderer", p).__class__.__name__ == "Jinja2Renderer"
+    assert not isinstance(InvokerFactory._renderers["jinja2"], str)
+    assert prompty.PromptyLoader.__module__ == "prompty.loader"
+
+    # installed entry points register providers without importing them
+    code = (
+        "import sys, prompty\n"
+        "from prompty.invoker import InvokerFactory\n"
+        "assert InvokerFactory.has('executor', 'serverless')\n"
+        "assert InvokerFactory.has('processor', 'azure_openai')\n"
+        "print('prompty.azure' in sys.modules, 'prompty.serverless' in sys.modules)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == "False False"
+
+    # lazily imported modules do not replace explicitly registered invokers
+    from prompty.invoker import NoOp
+
+    previous = InvokerFactory._executors.get("azure")
+    InvokerFactory.add_executor("azure", NoOp)
+    try:
+        InvokerFactory.import_module("prompty.azure.executor")
+        assert InvokerFactory._executors["azure"] is NoOp
+    finally:
+        if previous is not None:
+            InvokerFactory.add_executor("azure", previous)
+        else:
+            InvokerFactory._executors.pop("azure", None)
@@ -47,3 +47,5 @@ def test_load(prompt: str):
 async def test_load_async(prompt: str):
     p = await prompty.load_async(prompt)
     print(p)
+    # loaded prompties are shared read-only
+    assert p._frozen and p.model._frozen
@@ -1,4 +1,5 @@
 import prompty
+from dataclasses import replace
 from pathlib import Path
 from prompty.tracer import to_dict
 
@@ -18,11 +19,12 @@ class TestCore:
         prompt_file_base = "prompts/fake.prompty"
         p_base = prompty.load(prompt_file_base)
         prompt_file = "prompts/chat.prompty"
-        p = prompty.load(prompt_file)
-        p.basePrompty = p_base
-        p.inputs = { "key1": "value1", "key2": "value2" }
-        p.outputs = { "key3": "value3", "key4": "value4" }
-        p.file = "/path/to/file"
+        p = prompty.load(prompt_file).derive(
+            basePrompty=p_base,
+            inputs={ "key1": "value1", "key2": "value2" },
+            outputs={ "key3": "value3", "key4": "value4" },
+            file="/path/to/file",
+        )
         d = p.to_safe_dict()
         assert d["name"] == "Basic Prompt"
         assert d["model"]["configuration"]["type"] == "azure"
@@ -35,8 +37,7 @@ class TestCore:
 
     def test_prompty_to_safe_dict_file_path(self, **kwargs):
         prompt_file = "prompts/chat.prompty"
-        p = prompty.load(prompt_file)
-        p.file = Path("/path/to/file")
+        p = prompty.load(prompt_file).derive(file=Path("/path/to/file"))
         d = p.to_safe_dict()
         assert d["file"] == "/path/to/file"
 
@@ -45,7 +46,117 @@ class TestCore:
         content = "You are a helpful assistant,\n{{ question }}"
         data = { "question": "where is Microsoft?" }
         p = prompty.headless(api="chat", content=content)
-        p.template.type = "mustache"
+        p = p.derive(template=replace(p.template, type="mustache"))
         prompt_template = prompty.InvokerFactory.run_renderer(p, data)
         parsed = prompty.InvokerFactory.run_parser(p, prompt_template)
         assert parsed == "You are a helpful assistant,\nwhere is Microsoft?"
+
+
+    def test_front_matter_cache(self, monkeypatch):
+        import yaml
+
+        from prompty import utils
+
+        calls = []
+        load = yaml.load
+
+        def counting_load(*args, **kwargs):
+            calls.append(args)
+            return load(*args, **kwargs)
+
+        monkeypatch.setattr(yaml, "load", counting_load)
+        contents = "---\nname: cached\nmodel:\n  api: chat\n---\nsystem:\nhello"
+        first = utils.parse(contents)
+        first["attributes"]["model"]["api"] = "changed"
+        second = utils.parse("\n" + contents.replace("hello", "goodbye"))
+
+        assert len(calls) == 1
+        assert second["attributes"] == {"name": "cached", "model": {"api": "chat"}}
+        assert second["body"] == "system:\ngoodbye"
+
+
+    def test_front_matter_missing(self):
+        from prompty import utils
+
+        result = utils.parse("system:\nno front matter --- here")
+        assert result["attributes"] is None
+        assert result["frontmatter"] == ""
+
+
+    def test_run_overrides_do_not_mutate(self):
+        import copy
+        from concurrent.futures import ThreadPoolExecutor
+        from dataclasses import FrozenInstanceError
+
+        import pytest
+
+        from prompty.invoker import InvokerFactory, NoOp
+
+        p = prompty.load("prompts/basic.prompty")
+        seen = []
+
+        class Recorder(NoOp):
+            def invoke(self, data):
+                model = self.prompty.model
+                seen.append((model.configuration["tenant"], model.parameters["max_tokens"]))
+                return data
+
+        InvokerFactory.add_executor("override_test", Recorder)
+        InvokerFactory.add_processor("override_test", NoOp)
+
+        def call(i):
+            return prompty.run(
+                p,
+                "content",
+                configuration={"type": "override_test", "tenant": i},
+                parameters={"max_tokens": i},
+            )
+
+        with ThreadPoolExecutor(4) as pool:
+            list(pool.map(call, range(8)))
+
+        assert sorted(seen) == [(i, i) for i in range(8)]
+        assert p.model.configuration["type"] == "azure"
+        assert "tenant" not in p.model.configuration
+
+        with pytest.raises(FrozenInstanceError):
+            p.model.configuration = {}
+        with pytest.raises(FrozenInstanceError):
+            p.name = "changed"
+
+        # copies of a frozen prompty are still frozen and equal
+        assert copy.deepcopy(p) == p
+
+
+    def test_slotted_settings_and_derive(self):
+        from dataclasses import dataclass, field
+
+        from prompty.core import _add_slots
+
+        p = prompty.load("prompts/basic.prompty")
+        for obj in [p, p.model, p.template]:
+            assert not hasattr(obj, "__dict__")
+
+        p = p.derive(model={"parameters": {"max_tokens": 128}})
+        variant = p.derive(model={"parameters": {"temperature": 0}}, name="tenant")
+        assert variant.name == "tenant" and p.name == "Basic Prompt"
+        assert variant.model.parameters == {"temperature": 0, "max_tokens": 128}
+        assert "temperature" not in p.model.parameters
+        # unchanged settings are shared, not copied
+        assert variant.template is p.template
+        assert variant.inputs is p.inputs
+        assert variant.model.configuration is p.model.configuration
+
+        d = p.to_dict()
+        assert d["model"]["configuration"] is p.model.configuration
+        assert d["template"] == {"type": "jinja2", "parser": "prompty"}
+
+        # python 3.9 fallback for dataclass(slots=True)
+        @dataclass
+        class Sample:
+            a: str = field(default="x")
+            b: list = field(default_factory=list)
+
+        sample = _add_slots(Sample)()
+        assert sample.a == "x" and sample.b == []
+        assert not hasattr(sample, "__dict__")
@@ -7,7 +7,8 @@ from dotenv import load_dotenv
 
 import prompty
 from prompty.azure import AzureOpenAIProcessor
-from prompty.invoker import InvokerFactory
+from prompty.core import AsyncPromptyStream, PromptyStream
+from prompty.invoker import Invoker, InvokerFactory
 from prompty.serverless import ServerlessProcessor
 from tests.fake_azure_executor import FakeAzureExecutor
 from tests.fake_serverless_executor import FakeServerlessExecutor
@@ -28,6 +29,17 @@ def fake_azure_executor():
     InvokerFactory.add_executor("azure_openai_beta", AzureOpenAIProcessor)
     InvokerFactory.add_executor("serverless", FakeServerlessExecutor)
     InvokerFactory.add_processor("serverless", ServerlessProcessor)
+    # stand-in connections, see _stand_in
+    InvokerFactory.add_executor("fake_connection", _Connection)
+    InvokerFactory.add_executor("flaky", _Flaky)
+
+
+def _stand_in(type: str, **configuration):
+    """An in-memory prompty executing with a stand-in executor."""
+    from prompty.core import ModelSettings, Prompty
+
+    configuration = {"type": type, **configuration}
+    return Prompty(name=type, model=ModelSettings(api="chat", configuration=configuration)).freeze()
 
 
 @pytest.mark.parametrize(
@@ -303,3 +315,919 @@ async def test_serverless_streaming_async():
 
     async for item in result:
         print(item)
+
+
+def test_streaming_events():
+    p = prompty.load("prompts/streaming.prompty").derive(model={"response": {"stream": "events"}})
+    events = list(prompty.execute(p))
+
+    finish = events[-1]
+    assert isinstance(finish, prompty.FinishEvent)
+    assert finish.finish_reason == "stop"
+    assert finish.tool_calls == []
+    content = "".join(e.content for e in events if isinstance(e, prompty.ContentEvent))
+    assert content.endswith(" 🌟")
+
+
+@pytest.mark.asyncio
+async def test_serverless_streaming_events_async():
+    p = prompty.load("prompts/serverless_stream.prompty").derive(model={"response": {"stream": "events"}})
+    result = await prompty.execute_async(
+        p, configuration={"key": os.environ.get("SERVERLESS_KEY", "key")}
+    )
+    events = [event async for event in result]
+    assert isinstance(events[-1], prompty.FinishEvent)
+    assert all(isinstance(e, prompty.ContentEvent) for e in events[:-1])
+
+
+def test_stream_assembler_tool_calls():
+    from openai.types.chat import ChatCompletionChunk
+
+    def chunk(delta: Union[dict, None], finish_reason=None, usage=None):
+        return ChatCompletionChunk.model_validate(
+            {
+                "id": "chunk",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": "gpt-4o",
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+                if delta is not None
+                else [],
+                "usage": usage,
+            }
+        )
+
+    def tool(index: int, id=None, name=None, arguments=None):
+        function = {"name": name, "arguments": arguments}
+        return {"tool_calls": [{"index": index, "id": id, "type": "function", "function": function}]}
+
+    chunks = [
+        chunk({"role": "assistant", "content": "Checking"}),
+        chunk(tool(0, id="call_1", name="get_weather", arguments="")),
+        chunk(tool(0, arguments='{"city": ')),
+        chunk(tool(0, arguments='"Seattle"}')),
+        chunk(tool(1, id="call_2", name="get_time", arguments='{"tz": ')),
+        chunk(tool(1, arguments='"PST"}')),
+        chunk({}, finish_reason="tool_calls"),
+        chunk(None, usage={"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}),
+    ]
+
+    assembler = prompty.StreamAssembler()
+    events = [event for c in chunks for event in assembler.feed(c)]
+    # the first call completes as soon as the second one starts
+    assert [type(e).__name__ for e in events] == [
+        "ContentEvent",
+        "ToolCallEvent",
+        "ToolCallEvent",
+    ]
+    assert events[1].tool_call.arguments == '{"city": "Seattle"}'
+
+    finish = assembler.finish()[-1]
+    assert finish.finish_reason == "tool_calls"
+    assert finish.usage["total_tokens"] == 15
+    assert [(t.id, t.name, t.arguments) for t in finish.tool_calls] == [
+        ("call_1", "get_weather", '{"city": "Seattle"}'),
+        ("call_2", "get_time", '{"tz": "PST"}'),
+    ]
+
+
+class _EndlessChunks:
+    """SDK-like stream that never ends on its own (records reads and close)."""
+
+    def __init__(self):
+        self.read = 0
+        self.closed = False
+
+    def _chunk(self):
+        from openai.types.chat import ChatCompletionChunk
+
+        self.read += 1
+        return ChatCompletionChunk.model_validate(
+            {
+                "id": "chunk",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": "gpt-4o",
+                "choices": [{"index": 0, "delta": {"content": str(self.read)}}],
+            }
+        )
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self._chunk()
+
+    def close(self):
+        self.closed = True
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        return self._chunk()
+
+    async def aclose(self):
+        self.closed = True
+
+
+def test_stream_close():
+    from prompty.core import PromptyStream
+
+    p = prompty.load("prompts/streaming.prompty")
+    source = _EndlessChunks()
+    stream = AzureOpenAIProcessor(p).invoke(PromptyStream("Fake", source))
+    with stream:
+        assert next(stream) == "1"
+    assert source.closed
+    assert list(stream) == []
+
+
+@pytest.mark.asyncio
+async def test_stream_aclose():
+    from prompty.core import AsyncPromptyStream
+
+    p = prompty.load("prompts/streaming.prompty").derive(model={"response": {"stream": "events"}})
+    source = _EndlessChunks()
+    stream = await AzureOpenAIProcessor(p).invoke_async(AsyncPromptyStream("Fake", source))
+    async with stream:
+        # closing before the first chunk still reaches the sdk stream
+        pass
+    assert source.closed
+    assert [e async for e in stream] == []
+
+
+@pytest.mark.asyncio
+async def test_stream_read_ahead():
+    import asyncio
+
+    from prompty.core import AsyncPromptyStream
+
+    p = prompty.load("prompts/streaming.prompty")
+    source = _EndlessChunks()
+    stream = await AzureOpenAIProcessor(p).invoke_async(AsyncPromptyStream("Fake", source))
+    async with stream.read_ahead(4):
+        assert await stream.__anext__() == "1"
+        # a slow consumer: the reader stops once the buffer is full
+        await asyncio.sleep(0.05)
+        assert source.read <= 1 + 4 + 1
+        assert await stream.__anext__() == "2"
+        reader = stream._reader
+    assert reader.done()
+    assert source.closed
+
+    with pytest.raises(ValueError):
+        AsyncPromptyStream("Fake", _EndlessChunks()).read_ahead(0)
+
+
+def test_rate_limiter(monkeypatch):
+    import time
+
+    from prompty.ratelimit import RateLimiter, estimate_tokens
+
+    waits: list[float] = []
+    monkeypatch.setattr(time, "sleep", waits.append)
+    limiter = RateLimiter(requests_per_minute=2, tokens_per_minute=100_000)
+    RateLimiter.add("gpt-35-turbo", limiter)
+    try:
+        for _ in range(3):
+            prompty.execute("prompts/basic.prompty")
+    finally:
+        RateLimiter.remove("gpt-35-turbo")
+
+    # the third request waits for the requests budget to refill
+    assert len(waits) == 1 and 29 < waits[0] <= 30
+    # the estimate is corrected by the usage the response reports
+    assert limiter.tokens is not None and limiter.tokens.level > 100_000 - 1_000
+
+    messages = [{"role": "user", "content": "x" * 400}]
+    assert estimate_tokens(messages, {"max_tokens": 50}) > 150
+    # the service's view of the budget wins when it is lower
+    limiter.update({"x-ratelimit-remaining-tokens": "10", "x-ratelimit-remaining-requests": "n/a"})
+    assert limiter.tokens.level <= 10
+    assert limiter.reserve(100) > 0
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_async(monkeypatch):
+    import asyncio
+
+    from prompty.ratelimit import RateLimiter
+
+    waits: list[float] = []
+
+    async def sleep(delay: float):
+        waits.append(delay)
+
+    monkeypatch.setattr(asyncio, "sleep", sleep)
+    RateLimiter.add("gpt-35-turbo", RateLimiter(tokens_per_minute=60))
+    try:
+        await prompty.execute_async("prompts/basic.prompty")
+        await prompty.execute_async("prompts/basic.prompty")
+    finally:
+        RateLimiter.remove("gpt-35-turbo")
+    assert len(waits) == 1 and waits[0] > 0
+
+
+def test_count_tokens():
+    from prompty.tokens import IMAGE_TOKENS, count_batch, count_messages, count_text
+
+    p = prompty.load("prompts/chat.prompty")
+    content, tokens = prompty.prepare(p, p.sample, count_tokens=True)
+    assert content == prompty.prepare(p, p.sample)
+    assert len(tokens.messages) == len(content)
+    assert tokens.total > sum(count_text(m["content"]) for m in content)
+
+    image = [
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": "What is in this picture?"},
+                {"type": "image_url", "image_url": {"url": "https://x/y.jpg", "detail": "low"}},
+            ],
+        }
+    ]
+    counted = count_messages(image)
+    assert counted.messages[0] > IMAGE_TOKENS["low"] + count_text("What is in this picture?")
+    assert count_messages("a plain prompt").total == count_text("a plain prompt")
+
+    batch = count_batch([content, image, content])
+    assert batch[0] == batch[2] == tokens
+    assert batch[1] == counted
+
+
+@pytest.mark.asyncio
+async def test_count_tokens_async():
+    p = await prompty.load_async("prompts/chat.prompty")
+    content, tokens = await prompty.prepare_async(p, p.sample, count_tokens=True)
+    assert tokens.total > 0 and len(tokens.messages) == len(content)
+
+
+def _documents(count: int) -> list[dict]:
+    words = "the tent is light waterproof and sleeps two people in any season".split()
+    return [
+        {"id": str(i), "score": (i * 7) % count, "content": " ".join(words * 2)}
+        for i in range(count)
+    ]
+
+
+def test_packing(monkeypatch):
+    from prompty.packing import pack, token_budget
+    from prompty.tokens import count_messages
+
+    p = prompty.load("prompts/packed.prompty")
+    budget = token_budget(p)
+    assert budget == 150
+
+    renders = []
+    run_renderer = InvokerFactory.run_renderer
+
+    def counting_renderer(prompty, data, default=None):
+        renders.append(data)
+        return run_renderer(prompty, data, default)
+
+    monkeypatch.setattr(InvokerFactory, "run_renderer", counting_renderer)
+
+    # a prompt that fits is rendered once
+    content = prompty.prepare(p)
+    assert len(renders) == 1 and "Alpine Explorer" in content[0]["content"]
+
+    renders.clear()
+    documents = _documents(40)
+    inputs, content = pack(p, {**p.sample, "documents": documents})
+    assert count_messages(content, "gpt-35-turbo").total <= budget
+    assert len(renders) <= 10
+
+    # the best documents are kept (in their original order), the next one trimmed
+    kept = inputs["documents"]
+    assert 1 < len(kept) < 40
+    ids = [d["id"] for d in kept]
+    assert ids == sorted(ids, key=int)
+    best = sorted(documents, key=lambda d: -d["score"])
+    full = [d for d in kept if d["content"] == documents[0]["content"]]
+    assert {d["id"] for d in full} == {d["id"] for d in best[: len(full)]}
+    trimmed = [d for d in kept if d not in full]
+    assert len(trimmed) <= 1
+    assert all(documents[0]["content"].startswith(d["content"]) for d in trimmed)
+
+    # the fewest items do not fit
+    with pytest.raises(ValueError, match="budget"):
+        prompty.prepare(p, {"question": "why? " * 200, "documents": documents})
+
+
+@pytest.mark.asyncio
+async def test_packing_async():
+    p = await prompty.load_async("prompts/packed.prompty")
+    content, tokens = await prompty.prepare_async(
+        p, {"documents": _documents(40)}, count_tokens=True
+    )
+    assert 0 < tokens.total <= 150
+    assert "# Document" in content[0]["content"]
+
+
+def test_chat_session(monkeypatch):
+    from prompty.session import ChatSession
+
+    p = prompty.load("prompts/chat.prompty")
+    session = ChatSession(p, {"firstName": "John"})
+    system = session.messages[0]
+    session.add("user", "hello")
+    session.add("assistant", "hi John, how can I help?")
+
+    # the same messages as rendering the whole history, without re-rendering
+    renders = []
+    run_renderer = InvokerFactory.run_renderer
+
+    def counting_renderer(prompty, data, default=None):
+        renders.append(data)
+        return run_renderer(prompty, data, default)
+
+    monkeypatch.setattr(InvokerFactory, "run_renderer", counting_renderer)
+    result = session.send("What is the meaning of life?")
+    assert renders == []
+    assert session.history[-1] == {"role": "assistant", "content": result}
+    assert session.messages[0] is system
+    inputs = {"firstName": "John", "chat_history": session.history}
+    assert session.messages == prompty.prepare(p, inputs)
+
+    # a changed prompty renders its static parts again, the history is kept
+    session.reload(p.with_overrides(parameters={"temperature": 0}), {"firstName": "Jane"})
+    assert len(renders) == 2
+    assert "Jane" in session.messages[0]["content"]
+    assert session.messages[1:] == prompty.prepare(p, inputs)[1:]
+
+
+@pytest.mark.asyncio
+async def test_chat_session_async():
+    from prompty.session import ChatSession
+
+    p = await prompty.load_async("prompts/chat.prompty")
+    session = ChatSession(p, {"chat_history": [{"role": "user", "content": "hello"}]})
+    result = await session.send_async("What is the meaning of life?")
+    assert [t["role"] for t in session.history] == ["user", "user", "assistant"]
+    assert session.history[-1]["content"] == result
+
+
+def test_prefix_analysis():
+    from prompty.prefix import analyze_prefix
+
+    p = prompty.load("prompts/basic.prompty")
+    report = analyze_prefix(p, [{"question": "Why?"}, {"question": "How?"}])
+    assert report.messages == 2 and report.varying == [1] and report.stable_messages == 1
+    assert report.stable_tokens > 0
+
+    # a dynamic value early in the system message
+    report = analyze_prefix(p, [{"firstName": "Jane"}, {"firstName": "John"}])
+    assert report.varying == [0] and report.stable_messages == 0
+    assert 0 < report.stable_characters < len(str(prompty.prepare(p)[0]))
+
+
+class _ParametersExecutor(Invoker):
+    def invoke(self, data):
+        return self.prompty.model.parameters
+
+    async def invoke_async(self, data):
+        return self.invoke(data)
+
+
+def test_stable_prefix():
+    import json
+
+    from prompty.prefix import analyze_prefix, stable_parameters
+
+    InvokerFactory.add_executor("parameters", _ParametersExecutor)
+    p = prompty.load("prompts/functions.prompty")
+    tools = p.model.parameters["tools"]
+    shuffled = [{k: t[k] for k in reversed(list(t))} for t in reversed(tools)]
+    assert not analyze_prefix(p.derive(model={"parameters": {"tools": shuffled}}), []).stable_parameters
+
+    # the same serialization whatever the declaration order
+    first = json.dumps(stable_parameters({"temperature": 0, "tools": tools}))
+    assert first == json.dumps(stable_parameters({"tools": shuffled, "temperature": 0}))
+    names = [t["function"]["name"] for t in json.loads(first)["tools"]]
+    assert names == sorted(names)
+    # json schema properties keep their order
+    schema = {"type": "object", "properties": {"b": {"type": "string"}, "a": {"type": "string"}}}
+    stable = stable_parameters({"response_format": {"type": "json_schema", "schema": schema}})
+    assert list(stable["response_format"]["schema"]["properties"]) == ["b", "a"]
+
+    configuration = {"type": "parameters", "stable_prefix": True}
+    result = prompty.run(p, [], configuration=configuration, parameters={"tools": shuffled}, raw=True)
+    assert json.dumps(result["tools"]) == json.dumps(stable_parameters({"tools": tools})["tools"])
+
+
+def test_canonical_json():
+    from prompty.canonical import canonical_hash, canonical_json, request_key
+
+    schema = {"type": "object", "properties": {"b": {"type": "string"}, "a": {"type": "number"}}}
+    first = {"temperature": 1.0, "messages": [{"role": "user", "content": "héllo"}], "schema": schema}
+    second = {
+        "schema": {"properties": schema["properties"], "type": "object"},
+        "messages": first["messages"],
+        "temperature": 1,
+    }
+    assert canonical_json(first) == canonical_json(second)
+    assert canonical_json(first) == (
+        '{"messages":[{"content":"héllo","role":"user"}],'
+        '"schema":{"properties":{"b":{"type":"string"},"a":{"type":"number"}},"type":"object"},'
+        '"temperature":1}'
+    )
+    assert canonical_hash(first) == canonical_hash(second)
+    assert canonical_hash(first) != canonical_hash({**first, "temperature": 0.5})
+    assert canonical_json({"tags": {"b", "a"}, "zero": -0.0}) == '{"tags":["a","b"],"zero":0}'
+    with pytest.raises(ValueError):
+        canonical_json({"temperature": float("nan")})
+
+    p = prompty.load("prompts/basic.prompty")
+    content = prompty.prepare(p)
+    assert request_key(p, content) == request_key(p.with_overrides(parameters={}), prompty.prepare(p))
+    assert request_key(p, content) != request_key(p.with_overrides(parameters={"seed": 1}), content)
+
+
+class _SlowExecutor(Invoker):
+    calls = 0
+
+    def invoke(self, data):
+        import time
+
+        _SlowExecutor.calls += 1
+        time.sleep(0.1)
+        if self.prompty.model.parameters.get("stream"):
+            return PromptyStream("SlowExecutor", iter(["a", "b", "c"]))
+        return {"echo": data}
+
+    async def invoke_async(self, data):
+        import asyncio
+
+        _SlowExecutor.calls += 1
+        await asyncio.sleep(0.1)
+        if self.prompty.model.parameters.get("stream"):
+
+            async def chunks():
+                for chunk in ["a", "b", "c"]:
+                    yield chunk
+
+            return AsyncPromptyStream("SlowExecutor", chunks())
+        return {"echo": data}
+
+
+@pytest.fixture
+def single_flight():
+    from prompty.singleflight import SingleFlight
+
+    InvokerFactory.add_executor("slow", _SlowExecutor)
+    _SlowExecutor.calls = 0
+    flight = SingleFlight()
+    SingleFlight.install(flight)
+    yield flight
+    SingleFlight.install(None)
+
+
+def test_single_flight(single_flight):
+    from concurrent.futures import ThreadPoolExecutor
+
+    p = prompty.load("prompts/basic.prompty")
+    content = prompty.prepare(p)
+
+    def run(parameters={}, data=content):
+        return prompty.run(p, data, configuration={"type": "slow"}, parameters=parameters, raw=True)
+
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(lambda _: run(), range(4)))
+    assert _SlowExecutor.calls == 1
+    assert all(r == {"echo": content} for r in results)
+    assert single_flight.metrics() == {"calls": 4, "coalesced": 3, "in_flight": 0}
+
+    # different content is not coalesced
+    with ThreadPoolExecutor(2) as pool:
+        list(pool.map(lambda i: run(data=[{"role": "user", "content": str(i)}]), range(2)))
+    assert _SlowExecutor.calls == 3
+
+    # every caller reads the whole stream
+    with ThreadPoolExecutor(3) as pool:
+        streams = list(pool.map(lambda _: list(run({"stream": True})), range(3)))
+    assert _SlowExecutor.calls == 4
+    assert streams == [["a", "b", "c"]] * 3
+
+    # an abandoned stream is not replayed to later callers
+    stream = run({"stream": True})
+    assert next(stream) == "a"
+    stream.close()
+    assert list(run({"stream": True})) == ["a", "b", "c"]
+    assert _SlowExecutor.calls == 6
+
+
+@pytest.mark.asyncio
+async def test_single_flight_async(single_flight):
+    import asyncio
+
+    p = await prompty.load_async("prompts/basic.prompty")
+    content = await prompty.prepare_async(p)
+
+    def run(parameters={}):
+        return prompty.run_async(p, content, configuration={"type": "slow"}, parameters=parameters, raw=True)
+
+    results = await asyncio.gather(*[run() for _ in range(5)])
+    assert _SlowExecutor.calls == 1 and all(r == {"echo": content} for r in results)
+
+    async def read(stream):
+        return [chunk async for chunk in stream]
+
+    streams = await asyncio.gather(*[run({"stream": True}) for _ in range(3)])
+    assert await asyncio.gather(*[read(s) for s in streams]) == [["a", "b", "c"]] * 3
+    assert _SlowExecutor.calls == 2
+
+    # a cancelled caller does not cancel the shared call
+    first = asyncio.ensure_future(run())
+    second = asyncio.ensure_future(run())
+    await asyncio.sleep(0.01)
+    second.cancel()
+    assert await first == {"echo": content}
+    assert _SlowExecutor.calls == 3
+
+
+@pytest.mark.asyncio
+async def test_scheduler_priority_and_fairness():
+    import asyncio
+
+    from prompty.scheduler import Scheduler, scheduling
+
+    scheduler = Scheduler(max_concurrency=1)
+    p = prompty.load("prompts/basic.prompty")
+    order: list[str] = []
+    hold = asyncio.Event()
+
+    async def call(name: str, priority: str, tenant: str):
+        with scheduling(priority=priority, tenant=tenant):
+            async with scheduler.slot_async(p):
+                order.append(name)
+                if name == "holder":
+                    await hold.wait()
+
+    holder = asyncio.create_task(call("holder", "interactive", "x"))
+    await asyncio.sleep(0)
+    tasks = [
+        asyncio.create_task(call(name, priority, tenant))
+        for name, priority, tenant in [
+            ("a1", "batch", "a"),
+            ("a2", "batch", "a"),
+            ("a3", "batch", "a"),
+            ("b1", "batch", "b"),
+            ("chat", "interactive", "c"),
+            ("cancelled", "interactive", "c"),
+        ]
+    ]
+    await asyncio.sleep(0)
+    metrics = scheduler.metrics()
+    assert metrics["running"] == 1
+    assert metrics["priorities"]["batch"]["queued"] == 4
+    assert metrics["priorities"]["interactive"]["queued"] == 2
+
+    tasks[-1].cancel()
+    await asyncio.sleep(0)
+    hold.set()
+    await asyncio.gather(holder, *tasks[:-1])
+
+    # interactive first, then batch fairly shared between the flows
+    assert order == ["holder", "chat", "a1", "b1", "a2", "a3"]
+    metrics = scheduler.metrics()
+    assert metrics["running"] == 0
+    assert metrics["priorities"]["interactive"]["queued"] == 0
+    assert metrics["priorities"]["interactive"]["admitted"] == 2
+    assert metrics["priorities"]["batch"]["wait_max"] > 0
+
+
+def test_scheduler_execute():
+    import threading
+
+    from prompty.scheduler import Scheduler
+
+    scheduler = Scheduler(max_concurrency=2)
+    Scheduler.install(scheduler)
+    try:
+        threads = [
+            threading.Thread(
+                target=prompty.execute,
+                args=("prompts/basic.prompty",),
+                kwargs={"priority": "batch", "base_dir": Path(__file__).parent},
+            )
+            for _ in range(6)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        prompty.execute("prompts/basic.prompty", priority="interactive")
+    finally:
+        Scheduler.install(None)
+
+    metrics = scheduler.metrics()
+    assert metrics["running"] == 0
+    assert metrics["priorities"]["batch"]["admitted"] == 6
+    assert metrics["priorities"]["interactive"]["admitted"] == 1
+    with pytest.raises(ValueError):
+        Scheduler._priority("urgent")
+
+
+@pytest.mark.asyncio
+async def test_scheduler_holds_streams():
+    from prompty.scheduler import Scheduler, scheduling
+
+    InvokerFactory.add_executor("slow", _SlowExecutor)
+    scheduler = Scheduler(max_concurrency=1)
+    Scheduler.install(scheduler)
+    try:
+        p = prompty.load("prompts/basic.prompty").with_overrides({"type": "slow"}, {"stream": True})
+        stream = InvokerFactory.run_executor(p, "hi")
+        # the slot is held until the stream is read
+        assert scheduler.metrics()["running"] == 1
+        assert list(stream) == ["a", "b", "c"]
+        assert scheduler.metrics()["running"] == 0
+
+        stream = await InvokerFactory.run_executor_async(p, "hi")
+        assert await stream.__anext__() == "a"
+        assert scheduler.metrics()["running"] == 1
+        # or closed
+        await stream.aclose()
+        assert scheduler.metrics()["running"] == 0
+
+        # finished flows are forgotten
+        for i in range(200):
+            with scheduling(tenant=str(i)):
+                with scheduler.slot(p):
+                    pass
+        assert len(scheduler._finish) <= 64
+    finally:
+        Scheduler.install(None)
+
+
+class _Connection(prompty.invoker.Invoker):
+    """Stand-in executor: configuration delay (seconds) and fail."""
+
+    calls: list[str] = []
+    cancelled: list[str] = []
+
+    def invoke(self, data):
+        import time
+
+        c = self.prompty.model.configuration
+        self.calls.append(c["name"])
+        time.sleep(c.get("delay", 0))
+        if c.get("fail"):
+            raise ConnectionError(c["name"])
+        return f"{c['name']}: {data}"
+
+    async def invoke_async(self, data):
+        import asyncio
+
+        c = self.prompty.model.configuration
+        self.calls.append(c["name"])
+        try:
+            await asyncio.sleep(c.get("delay", 0))
+        except asyncio.CancelledError:
+            self.cancelled.append(c["name"])
+            raise
+        if c.get("fail"):
+            raise ConnectionError(c["name"])
+        return f"{c['name']}: {data}"
+
+
+@pytest.fixture
+def multi():
+    from prompty.multi import MultiExecutor
+
+    # latency stats are kept per connection across calls
+    MultiExecutor.reset()
+    _Connection.calls.clear()
+    _Connection.cancelled.clear()
+    yield
+    MultiExecutor.reset()
+
+
+def test_multi_executor_routing(multi):
+    from prompty.multi import MultiExecutor
+
+    p = _stand_in(
+        "multi",
+        connections=[
+            {"type": "fake_connection", "name": "slow", "delay": 0.02},
+            {"type": "fake_connection", "name": "fast"},
+            {"type": "fake_connection", "name": "broken", "fail": True},
+        ],
+    )
+    # every connection is tried once, failures fall over to the fastest
+    for _ in range(3):
+        assert InvokerFactory.run_executor(p, "hi").endswith(": hi")
+    assert _Connection.calls == ["slow", "fast", "broken", "fast"]
+
+    # then the fastest healthy connection is preferred
+    names = [c.model.configuration["name"] for c in MultiExecutor(p).ranked()]
+    assert names == ["fast", "slow", "broken"]
+    assert InvokerFactory.run_executor(p, "hi") == "fast: hi"
+
+    with pytest.raises(ConnectionError):
+        down = _stand_in("multi", connections=[{"type": "fake_connection", "name": "down", "fail": True}])
+        InvokerFactory.run_executor(down, "hi")
+    with pytest.raises(ValueError):
+        MultiExecutor(_stand_in("multi", connections=[]))
+
+
+def _prime(p, name: str, latency: float):
+    from prompty.multi import MIN_HEDGE_SAMPLES, MultiExecutor
+
+    connection = next(c for c in MultiExecutor(p).connections if c.model.configuration["name"] == name)
+    for _ in range(MIN_HEDGE_SAMPLES):
+        MultiExecutor.stats(connection).record(latency)
+
+
+@pytest.mark.asyncio
+async def test_multi_executor_hedging_async(multi):
+    import asyncio
+    import time
+
+    p = _stand_in(
+        "multi",
+        connections=[
+            {"type": "fake_connection", "name": "primary", "delay": 5},
+            {"type": "fake_connection", "name": "secondary", "delay": 0.01},
+        ],
+    )
+    # primary usually answers in 10ms, the secondary is a little slower
+    _prime(p, "primary", 0.01)
+    _prime(p, "secondary", 0.02)
+
+    start = time.perf_counter()
+    assert await InvokerFactory.run_executor_async(p, "hi") == "secondary: hi"
+    assert time.perf_counter() - start < 1
+    # the loser is cancelled (without waiting for it)
+    await asyncio.sleep(0.01)
+    assert _Connection.calls == ["primary", "secondary"]
+    assert _Connection.cancelled == ["primary"]
+
+
+def test_multi_executor_hedging(multi):
+    import time
+
+    p = _stand_in(
+        "multi",
+        connections=[
+            {"type": "fake_connection", "name": "primary", "delay": 0.5},
+            {"type": "fake_connection", "name": "secondary"},
+        ],
+        hedge_percentile=50,
+    )
+    _prime(p, "primary", 0.01)
+    _prime(p, "secondary", 0.02)
+
+    start = time.perf_counter()
+    assert InvokerFactory.run_executor(p, "hi") == "secondary: hi"
+    assert time.perf_counter() - start < 0.4
+
+    # no hedging when disabled
+    p = p.with_overrides({"hedge": False})
+    _prime(p, "primary", 0.01)
+    assert InvokerFactory.run_executor(p, "hi") == "primary: hi"
+
+
+class _ServiceError(Exception):
+    def __init__(self, status_code: int, headers: Union[dict, None] = None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = type("Response", (), {"headers": headers or {}, "status_code": status_code})()
+
+
+class _Flaky(prompty.invoker.Invoker):
+    """Stand-in executor raising the configured errors before succeeding."""
+
+    errors: list[Exception] = []
+    calls = 0
+
+    def invoke(self, data):
+        _Flaky.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+    async def invoke_async(self, data):
+        import asyncio
+
+        _Flaky.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        await asyncio.sleep(self.prompty.model.configuration.get("delay", 0))
+        return "ok"
+
+
+@pytest.fixture
+def flaky(monkeypatch):
+    import contextlib
+    import time
+
+    from prompty.resilience import CircuitBreaker
+    from prompty.tracer import Tracer
+
+    # breakers are kept per connection across calls
+    CircuitBreaker.clear()
+    _Flaky.calls = 0
+    _Flaky.errors = []
+    sleeps: list[float] = []
+    monkeypatch.setattr(time, "sleep", sleeps.append)
+    spans: list[dict] = []
+
+    @contextlib.contextmanager
+    def tracer(name: str):
+        span: dict = {"name": name}
+        spans.append(span)
+        yield lambda key, value: span.__setitem__(key, value)
+
+    Tracer.add("resilience", tracer)
+    yield sleeps, spans
+    Tracer._tracers.pop("resilience", None)
+    CircuitBreaker.clear()
+
+
+def test_resilience_retries(flaky):
+    sleeps, spans = flaky
+    _Flaky.errors = [_ServiceError(429, {"retry-after": "7"}), _ServiceError(503)]
+    p = _stand_in("flaky", azure_deployment="d", resilience={"retries": 3, "backoff": 0.1})
+    assert InvokerFactory.run_executor(p, "hi") == "ok"
+    assert _Flaky.calls == 3
+    # retry-after is honored, otherwise jittered exponential backoff
+    assert sleeps[0] == 7 and 0 <= sleeps[1] <= 0.2
+    attempts = [s for s in spans if s["name"] == "attempt"]
+    assert [a["inputs"]["attempt"] for a in attempts] == [1, 2, 3]
+    assert attempts[0]["retry_in"] == 7 and attempts[-1]["result"] == "success"
+
+    # bad requests are not retried, neither is anything past the deadline
+    _Flaky.errors = [_ServiceError(400)]
+    p = _stand_in("flaky", azure_deployment="d", resilience={"retries": 3})
+    with pytest.raises(_ServiceError):
+        InvokerFactory.run_executor(p, "hi")
+    _Flaky.errors = [_ServiceError(429, {"retry-after-ms": "5000"})]
+    p = _stand_in("flaky", azure_deployment="d", resilience={"retries": 3, "deadline": 2})
+    with pytest.raises(_ServiceError):
+        InvokerFactory.run_executor(p, "hi")
+
+
+def test_resilience_circuit_breaker(flaky):
+    from prompty.resilience import CircuitBreaker, CircuitOpenError
+
+    _Flaky.errors = [ConnectionError()] * 3
+    resilience = {"retries": 5, "circuit_breaker": {"failures": 3, "reset": 60}}
+    p = _stand_in("flaky", azure_deployment="d", resilience=resilience)
+    with pytest.raises(CircuitOpenError):
+        InvokerFactory.run_executor(p, "hi")
+    # the connection is not called while the circuit is open
+    assert _Flaky.calls == 3
+    with pytest.raises(CircuitOpenError):
+        InvokerFactory.run_executor(p, "hi")
+    assert _Flaky.calls == 3
+
+    # a single trial call once the reset time passed
+    breaker = CircuitBreaker._breakers["flaky::d"]
+    assert breaker._opened_at is not None
+    breaker._opened_at -= 60
+    assert breaker.state == "half_open"
+    assert InvokerFactory.run_executor(p, "hi") == "ok"
+    assert breaker.state == "closed"
+
+    with pytest.raises(ValueError):
+        InvokerFactory.run_executor(_stand_in("flaky", resilience={"retry": 3}), "hi")
+
+
+@pytest.mark.asyncio
+async def test_resilience_timeout_async(flaky):
+    p = _stand_in("flaky", azure_deployment="d", delay=1, resilience={"retries": 1, "timeout": 0.05})
+    # the builtin TimeoutError like the sync path (asyncio's differs before 3.11)
+    with pytest.raises(TimeoutError, match="timed out after") as raised:
+        await InvokerFactory.run_executor_async(p, "hi")
+    assert type(raised.value) is TimeoutError
+    assert _Flaky.calls == 2
+
+    _Flaky.errors = [_ServiceError(500)]
+    p = _stand_in("flaky", azure_deployment="d", resilience={"retries": 1})
+    assert await InvokerFactory.run_executor_async(p, "hi") == "ok"
+
+
+def test_resilience_timeout_pool():
+    import threading
+
+    from prompty import resilience
+
+    release = threading.Event()
+    for _ in range(3):
+        with pytest.raises(TimeoutError):
+            resilience.Resilience._attempt(lambda _: release.wait(), None, 0.01)
+    # timed out attempts run in one shared, bounded pool
+    pool = resilience._pool()
+    assert pool is resilience._attempt_pool
+    assert sum(t.name.startswith("prompty-attempt") for t in threading.enumerate()) <= resilience.ATTEMPT_WORKERS
+    release.set()
+    assert resilience.Resilience._attempt(lambda data: data, "ok", 1) == "ok"
+
+
+def test_runtime_configuration_keys():
+    from prompty.azure.executor import AzureOpenAIExecutor
+
+    p = prompty.load("prompts/basic.prompty").with_overrides({"resilience": {"retries": 1}})
+    assert "resilience" not in AzureOpenAIExecutor(p).kwargs
@@ -5,6 +5,8 @@ import pytest
 import prompty
 from prompty.azure import AzureOpenAIProcessor
 from prompty.invoker import InvokerFactory
+from prompty.parsers import PromptyChatParser
+from prompty.renderers import Jinja2Renderer, MustacheRenderer
 from tests.fake_azure_executor import FakeAzureExecutor
 
 
@@ -56,6 +58,39 @@ def test_parser_invoker(markdown: str):
     print(result)
 
 
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "prompt",
+    [
+        "prompts/basic.prompty",
+        "prompts/basic_mustache.prompty",
+        "prompts/context.prompty",
+    ],
+)
+async def test_renderer_invoker_async(prompt: str, monkeypatch):
+    p = prompty.load(prompt)
+    expected = InvokerFactory.run_renderer(p, p.sample)
+    assert await InvokerFactory.run_renderer_async(p, p.sample) == expected
+
+    # force large render path through the thread pool
+    monkeypatch.setattr(Jinja2Renderer, "offload_threshold", 0)
+    monkeypatch.setattr(MustacheRenderer, "offload_threshold", 0)
+    assert await InvokerFactory.run_renderer_async(p, p.sample) == expected
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("markdown", ["1contoso.md", "contoso_multi.md"])
+async def test_parser_invoker_async(markdown: str, monkeypatch):
+    with open(f"{BASE_PATH}/generated/{markdown}", encoding="utf-8") as f:
+        content = f.read()
+    prompt = prompty.load("prompts/basic.prompty")
+    expected = InvokerFactory.run_parser(prompt, content)
+    assert await InvokerFactory.run_parser_async(prompt, content) == expected
+
+    monkeypatch.setattr(PromptyChatParser, "offload_threshold", 0)
+    assert await InvokerFactory.run_parser_async(prompt, content) == expected
+
+
 @pytest.mark.parametrize(
     "prompt",
     [
@@ -90,3 +125,37 @@ def test_processor_invoker(prompt: str):
     result = InvokerFactory.run_executor(p, result)
     result = InvokerFactory.run_processor(p, result)
     print(result)
+
+
+def test_entry_point_invokers(monkeypatch):
+    import importlib.metadata
+
+    published = [
+        importlib.metadata.EntryPoint(
+            name="executor:custom",
+            value="tests.fake_azure_executor:FakeAzureExecutor",
+            group="prompty.invokers",
+        ),
+        importlib.metadata.EntryPoint(
+            name="executor:azure",
+            value="prompty.azure.executor:AzureOpenAIExecutor",
+            group="prompty.invokers",
+        ),
+        importlib.metadata.EntryPoint(
+            name="unknown:custom", value="tests:nothing", group="prompty.invokers"
+        ),
+    ]
+    monkeypatch.setattr(importlib.metadata, "entry_points", lambda **kwargs: published)
+    monkeypatch.setattr(InvokerFactory, "_entry_points_loaded", False)
+    monkeypatch.delitem(InvokerFactory._executors, "custom", raising=False)
+
+    # looked up (but not imported) on the first miss
+    assert InvokerFactory.has("executor", "custom")
+    assert InvokerFactory._executors["custom"] == published[0].value
+    # explicit registrations are never replaced
+    assert InvokerFactory._executors["azure"] is FakeAzureExecutor
+
+    p = prompty.load("prompts/basic.prompty").with_overrides({"type": "custom"})
+    assert isinstance(InvokerFactory._get_invoker("executor", p), FakeAzureExecutor)
+    assert InvokerFactory._executors["custom"] is FakeAzureExecutor
+    assert not InvokerFactory.has("executor", "missing")
@@ -1,8 +1,11 @@
+import json
+import os
 from pathlib import Path
 
 import pytest
 
 import prompty
+from prompty import utils
 
 BASE_PATH = str(Path(__file__).absolute().parent.as_posix())
 
@@ -74,3 +77,331 @@ async def test_prompty_relative_async():
 
     p = await run_async()
     assert p.name == "Prompt with complex context"
+
+
+@pytest.mark.asyncio
+async def test_prompty_relative_async_no_stack_extraction(monkeypatch):
+    import traceback
+
+    def extract_stack(*args, **kwargs):
+        raise AssertionError("load_async should not extract the stack")
+
+    monkeypatch.setattr(traceback, "extract_stack", extract_stack)
+    p = await prompty.load_async("prompts/funcfile.prompty")
+    assert isinstance(p.model.parameters["tools"], list)
+
+
+def test_prompty_config_cache(tmp_path, monkeypatch):
+    utils.clear_config_cache()
+    nested = tmp_path / "a" / "b"
+    nested.mkdir(parents=True)
+    config = tmp_path / "prompty.json"
+    config.write_text(json.dumps({"default": {"type": "one"}, "other": {"type": "two"}}))
+
+    loads = []
+    load_json = utils.load_json
+
+    def counting_load_json(f):
+        loads.append(f)
+        return load_json(f)
+
+    monkeypatch.setattr(utils, "load_json", counting_load_json)
+
+    assert utils.load_global_config(nested)["type"] == "one"
+    # parsed document is shared across configurations
+    assert utils.load_global_config(nested, "other")["type"] == "two"
+    assert loads == [config]
+
+    # cached lookups (positive and negative) do not touch the filesystem
+    monkeypatch.setattr(
+        utils.Path, "exists", lambda self: pytest.fail(f"exists({self})")
+    )
+    assert utils.load_global_config(nested.parent)["type"] == "one"
+    assert utils.load_global_config(nested)["type"] == "one"
+    monkeypatch.undo()
+
+    # changed file is picked up once the cache entry expires
+    monkeypatch.setattr(utils, "CONFIG_CACHE_TTL", 0)
+    config.write_text(json.dumps({"default": {"type": "three"}}))
+    stat = config.stat()
+    os.utime(config, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert utils.load_global_config(nested)["type"] == "three"
+    utils.clear_config_cache()
+
+
+@pytest.mark.asyncio
+async def test_prompty_config_cache_async(tmp_path):
+    utils.clear_config_cache()
+    config = tmp_path / "prompty.json"
+    config.write_text(json.dumps({"default": {"type": "one"}}))
+    assert (await utils.load_global_config_async(tmp_path))["type"] == "one"
+
+    # removed files are noticed when the cached document is revalidated
+    config.unlink()
+    utils.clear_config_cache(config)
+    assert await utils.load_global_config_async(tmp_path) == {}
+
+
+def test_prompty_base_dir():
+    p = prompty.load("basic.prompty", base_dir=f"{BASE_PATH}/prompts")
+    assert p.name == "Basic Prompt"
+
+    p = prompty.headless("embedding", "hello", base_dir=f"{BASE_PATH}/prompts/sub/sub")
+    assert p.model.configuration["type"] == "TEST_LOCAL"
+
+
+def _write_prompty(path: Path, front: str, body: str = "system:\nhello") -> None:
+    path.write_text(f"---\n{front}\n---\n{body}\n")
+
+
+def test_prompty_loader_graph(tmp_path):
+    utils.clear_config_cache()
+    (tmp_path / "prompty.json").write_text(json.dumps({"default": {"type": "one"}}))
+    (tmp_path / "tools.json").write_text(json.dumps([{"name": "tool"}]))
+    _write_prompty(tmp_path / "base.prompty", "name: Base\nmodel:\n  api: chat")
+    for child in ["a", "b"]:
+        _write_prompty(
+            tmp_path / f"{child}.prompty",
+            f"name: {child}\nbase: base.prompty\n"
+            "model:\n  parameters:\n    tools: ${file:tools.json}",
+        )
+    _write_prompty(tmp_path / "c.prompty", "name: c")
+
+    loader = prompty.PromptyLoader()
+    a = loader.load("a.prompty", base_dir=tmp_path)
+    b = loader.load("b.prompty", base_dir=tmp_path)
+    c = loader.load("c.prompty", base_dir=tmp_path)
+
+    # loaded once, frozen and shared
+    assert loader.load("a.prompty", base_dir=tmp_path) is a
+    assert a.basePrompty is b.basePrompty
+    assert a.model.configuration["type"] == "one"
+    assert a.model.parameters["tools"] == [{"name": "tool"}]
+    assert a.model.api == "chat"
+    assert a.basePrompty is not None
+    assert {p.name for p in loader.dependencies(a.file)} == {
+        "a.prompty",
+        "base.prompty",
+        "tools.json",
+        "prompty.json",
+    }
+
+    # a base change only reloads what depends on it
+    base = tmp_path / "base.prompty"
+    _write_prompty(base, "name: Base\nmodel:\n  api: completion")
+    assert loader.invalidate(base) == {base, a.file, b.file}
+    assert loader.load("c.prompty", base_dir=tmp_path) is c
+    a2 = loader.load("a.prompty", base_dir=tmp_path)
+    assert a2 is not a and a2.model.api == "completion"
+
+    # changed ${file:} references are picked up by refresh
+    tools = tmp_path / "tools.json"
+    tools.write_text(json.dumps([{"name": "other"}]))
+    stat = tools.stat()
+    os.utime(tools, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert loader.refresh() == {a.file}
+    a3 = loader.load("a.prompty", base_dir=tmp_path)
+    assert a3.model.parameters["tools"] == [{"name": "other"}]
+    # the unchanged base is still shared
+    assert a3.basePrompty is a2.basePrompty
+    utils.clear_config_cache()
+
+
+def test_prompty_loader_cycle(tmp_path):
+    _write_prompty(tmp_path / "a.prompty", "name: a\nbase: b.prompty")
+    _write_prompty(tmp_path / "b.prompty", "name: b\nbase: a.prompty")
+    with pytest.raises(ValueError, match="Circular"):
+        prompty.PromptyLoader().load("a.prompty", base_dir=tmp_path)
+
+
+@pytest.mark.asyncio
+async def test_prompty_loader_async():
+    import asyncio
+
+    loader = prompty.PromptyLoader()
+    p1, p2 = await asyncio.gather(
+        loader.load_async("faithfulness.prompty", base_dir=f"{BASE_PATH}/prompts"),
+        loader.load_async("evaluation.prompty", base_dir=f"{BASE_PATH}/prompts"),
+    )
+    # the base is shared with the directly loaded prompty
+    assert p1.basePrompty is p2
+    assert p1 is loader.load("faithfulness.prompty", base_dir=f"{BASE_PATH}/prompts")
+    expected = prompty.load(f"{BASE_PATH}/prompts/faithfulness.prompty")
+    assert p1.model.configuration == expected.model.configuration
+    assert p1.content == expected.content
+
+
+def test_prompty_registry(tmp_path):
+    (tmp_path / "sub").mkdir()
+    _write_prompty(
+        tmp_path / "base.prompty", "name: Base\nmodel:\n  api: chat\ntags:\n  - eval"
+    )
+    _write_prompty(
+        tmp_path / "sub" / "child.prompty",
+        "name: Child\nbase: ../base.prompty\ntags:\n  - eval\n  - child",
+        body="system:\nhello {{name}}",
+    )
+    _write_prompty(tmp_path / "broken.prompty", "name: [unterminated")
+
+    registry = prompty.PromptyRegistry()
+    results = registry.load_directory(tmp_path, warm=True)
+
+    # failures are reported without stopping the rest
+    assert [r.path.name for r in results] == [
+        "base.prompty",
+        "broken.prompty",
+        "child.prompty",
+    ]
+    assert [r.ok for r in results] == [True, False, True]
+    assert all(r.elapsed > 0 for r in results)
+    assert len(registry) == 2
+
+    child = registry.get("sub/child")
+    assert registry.get("Child") is child
+    assert child.basePrompty is registry.get("base")
+    assert {p.name for p in registry.by_tag("eval")} == {"Base", "Child"}
+    assert registry.by_tag("missing") == []
+    with pytest.raises(KeyError):
+        registry.get("broken")
+
+    result = prompty.prepare(child, {"name": "Jane"})
+    assert result == [{"role": "system", "content": "hello Jane"}]
+
+
+@pytest.mark.asyncio
+async def test_prompty_registry_async():
+    registry = prompty.PromptyRegistry()
+    results = await registry.load_directory_async(f"{BASE_PATH}/prompts", warm=True)
+    # fake.prompty uses an unregistered renderer, which only fails warming
+    assert [r.path.name for r in results if not r.ok] == ["fake.prompty"]
+    assert registry.get("sub/sub/basic").model.configuration["type"] == "TEST_LOCAL"
+    faithfulness = registry.get("Faithfulness Metric")
+    # bases are shared through the loader
+    assert faithfulness.basePrompty is registry.get("evaluation")
+
+
+@pytest.mark.parametrize("use_mmap", [True, False])
+def test_prompty_bundle(tmp_path, monkeypatch, use_mmap):
+    from click.testing import CliRunner
+
+    from prompty import renderers
+    from prompty.cli import compile_bundle
+
+    bundle = tmp_path / "prompts.bundle"
+    result = CliRunner().invoke(
+        compile_bundle, ["-s", f"{BASE_PATH}/prompts", "-o", str(bundle)]
+    )
+    assert result.exit_code == 0, result.output
+    # env references are resolved on load, never stored
+    assert os.environ["AZURE_OPENAI_KEY"].encode() not in bundle.read_bytes()
+
+    renderers._jinja_code.clear()
+    monkeypatch.setenv("AZURE_OPENAI_KEY", "bundled-key")
+    prompties = prompty.load_bundle(
+        bundle, base_dir=f"{BASE_PATH}/prompts", use_mmap=use_mmap
+    )
+    # compiled templates are seeded from the bundle
+    assert len(renderers._jinja_code) > 0
+
+    basic = prompties["basic"]
+    assert basic.model.configuration["api_key"] == "bundled-key"
+    assert Path(basic.file) == Path(f"{BASE_PATH}/prompts/basic.prompty")
+    assert prompties["faithfulness"].basePrompty is prompties["evaluation"]
+    assert prompties["functions"].model.parameters["tools"]
+
+    expected = prompty.load(f"{BASE_PATH}/prompts/context.prompty")
+    inputs = expected.sample
+    assert prompty.prepare(prompties["context"], inputs) == prompty.prepare(
+        expected, inputs
+    )
+
+
+def test_prompty_bundle_header(tmp_path, monkeypatch):
+    bundle = tmp_path / "basic.bundle"
+    prompty.compile_bundle(f"{BASE_PATH}/prompts/basic.prompty", bundle)
+    assert list(prompty.load_bundle(bundle, base_dir=f"{BASE_PATH}/prompts")) == [
+        "basic"
+    ]
+
+    data = bytearray(bundle.read_bytes())
+    data[8] = 99
+    bundle.write_bytes(bytes(data))
+    with pytest.raises(ValueError, match="format"):
+        prompty.load_bundle(bundle)
+
+    bundle.write_bytes(b"not a bundle")
+    with pytest.raises(ValueError, match="not a prompty bundle"):
+        prompty.load_bundle(bundle)
+
+    # uninstalled source checkouts have no package metadata
+    import importlib.metadata
+
+    from prompty import bundle as bundle_module
+
+    def missing():
+        raise importlib.metadata.PackageNotFoundError("prompty")
+
+    monkeypatch.setattr(bundle_module, "prompty_version", missing)
+    assert bundle_module._header()["prompty"] == bundle_module.SOURCE_VERSION
+
+
+def _touch(path: Path, text: str) -> None:
+    # bump the modification time so quick successive writes are noticed
+    stat = path.stat() if path.exists() else None
+    path.write_text(text)
+    if stat is not None:
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_prompty_watcher_polling(tmp_path):
+    _write_prompty(tmp_path / "base.prompty", "name: Base\nmodel:\n  api: chat")
+    _write_prompty(tmp_path / "child.prompty", "name: Child\nbase: base.prompty")
+    _write_prompty(tmp_path / "other.prompty", "name: Other")
+
+    watcher = prompty.PromptyWatcher(use_watchdog=False)
+    child = watcher.watch("child.prompty", base_dir=tmp_path)
+    other = watcher.watch("other.prompty", base_dir=tmp_path)
+    first = child.prompty
+    assert watcher.check() == set()
+
+    _touch(tmp_path / "base.prompty", "---\nname: Base\nmodel:\n  api: completion\n---\n")
+    assert watcher.check() == {child.file}
+    assert child.prompty is not first and child.version == 1
+    assert child.prompty.model.api == "completion"
+    assert other.version == 0
+
+    # a broken edit keeps the previous version until the next change
+    _touch(tmp_path / "child.prompty", "---\nname: [broken\n---\n")
+    assert watcher.check() == set()
+    assert child.error is not None and child.prompty.name == "Child"
+    _touch(tmp_path / "child.prompty", "---\nname: Fixed\nbase: base.prompty\n---\n")
+    assert watcher.check() == {child.file}
+    assert child.prompty.name == "Fixed" and child.error is None
+
+    # concurrent reloads (poll and watchdog threads) are serialized per handle
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(8) as pool:
+        assert all(pool.map(lambda _: other._reload(watcher.loader), range(32)))
+    assert other.version == 32
+
+
+def test_prompty_watcher_events(tmp_path):
+    import threading
+
+    pytest.importorskip("watchdog")
+    _write_prompty(tmp_path / "basic.prompty", "name: One")
+
+    reloaded = threading.Event()
+    with prompty.PromptyWatcher(use_watchdog=True) as watcher:
+        watcher.on_reload(lambda handle: reloaded.set())
+        handle = watcher.watch("basic.prompty", base_dir=tmp_path)
+        # the observer thread sets up its watches asynchronously, so keep
+        # writing until an event arrives
+        for _ in range(50):
+            _write_prompty(tmp_path / "basic.prompty", "name: Two")
+            reloaded.wait(0.1)
+            reloaded.clear()
+            if handle.prompty.name == "Two":
+                break
+    assert handle.prompty.name == "Two"
@@ -317,3 +317,16 @@ async def test_named_tracer_async():
     with Tracer.start("Test1", {Tracer.SIGNATURE: "test1", "two": 2}) as trace:
         trace(Tracer.INPUTS, 3)
         trace(Tracer.RESULT, 4)
+
+
+def test_cached_tokens_usage(tmp_path):
+    json_tracer = PromptyTracer(str(tmp_path))
+    usage = {
+        "prompt_tokens": 2000,
+        "completion_tokens": 10,
+        "prompt_tokens_details": {"cached_tokens": 1536},
+    }
+    hoisted = json_tracer.hoist_item(usage, {})
+    hoisted = json_tracer.hoist_item({**usage, "prompt_tokens_details": {"cached_tokens": 0}}, hoisted)
+    # the cache hit rate is cached_tokens / prompt_tokens
+    assert hoisted == {"prompt_tokens": 4000, "completion_tokens": 20, "cached_tokens": 1536}